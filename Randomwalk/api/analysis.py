@@ -1,27 +1,77 @@
+import hashlib
 import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from django.conf import settings
+from django.db import connection
 
 # Our helper modules
-from .llm_router import call_llm
-from .file_reader import build_doc_path, read_text_from_path
-from .prompts import TREND_PROMPT
+from .llm_cache import delete_response, make_cache_key
+from .llm_router import TEMPERATURE, call_llm
+from .file_reader import prefetch_texts, read_section_from_path, read_text_from_path
+from .catalog import get_quarters, resolve_range
+from .models import QuarterSummary
+from .prompts import TREND_JSON_PROMPT, QUARTER_SUMMARY_PROMPT
+from .context_packer import pack_context
+from .search_index import search
+from .transcript_index import load_transcript_index, ROLE_ANALYST, ROLE_EXECUTIVE
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisError(Exception):
+    """
+    The trend analysis could not be produced (provider failure or an answer
+    that is not the requested JSON). The message is the text shown to the user.
+    """
+
+# Model used for both the per-quarter (map) and the range (reduce) calls
+MODEL_NAME = "gemini/gemini-1.5-flash"
+
+# Company name (as used in the data file names) -> ticker.
+# Companies are discovered from data/ (see catalog.py); this only maps names to tickers.
+TICKERS = {
+    "Amazon": "AMZN",
+    "Microsoft": "MSFT",
+}
+
+# Recurring analyst themes used to retrieve verbatim evidence passages for the reduce prompt
+EVIDENCE_QUERIES = [
+    "guidance outlook next quarter",
+    "margins profitability operating income",
+    "capital expenditure capex investment",
+    "cloud growth consumption optimization",
+    "artificial intelligence generative AI",
+    "competition pricing market share",
+    "consumer demand macro environment",
+]
+
+TREND_SYSTEM_PROMPT = (
+    "You are an expert equity research analyst. "
+    "Use ONLY the provided context. "
+    "Return a valid JSON object matching the requested schema."
+)
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You are an expert equity research analyst. "
+    "Use ONLY the provided transcript excerpts."
+)
 
 # --- Function 1: Quarter Options (Helper) ---
 
 def get_quarter_options():
     """
     Build the list of available quarter options for the dropdown.
-    Adjust the range as needed when new data is added.
+    Comes from the data catalog, so new transcripts show up without code changes.
+    """
+    return get_quarters()
+
+def get_ticker(company):
+    """
+    Ticker for a company, falling back to the name for companies not in TICKERS yet.
     """
-    quarters = []
-    for year in range(2020, 2025):
-        for quarter in range(1, 5):
-            quarters.append(f"{year}Q{quarter}")
-    # Explicit extra entries
-    quarters.append("2025Q1")
-    quarters.append("2025Q2")
-    return quarters
+    return TICKERS.get(company, company)
 
 # --- Function 2: File Path Logic (Your Responsibility) ---
 
@@ -29,133 +79,308 @@ def get_file_paths_for_range(company, start_q, end_q):
     """
     Given a company, start quarter, and end quarter, build the list
     of all fully-qualified file paths to be analyzed.
+    Resolved against the in-memory catalog (no per-file exists() checks).
     """
-    all_quarters = get_quarter_options()
-    
+    return resolve_range(company, start_q, end_q)
+
+# --- Function 3: Transcript Context (Helper) ---
+
+def _format_turn(turn):
+    return f"{turn['speaker']} ({turn['affiliation']}): {turn['text']}"
+
+
+def _quarter_chunks(path):
+    """
+    Return the transcript as chunks in priority order for the context packer:
+    analyst questions, then management's Q&A answers, then the presentation.
+    PDFs and transcripts the parser can't split fall back to their Q&A and
+    presentation sections from the transcript store, or else the whole text.
+    """
+    if path.suffix.lower() == ".txt":
+        try:
+            index = load_transcript_index(path)
+        except ValueError:
+            index = None
+        if index and index["qa_by_role"][ROLE_ANALYST]:
+            qa = index["qa"]
+            return (
+                [_format_turn(qa[i]) for i in index["qa_by_role"][ROLE_ANALYST]]
+                + [_format_turn(qa[i]) for i in index["qa_by_role"][ROLE_EXECUTIVE]]
+                + [_format_turn(turn) for turn in index["presentation"] if turn["role"] == ROLE_EXECUTIVE]
+            )
+    sections = [read_section_from_path(path, section) for section in ("qa", "presentation")]
+    if all(sections):
+        return sections
+    return [read_text_from_path(path)]
+
+# --- Function 4: Per-Quarter Summaries (Map Stage) ---
+
+def _split_file_name(path):
+    """
+    'Amazon_2023Q1.txt' -> ('Amazon', '2023Q1')
+    """
+    company, _, quarter = path.stem.rpartition("_")
+    return company, quarter
+
+
+def build_quarter_prompt(company, quarter, text):
+    """
+    User prompt for one quarter's map call.
+    """
+    year, quarter_num = quarter.split('Q')
+    return QUARTER_SUMMARY_PROMPT.format(
+        company=company, year=year, quarter=quarter_num,
+    ) + "\n\n--- TRANSCRIPT EXCERPTS ---\n" + text + "\n--- END ---"
+
+
+def _summarize_quarter_text(company, quarter, text):
+    return call_llm(
+        model_name=MODEL_NAME,
+        system_prompt=SUMMARY_SYSTEM_PROMPT,
+        user_prompt=build_quarter_prompt(company, quarter, text),
+    )
+
+
+def _summarize_in_worker(company, quarter, text):
+    # Pool threads reach the DB through the response cache; close their connection before the thread goes away
     try:
-        start_index = all_quarters.index(start_q)
-        end_index = all_quarters.index(end_q)
-    except ValueError:
-        raise ValueError("Invalid quarter selection.")
-
-    if start_index > end_index:
-        raise ValueError("Start quarter must be before or the same as end quarter.")
-        
-    # Slice the list to get all quarters in the range (inclusive)
-    selected_quarters = all_quarters[start_index : end_index + 1]
-    
-    files_to_process = []
-    for quarter in selected_quarters:
-        # Use the format: Amazon_2020Q1.txt
-        filename = f"{company}_{quarter}.txt"
-        
-        # Use our centralized path builder from file_reader.py
-        full_path = build_doc_path(filename)
-        
-        # Check if the file actually exists before adding it
-        if not full_path.exists():
-            raise FileNotFoundError(f"Missing data file: {filename}")
-            
-        files_to_process.append(full_path)
-        
-    return files_to_process
-
-# --- Function 3: Analysis Logic (Your Responsibility) ---
-
-def generate_trend_analysis(file_path_list, company, start_q, end_q, ticker):
+        return _summarize_quarter_text(company, quarter, text)
+    finally:
+        connection.close()
+
+
+def get_map_inputs(file_path_list):
     """
-    Reads text from files, builds a prompt, calls the LLM,
-    and formats the JSON response into a human-readable string.
-    
-    This is the "main" analysis function.
+    Return (path, company, quarter, digest, text, stored summary or None) for
+    every file: the packed transcript text a map call would send, and the
+    summary already stored for exactly that text.
     """
-    
-    # 1. Read context from all files
+    map_budget = getattr(settings, "ANALYSIS_MAP_TOKEN_BUDGET", 6000)
+    # Any PDFs in the range are extracted together in the process pool
+    prefetch_texts(file_path_list)
+    inputs = []
+    for path in file_path_list:
+        company, quarter = _split_file_name(path)
+        packed, usage = pack_context({path.name: _quarter_chunks(path)}, map_budget)
+        text = packed[path.name]
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        stored = QuarterSummary.objects.filter(
+            source=path.name, source_digest=digest, model_name=MODEL_NAME,
+        ).values_list("summary", flat=True).first()
+        if stored is None:
+            logger.info("Map context for %s: %d tokens", path.name, usage[path.name])
+        inputs.append((path, company, quarter, digest, text, stored))
+    return inputs
+
+
+def get_quarter_summaries(file_path_list):
+    """
+    Return {path: summary} for every file, calling the LLM only for quarters whose
+    summary is not stored yet (or whose source text changed since).
+    Missing summaries are generated in parallel, up to ANALYSIS_MAP_WORKERS at a time.
+    Each map prompt gets at most ANALYSIS_MAP_TOKEN_BUDGET tokens of transcript.
+    """
+    summaries = {}
+    pending = []
+    for path, company, quarter, digest, text, stored in get_map_inputs(file_path_list):
+        if stored is not None:
+            summaries[path] = stored
+        else:
+            pending.append((path, company, quarter, digest, text))
+
+    if pending:
+        workers = getattr(settings, "ANALYSIS_MAP_WORKERS", 4)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                (item, pool.submit(_summarize_in_worker, item[1], item[2], item[4]))
+                for item in pending
+            ]
+        # Save in this thread; only the provider calls run in the pool.
+        # Every finished summary is saved before a failure is re-raised, so a retry only redoes the failed ones.
+        error = None
+        for (path, company, quarter, digest, text), future in futures:
+            try:
+                summary = future.result()
+            except Exception as e:
+                error = error or e
+                continue
+            QuarterSummary.objects.update_or_create(
+                source=path.name, source_digest=digest, model_name=MODEL_NAME,
+                defaults={"company": company, "quarter": quarter, "summary": summary},
+            )
+            summaries[path] = summary
+        if error is not None:
+            raise error
+
+    return summaries
+
+# --- Function 5: Evidence Retrieval (Helper) ---
+
+def retrieve_evidence(file_path_list, company, queries=None):
+    """
+    Return the best-matching Q&A passages (BM25) for each query within the
+    selected quarters, de-duplicated and packed into ANALYSIS_EVIDENCE_TOKEN_BUDGET.
+    """
+    quarters = [_split_file_name(path)[1] for path in file_path_list]
+    per_query = getattr(settings, "ANALYSIS_EVIDENCE_PER_QUERY", 3)
+
+    seen = set()
+    chunks = []
+    for query in queries or EVIDENCE_QUERIES:
+        for hit in search(query, company=company, quarters=quarters, k=per_query):
+            key = (hit["file"], hit["text"])
+            if key in seen:
+                continue
+            seen.add(key)
+            chunks.append(f"[FILE: {hit['file']}] {hit['speaker']} ({hit['role']}): {hit['text']}")
+
+    packed, usage = pack_context(
+        {"evidence": chunks}, getattr(settings, "ANALYSIS_EVIDENCE_TOKEN_BUDGET", 3000)
+    )
+    logger.info("Evidence context: %d passages, %d tokens", len(chunks), usage["evidence"])
+    return packed["evidence"]
+
+# --- Function 6: Analysis Logic (Your Responsibility) ---
+
+def build_trend_prompt(file_path_list, summaries, company, start_q, end_q, ticker, queries=None):
+    """
+    Return (system_prompt, user_prompt) for the reduce call over a range, given
+    the per-quarter summaries ({path: summary}).
+    """
+    # Fair share of ANALYSIS_CONTEXT_TOKEN_BUDGET per quarter, whatever the range length
+    packed, usage = pack_context(
+        {path.name: [summaries[path]] for path in file_path_list},
+        getattr(settings, "ANALYSIS_CONTEXT_TOKEN_BUDGET", 16000),
+    )
+    logger.info("Reduce context tokens per file: %s", usage)
+
     context_parts = []
     for path in file_path_list:
-        try:
-            text = read_text_from_path(path)
-            # Truncate to save tokens (adjust as needed)
-            snippet = text[:8000]
-            context_parts.append(f"[FILE: {path.name}]\n{snippet}\n")
-        except Exception as e:
-            context_parts.append(f"[FILE: {path.name}] ERROR: Could not read file. {e}\n")
+        context_parts.append(f"[FILE: {path.name}]\n{packed[path.name]}\n")
     
     context = "\n---\n".join(context_parts)
+
+    evidence = retrieve_evidence(file_path_list, company, queries)
     
-    # 2. Build Prompts
-    system_prompt = (
-        "You are an expert equity research analyst. "
-        "Use ONLY the provided context. "
-        "Return a valid JSON object matching the requested schema."
-    )
+    system_prompt = TREND_SYSTEM_PROMPT
     
     # Get the correct year/quarter for the prompt
     start_y, start_q_num = start_q.split('Q')
     end_y, end_q_num = end_q.split('Q')
     
-    user_prompt = TREND_PROMPT.format(
+    user_prompt = TREND_JSON_PROMPT.format(
         ticker=ticker,
         start_q=start_q_num,
         start_y=start_y,
         end_q=end_q_num,
         end_y=end_y,
-    ) + "\n\n--- CONTEXT BEGINS ---\n" + context + "\n--- CONTEXT ENDS ---"
+    ) + "\n\n--- CONTEXT BEGINS ---\n" + context + "\n--- CONTEXT ENDS ---" \
+      + "\n\n--- EVIDENCE PASSAGES (quote these) ---\n" + evidence + "\n--- EVIDENCE ENDS ---"
 
+    return system_prompt, user_prompt
+
+
+def format_trend_result(json_result):
+    """
+    Format the reduce call's JSON (themes, turning points, risks) into the
+    human-readable text shown to the user.
+    """
+    output_lines = ["Analysis successful:\n"]
+    
+    output_lines.append("== Major Themes ==")
+    for theme in json_result.get("themes", []):
+        output_lines.append(f"\n- Theme: {theme.get('name', 'N/A')}")
+        output_lines.append(f"  Summary: {theme.get('summary', 'N/A')}")
+        for ev in theme.get("evidence", []):
+            output_lines.append(f"    - Evidence: \"{ev.get('quote', '...')}\" (Source: {ev.get('file', 'N/A')})")
+
+    output_lines.append("\n\n== Turning Points ==")
+    for point in json_result.get("turning_points", []):
+        output_lines.append(f"\n- Point ({point.get('year', 'Y')} Q{point.get('quarter', 'Q')}): {point.get('description', 'N/A')}")
+        for ev in point.get("evidence", []):
+            output_lines.append(f"    - Evidence: \"{ev.get('quote', '...')}\" (Source: {ev.get('file', 'N/A')})")
     
-    # 3. Call LLM and Format Response
-    #
-    # *** THIS IS THE CORRECTED PART ***
-    # The entire block is now inside the try...except
-    #
+    output_lines.append("\n\n== Key Risks ==")
+    for risk in json_result.get("risks", []):
+         output_lines.append(f"\n- Risk: {risk.get('name', 'N/A')}")
+         output_lines.append(f"  Description: {risk.get('description', 'N/A')}")
+         for ev in risk.get("evidence", []):
+            output_lines.append(f"    - Evidence: \"{ev.get('quote', '...')}\" (Source: {ev.get('file', 'N/A')})")
+
+    return "\n".join(output_lines)
+
+
+def parse_trend_result(result: str) -> dict:
+    """
+    Parse the reduce call's answer into the dict format_trend_result expects.
+    Tolerates a ```json fence around the object; raises AnalysisError otherwise.
+    """
+    text = result.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[-1].rsplit("```", 1)[0]
+    try:
+        json_result = json.loads(text)
+    except json.JSONDecodeError:
+        raise AnalysisError(f"Error: LLM returned invalid JSON. Could not parse response.\n\n"
+                            f"Raw LLM Output:\n{result}")
+    if not isinstance(json_result, dict) or not any(key in json_result for key in ("themes", "turning_points", "risks")):
+        raise AnalysisError("Error during analysis: LLM returned an invalid JSON structure "
+                            "(expected themes, turning_points and risks).")
+    return json_result
+
+
+def run_trend_analysis(file_path_list, company, start_q, end_q, ticker, queries=None):
+    """
+    Reads text from files, builds a prompt, calls the LLM,
+    and formats the JSON response into a human-readable string.
+
+    This is the "main" analysis function. It runs as map-reduce: each quarter
+    is summarized once (see get_quarter_summaries) and only those stored
+    summaries are combined here, so overlapping ranges share the map work.
+    Verbatim evidence passages for `queries` (default: EVIDENCE_QUERIES) are
+    retrieved from the local BM25 index and added to the reduce prompt.
+
+    Raises AnalysisError when the provider fails or its answer cannot be parsed,
+    so background jobs and the cache warm-up can tell failures from results.
+    """
+    # 1. Map: one stored analyst-focus summary per quarter
+    try:
+        summaries = get_quarter_summaries(file_path_list)
+    except Exception as e:
+        raise AnalysisError(f"Error during LLM call: {str(e)}") from e
+
+    # 2. Reduce: Build Prompts
+    system_prompt, user_prompt = build_trend_prompt(file_path_list, summaries, company, start_q, end_q, ticker, queries)
+
+    # 3. Call LLM (API key errors, rate limits, etc. happen here)
     try:
-        # Step 3a: Call the LLM
-        # This is where API Key errors, rate limits, etc. will happen
         result = call_llm(
-            model_name="gemini/gemini-1.5-flash",  # Using a powerful model by default
+            model_name=MODEL_NAME,
             system_prompt=system_prompt,
             user_prompt=user_prompt,
         )
-
-        # Step 3b: Parse the JSON response
-        # This will fail if the LLM returns non-JSON text
-        json_result = json.loads(result)
-        
-        # Step 3c: Format the JSON into a human-readable string
-        # This is the part that was failing before. Now it is protected.
-        output_lines = ["Analysis successful:\n"]
-        
-        output_lines.append("== Major Themes ==")
-        for theme in json_result.get("themes", []):
-            output_lines.append(f"\n- Theme: {theme.get('name', 'N/A')}")
-            output_lines.append(f"  Summary: {theme.get('summary', 'N/A')}")
-            for ev in theme.get("evidence", []):
-                output_lines.append(f"    - Evidence: \"{ev.get('quote', '...')}\" (Source: {ev.get('file', 'N/A')})")
-
-        output_lines.append("\n\n== Turning Points ==")
-        for point in json_result.get("turning_points", []):
-            output_lines.append(f"\n- Point ({point.get('year', 'Y')} Q{point.get('quarter', 'Q')}): {point.get('description', 'N/A')}")
-            for ev in point.get("evidence", []):
-                output_lines.append(f"    - Evidence: \"{ev.get('quote', '...')}\" (Source: {ev.get('file', 'N/A')})")
-        
-        output_lines.append("\n\n== Key Risks ==")
-        for risk in json_result.get("risks", []):
-             output_lines.append(f"\n- Risk: {risk.get('name', 'N/A')}")
-             output_lines.append(f"  Description: {risk.get('description', 'N/A')}")
-             for ev in risk.get("evidence", []):
-                output_lines.append(f"    - Evidence: \"{ev.get('quote', '...')}\" (Source: {ev.get('file', 'N/A')})")
-
-        return "\n".join(output_lines)
-
-    # Specific error for bad JSON
-    except json.JSONDecodeError:
-        return (f"Error: LLM returned invalid JSON. Could not parse response.\n\n"
-                f"Raw LLM Output:\n{result}")
-    
-    # Specific error for bad JSON structure (like missing "themes")
-    except KeyError as e:
-        return f"Error during analysis: LLM returned an invalid JSON structure. Missing key: {str(e)}"
-    
-    # General catch-all for any other errors (e.g., API keys, rate limits)
     except Exception as e:
-        return f"Error during LLM call: {str(e)}"
+        raise AnalysisError(f"Error during LLM call: {str(e)}") from e
+
+    # 4. Parse the JSON and format it into a human-readable string
+    try:
+        json_result = parse_trend_result(result)
+    except AnalysisError:
+        # Don't keep serving an unusable answer from the response cache
+        delete_response(make_cache_key(MODEL_NAME, system_prompt, user_prompt, TEMPERATURE))
+        raise
+    try:
+        return format_trend_result(json_result)
+    except (AttributeError, TypeError) as e:
+        raise AnalysisError(f"Error during analysis: LLM returned an invalid JSON structure. {str(e)}") from e
+
+
+def generate_trend_analysis(file_path_list, company, start_q, end_q, ticker, queries=None):
+    """
+    run_trend_analysis for callers that show the outcome as text:
+    errors are returned as their message instead of being raised.
+    """
+    try:
+        return run_trend_analysis(file_path_list, company, start_q, end_q, ticker, queries)
+    except AnalysisError as e:
+        return str(e)
@@ -0,0 +1,259 @@
+import asyncio
+import json
+import math
+import statistics
+import time
+import tracemalloc
+from contextlib import ExitStack
+from unittest import mock
+from django.conf import settings
+
+from . import analysis, file_reader, views
+from .catalog import get_quarters
+from .fake_gemini import start_fake_gemini
+from .file_reader import get_text_cache, read_text_from_path
+from .gemini_client import aclose_gemini_clients
+
+# Regressions smaller than this are noise, whatever the relative change
+MIN_SLACK = {"p50_ms": 0.1, "p95_ms": 0.5, "peak_kb": 16.0}
+
+BENCHMARK_COMPANY = "Amazon"
+
+
+def _sample_answer() -> str:
+    """
+    A reduce answer of realistic size: 5 themes, 4 turning points and 4 risks with evidence.
+    """
+    evidence = [{"quote": "We continue to see strong demand across regions. " * 3, "file": "Amazon_2024Q1.txt"}] * 3
+    return json.dumps({
+        "themes": [{"name": f"Theme {i}", "summary": "Analysts pressed on margins and capex. " * 4, "evidence": evidence}
+                   for i in range(5)],
+        "turning_points": [{"year": 2024, "quarter": i + 1, "description": "Focus moved to AI capacity. " * 3,
+                            "evidence": evidence} for i in range(4)],
+        "risks": [{"name": f"Risk {i}", "description": "Supply constraints on accelerators. " * 3, "evidence": evidence}
+                  for i in range(4)],
+    })
+
+
+def _year_range():
+    """
+    The most recent complete calendar year for BENCHMARK_COMPANY, as (start, end, paths).
+    """
+    quarters = get_quarters(BENCHMARK_COMPANY)
+    for year in sorted({q[:4] for q in quarters}, reverse=True):
+        if all(f"{year}Q{n}" in quarters for n in range(1, 5)):
+            start, end = f"{year}Q1", f"{year}Q4"
+            return start, end, analysis.get_file_paths_for_range(BENCHMARK_COMPANY, start, end)
+    raise ValueError(f"No complete year of transcripts for {BENCHMARK_COMPANY}")
+
+
+def _synthetic_summaries(paths) -> dict:
+    return {path: f"Analysts on {path.stem} asked about cloud growth, margins and capex. " * 12 for path in paths}
+
+
+def bench_read_text(stack, options):
+    """
+    Warm read: from the transcript store when the files were ingested, else from the TextCache.
+    """
+    _, _, paths = _year_range()
+    state = {"i": 0}
+
+    def run():
+        state["i"] += 1
+        read_text_from_path(paths[state["i"] % len(paths)])
+    return run
+
+
+def bench_read_text_cold(stack, options):
+    """
+    Decode from disk on every call: the TextCache is cleared and the transcript
+    store is bypassed (store hits never reach the TextCache).
+    """
+    _, _, paths = _year_range()
+    cache = get_text_cache()
+    stack.enter_context(mock.patch.object(file_reader, "read_stored_text", return_value=None))
+    state = {"i": 0}
+
+    def run():
+        state["i"] += 1
+        cache.clear()
+        read_text_from_path(paths[state["i"] % len(paths)])
+    return run
+
+
+def bench_file_paths(stack, options):
+    quarters = get_quarters(BENCHMARK_COMPANY)
+    return lambda: analysis.get_file_paths_for_range(BENCHMARK_COMPANY, quarters[0], quarters[-1])
+
+
+def bench_map_prompt(stack, options):
+    _, _, paths = _year_range()
+    budget = getattr(settings, "ANALYSIS_MAP_TOKEN_BUDGET", 6000)
+
+    def run():
+        for path in paths:
+            company, quarter = analysis._split_file_name(path)
+            packed, _ = analysis.pack_context({path.name: analysis._quarter_chunks(path)}, budget)
+            analysis.build_quarter_prompt(company, quarter, packed[path.name])
+    return run
+
+
+def bench_reduce_prompt(stack, options):
+    start, end, paths = _year_range()
+    summaries = _synthetic_summaries(paths)
+    return lambda: analysis.build_trend_prompt(paths, summaries, BENCHMARK_COMPANY, start, end, "AMZN")
+
+
+def bench_format_result(stack, options):
+    answer = _sample_answer()
+    return lambda: analysis.format_trend_result(analysis.parse_trend_result(answer))
+
+
+def bench_trend_analysis(stack, options):
+    """
+    run_trend_analysis end to end with stored summaries and a stub LLM that
+    answers after --llm-latency-ms, in a ```json fence as Gemini does. An
+    answer the parser rejects raises instead of timing the error path.
+    """
+    start, end, paths = _year_range()
+    summaries = _synthetic_summaries(paths)
+    answer = f"```json\n{_sample_answer()}\n```"
+    latency = options["llm_latency"]
+
+    def stub_llm(model_name, system_prompt, user_prompt, use_cache=True):
+        time.sleep(latency)
+        return answer
+
+    stack.enter_context(mock.patch.object(analysis, "get_quarter_summaries", return_value=summaries))
+    stack.enter_context(mock.patch.object(analysis, "call_llm", side_effect=stub_llm))
+    return lambda: analysis.run_trend_analysis(paths, BENCHMARK_COMPANY, start, end, "AMZN")
+
+
+def _view_runner(stack, options, refresh: bool):
+    from django.test import AsyncClient
+
+    fake = start_fake_gemini(latency=options["llm_latency"], answer="Benchmark analysis paragraph. " * 40)
+    stack.callback(fake.shutdown)
+    stack.enter_context(mock.patch.object(views, "API_URL_BASE", fake.base_url))
+
+    loop = asyncio.new_event_loop()
+    stack.callback(loop.close)
+    stack.callback(lambda: loop.run_until_complete(aclose_gemini_clients()))
+    client = AsyncClient()
+    start, end, _ = _year_range()
+    data = {"company": BENCHMARK_COMPANY, "start_quarter": start, "end_quarter": end}
+    if refresh:
+        data["refresh"] = "1"
+
+    def run():
+        response = loop.run_until_complete(client.post("/analysis/", data))
+        if response.status_code != 200:
+            raise RuntimeError(f"/analysis/ answered {response.status_code}")
+    return run
+
+
+def bench_selection_view(stack, options):
+    """
+    POST /analysis/ through the ASGI handler and middleware, with a fresh call
+    to the local fake Gemini endpoint each time (refresh=1).
+    """
+    return _view_runner(stack, options, refresh=True)
+
+
+def bench_selection_view_cached(stack, options):
+    """
+    POST /analysis/ answered from the LLM response cache.
+    """
+    return _view_runner(stack, options, refresh=False)
+
+
+# Name -> setup(stack, options) returning the callable to time
+BENCHMARKS = {
+    "read_text": bench_read_text,
+    "read_text_cold": bench_read_text_cold,
+    "file_paths_for_range": bench_file_paths,
+    "map_prompt": bench_map_prompt,
+    "reduce_prompt": bench_reduce_prompt,
+    "format_result": bench_format_result,
+    "trend_analysis": bench_trend_analysis,
+    "selection_view": bench_selection_view,
+    "selection_view_cached": bench_selection_view_cached,
+}
+
+
+def _percentile(sorted_values: list, fraction: float) -> float:
+    return sorted_values[max(0, math.ceil(len(sorted_values) * fraction) - 1)]
+
+
+def measure(run, iterations: int, warmup: int, allocations: bool = True) -> dict:
+    """
+    Time `run` (after `warmup` untimed calls) and, in a separate shorter pass
+    under tracemalloc, the memory it allocates per call.
+    Returns p50/p95/mean in milliseconds, peak KB allocated during a call and
+    KB still held after it (averaged).
+    """
+    for _ in range(warmup):
+        run()
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    result = {
+        "iterations": iterations,
+        "p50_ms": round(statistics.median(timings), 4),
+        "p95_ms": round(_percentile(timings, 0.95), 4),
+        "mean_ms": round(statistics.fmean(timings), 4),
+    }
+
+    if allocations:
+        peaks, retained = [], []
+        tracemalloc.start()
+        try:
+            for _ in range(min(iterations, 20)):
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                run()
+                current, peak = tracemalloc.get_traced_memory()
+                peaks.append(peak - before)
+                retained.append(current - before)
+        finally:
+            tracemalloc.stop()
+        result["peak_kb"] = round(statistics.median(peaks) / 1024, 1)
+        result["retained_kb"] = round(statistics.fmean(retained) / 1024, 1)
+    return result
+
+
+def run_benchmarks(names, iterations: int, warmup: int, llm_latency: float, allocations: bool = True, report=None) -> dict:
+    """
+    Run the named BENCHMARKS and return {name: measure() result}.
+    Needs a database (the command runs against a throwaway test database).
+    """
+    options = {"llm_latency": llm_latency}
+    results = {}
+    for name in names:
+        with ExitStack() as stack:
+            run = BENCHMARKS[name](stack, options)
+            results[name] = measure(run, iterations, warmup, allocations)
+        if report:
+            report(name, results[name])
+    return results
+
+
+def compare_to_baseline(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Return (name, metric, baseline value, new value) for every metric that got
+    worse than baseline * (1 + tolerance) by more than MIN_SLACK.
+    """
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        for metric, slack in MIN_SLACK.items():
+            if metric not in result or metric not in before:
+                continue
+            if result[metric] > before[metric] * (1 + tolerance) and result[metric] - before[metric] > slack:
+                regressions.append((name, metric, before[metric], result[metric]))
+    return regressions
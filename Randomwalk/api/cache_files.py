@@ -0,0 +1,26 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+
+
+def write_atomic(path: Path, text: str) -> None:
+    """
+    Write a file under ANALYSIS_CACHE_DIR atomically: a uniquely named temp file
+    (safe across processes and threads) renamed into place with os.replace, so
+    concurrent writers never tear the file and readers never see half of it.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    f = tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=path.parent, prefix=f"{path.name}.",
+                                    suffix=".tmp", delete=False)
+    try:
+        with f:
+            f.write(text)
+        os.replace(f.name, path)
+    except BaseException:
+        Path(f.name).unlink(missing_ok=True)
+        raise
+
+
+def write_json_atomic(path: Path, data) -> None:
+    write_atomic(path, json.dumps(data))
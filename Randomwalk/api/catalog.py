@@ -0,0 +1,148 @@
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from django.conf import settings
+
+from .cache_files import write_json_atomic
+from .file_reader import DATA_DIR
+
+# Bump this when the manifest layout changes so it is rebuilt.
+CATALOG_VERSION = 2
+
+# Amazon_2020Q1.txt / Microsoft_2024Q3.pdf
+_FILE_RE = re.compile(r"^(?P<company>.+)_(?P<quarter>\d{4}Q[1-4])\.(?P<ext>txt|pdf)$", re.IGNORECASE)
+
+_catalog = None
+_checked_at = None  # time.monotonic() of the last scan
+_lock = threading.Lock()
+
+
+def _manifest_path() -> Path:
+    return Path(settings.ANALYSIS_CACHE_DIR) / "catalog.json"
+
+
+def _scan_data_dir() -> list:
+    """
+    [name, mtime_ns, size] of every transcript file, sorted by name: the
+    catalog's signature. The directory's own mtime only changes when files are
+    added, removed or renamed, not when one is replaced in place, so each file
+    is stat'ed (scandir, no file is opened).
+    """
+    files = []
+    with os.scandir(DATA_DIR) as it:
+        for item in it:
+            if _FILE_RE.match(item.name) and item.is_file():
+                stat = item.stat()
+                files.append([item.name, stat.st_mtime_ns, stat.st_size])
+    return sorted(files)
+
+
+def build_catalog(files: list = None) -> dict:
+    """
+    Return the catalog for a _scan_data_dir() result (scanning DATA_DIR when not given):
+    {"entries": {company: {quarter: {path, size, mtime_ns}}}, ...}.
+    When a quarter exists as both .txt and .pdf, the text file wins.
+    """
+    if files is None:
+        files = _scan_data_dir()
+    entries = {}
+    for name, mtime_ns, size in files:
+        match = _FILE_RE.match(name)
+        company, quarter = match["company"], match["quarter"].upper()
+        current = entries.setdefault(company, {}).get(quarter)
+        if current and current["path"].lower().endswith(".txt"):
+            continue
+        entries[company][quarter] = {"path": name, "size": size, "mtime_ns": mtime_ns}
+    return {
+        "version": CATALOG_VERSION,
+        "signature": files,
+        "entries": {company: dict(sorted(quarters.items())) for company, quarters in sorted(entries.items())},
+    }
+
+
+def get_catalog() -> dict:
+    """
+    Return the catalog of available transcripts, kept in memory per process.
+
+    Lookups within TRANSCRIPT_REVALIDATE_SECONDS of the last check touch no
+    files at all. After that, one scan of DATA_DIR checks that no transcript
+    was added, removed or changed; if one was, the catalog is loaded from the
+    persisted manifest or rebuilt from that same scan.
+    """
+    global _catalog, _checked_at
+    ttl = getattr(settings, "TRANSCRIPT_REVALIDATE_SECONDS", 30.0)
+    with _lock:
+        now = time.monotonic()
+        if _catalog is not None and _checked_at is not None and now - _checked_at < ttl:
+            return _catalog
+
+        files = _scan_data_dir()
+        _checked_at = now
+        if _catalog is not None and _catalog["signature"] == files:
+            return _catalog
+
+        catalog = None
+        try:
+            with _manifest_path().open("r", encoding="utf-8") as f:
+                stored = json.load(f)
+            if stored.get("version") == CATALOG_VERSION and stored.get("signature") == files:
+                catalog = stored
+        except (OSError, ValueError):
+            catalog = None
+
+        if catalog is None:
+            catalog = build_catalog(files)
+            write_json_atomic(_manifest_path(), catalog)
+        catalog["all_quarters"] = sorted({q for quarters in catalog["entries"].values() for q in quarters})
+        _catalog = catalog
+        return _catalog
+
+
+def get_companies() -> list:
+    """
+    Companies with at least one transcript, sorted by name.
+    """
+    return list(get_catalog()["entries"])
+
+
+def get_quarters(company: str = None) -> list:
+    """
+    Available quarters (sorted) for one company, or for any company when None.
+    """
+    catalog = get_catalog()
+    if company is None:
+        return list(catalog["all_quarters"])
+    return list(catalog["entries"].get(company, {}))
+
+
+def resolve_range(company: str, start_q: str, end_q: str) -> list:
+    """
+    Map a company and an inclusive quarter range to transcript paths using the
+    in-memory catalog only. Raises ValueError for an unknown company or quarter
+    or a reversed range, and FileNotFoundError when a quarter inside the range
+    is missing for that company.
+    """
+    catalog = get_catalog()
+    quarters = catalog["entries"].get(company)
+    if quarters is None:
+        raise ValueError(f"Unknown company: {company}")
+
+    all_quarters = catalog["all_quarters"]
+    try:
+        start_index = all_quarters.index(start_q)
+        end_index = all_quarters.index(end_q)
+    except ValueError:
+        raise ValueError("Invalid quarter selection.")
+    if start_index > end_index:
+        raise ValueError("Start quarter must be before or the same as end quarter.")
+
+    paths = []
+    for quarter in all_quarters[start_index:end_index + 1]:
+        entry = quarters.get(quarter)
+        if entry is None:
+            raise FileNotFoundError(f"Missing data file: {company}_{quarter}.txt")
+        paths.append(DATA_DIR / entry["path"])
+    return paths
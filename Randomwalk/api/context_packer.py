@@ -0,0 +1,76 @@
+import math
+
+# Rough average for English prose with the Gemini/GPT tokenizers. Used instead of a
+# real tokenizer so packing needs no model files and runs in microseconds.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens in a piece of text.
+    """
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _truncate_to_tokens(text: str, tokens: int) -> str:
+    return text[:tokens * CHARS_PER_TOKEN]
+
+
+def allocate_budget(demands: dict, total_budget: int) -> dict:
+    """
+    Split total_budget fairly between documents ("water filling"): each document
+    gets an equal share, and whatever a short document does not need is
+    redistributed to the longer ones.
+    """
+    allocation = {}
+    remaining = dict(demands)
+    budget = total_budget
+    while remaining:
+        share = budget // len(remaining)
+        fits = {name: need for name, need in remaining.items() if need <= share}
+        if not fits:
+            for name in remaining:
+                allocation[name] = share
+            break
+        for name, need in fits.items():
+            allocation[name] = need
+            budget -= need
+            del remaining[name]
+    return allocation
+
+
+def pack_context(documents: dict, total_budget: int, separator: str = "\n\n"):
+    """
+    Pack prioritized chunks from several documents into a total token budget.
+
+    `documents` maps a name to its chunks, most important first (e.g. analyst
+    questions before executive answers). Every document gets a fair share of
+    the budget; within it, chunks are taken in order and the last one is
+    truncated to fit.
+
+    Returns (packed, usage): the packed text and the estimated tokens used per document.
+    """
+    demands = {
+        name: sum(estimate_tokens(chunk) for chunk in chunks)
+        for name, chunks in documents.items()
+    }
+    allocation = allocate_budget(demands, total_budget)
+
+    packed = {}
+    usage = {}
+    for name, chunks in documents.items():
+        budget = allocation[name]
+        used = 0
+        parts = []
+        for chunk in chunks:
+            tokens = estimate_tokens(chunk)
+            if used + tokens > budget:
+                if budget - used > 0:
+                    parts.append(_truncate_to_tokens(chunk, budget - used))
+                    used = budget
+                break
+            parts.append(chunk)
+            used += tokens
+        packed[name] = separator.join(parts)
+        usage[name] = used
+    return packed, usage
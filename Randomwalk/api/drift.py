@@ -0,0 +1,183 @@
+import threading
+from collections import Counter
+import numpy as np
+from scipy import sparse
+
+from .file_reader import DATA_DIR
+from .catalog import get_catalog
+from .search_index import tokenize
+from .transcript_index import get_analyst_questions
+
+# Conversational filler that dominates raw question counts but says nothing about focus
+_FILLER = frozenset("""
+ve re ll bit little talk talked talking obviously going see seeing saw like one much get give
+terms lot know mean really comments anything point sure well things thing time able want way
+say said maybe help color could would first second third last next back look looking make
+made may might us go got still even around kind sort good great nice congrats congratulations
+et cetera versus two
+""".split())
+
+# Company -> (sources signature, quarters, vocabulary, csr term-count matrix)
+_matrices = {}
+_lock = threading.Lock()
+
+
+def _company_files(company: str) -> list:
+    """
+    Transcripts for one company, sorted by quarter ('Amazon_2020Q1.txt', ...).
+    """
+    entries = get_catalog()["entries"].get(company, {})
+    return [DATA_DIR / entry["path"] for entry in entries.values() if entry["path"].lower().endswith(".txt")]
+
+
+def build_term_matrix(company: str):
+    """
+    Return (quarters, vocabulary, matrix) where matrix[i, j] counts term j in
+    the analyst questions of quarters[i]. Cached per company until a file changes.
+    """
+    files = _company_files(company)
+    signature = tuple((p.name, p.stat().st_mtime_ns) for p in files)
+    with _lock:
+        cached = _matrices.get(company)
+        if cached and cached[0] == signature:
+            return cached[1:]
+
+    quarters = []
+    vocabulary = {}
+    rows, cols, counts = [], [], []
+    for row, path in enumerate(files):
+        quarters.append(path.stem.rpartition("_")[2])
+        text = " ".join(turn["text"] for turn in get_analyst_questions(path))
+        focus_terms = [t for t in tokenize(text) if t not in _FILLER and not t.isdigit()]
+        for term, count in Counter(focus_terms).items():
+            rows.append(row)
+            cols.append(vocabulary.setdefault(term, len(vocabulary)))
+            counts.append(count)
+
+    matrix = sparse.csr_matrix(
+        (np.asarray(counts, dtype=np.float64), (rows, cols)),
+        shape=(len(quarters), len(vocabulary)),
+    )
+    terms = np.empty(len(vocabulary), dtype=object)
+    for term, col in vocabulary.items():
+        terms[col] = term
+
+    with _lock:
+        _matrices[company] = (signature, quarters, terms, matrix)
+    return quarters, terms, matrix
+
+
+def _normalize_rows(dense: np.ndarray) -> np.ndarray:
+    totals = dense.sum(axis=1, keepdims=True)
+    totals[totals == 0] = 1.0
+    return dense / totals
+
+
+def jensen_shannon(p: np.ndarray, q: np.ndarray) -> np.ndarray:
+    """
+    Row-wise Jensen-Shannon divergence (base 2, so 0 = identical, 1 = disjoint).
+    """
+    m = 0.5 * (p + q)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        kl_pm = np.where(p > 0, p * np.log2(p / m), 0.0).sum(axis=1)
+        kl_qm = np.where(q > 0, q * np.log2(q / m), 0.0).sum(axis=1)
+    return 0.5 * (kl_pm + kl_qm)
+
+
+def cosine_distance(p: np.ndarray, q: np.ndarray) -> np.ndarray:
+    """
+    Row-wise cosine distance (1 - cosine similarity).
+    """
+    norms = np.linalg.norm(p, axis=1) * np.linalg.norm(q, axis=1)
+    norms[norms == 0] = 1.0
+    return 1.0 - (p * q).sum(axis=1) / norms
+
+
+def _top_terms(terms: np.ndarray, delta: np.ndarray, top_n: int):
+    order = np.argsort(delta)
+    rising = [terms[i] for i in order[::-1][:top_n] if delta[i] > 0]
+    falling = [terms[i] for i in order[:top_n] if delta[i] < 0]
+    return rising, falling
+
+
+def compute_drift(company: str, start_q: str, end_q: str, top_n: int = 8) -> dict:
+    """
+    Quantify how analyst focus shifts across a quarter range without calling the LLM.
+
+    Returns quarter-over-quarter Jensen-Shannon and cosine drift with the top
+    rising/falling terms per step, plus the same for the whole range.
+    """
+    quarters, terms, matrix = build_term_matrix(company)
+    if start_q not in quarters or end_q not in quarters:
+        raise ValueError("Invalid quarter selection.")
+    start, end = quarters.index(start_q), quarters.index(end_q)
+    if start > end:
+        raise ValueError("Start quarter must be before or the same as end quarter.")
+
+    selected = quarters[start:end + 1]
+    block = matrix[start:end + 1]
+    # Only the columns used in this range, so the dense slice stays small
+    used = np.unique(block.indices)
+    shares = _normalize_rows(block[:, used].toarray())
+    used_terms = terms[used]
+
+    steps = []
+    if len(selected) > 1:
+        before, after = shares[:-1], shares[1:]
+        js = jensen_shannon(before, after)
+        cos = cosine_distance(before, after)
+        deltas = after - before
+        for i in range(len(selected) - 1):
+            rising, falling = _top_terms(used_terms, deltas[i], top_n)
+            steps.append({
+                "from": selected[i],
+                "to": selected[i + 1],
+                "jensen_shannon": float(js[i]),
+                "cosine": float(cos[i]),
+                "rising": rising,
+                "falling": falling,
+            })
+
+    overall_rising, overall_falling = _top_terms(used_terms, shares[-1] - shares[0], top_n)
+    return {
+        "company": company,
+        "quarters": selected,
+        "steps": steps,
+        "overall": {
+            "jensen_shannon": float(jensen_shannon(shares[:1], shares[-1:])[0]),
+            "cosine": float(cosine_distance(shares[:1], shares[-1:])[0]),
+            "rising": overall_rising,
+            "falling": overall_falling,
+        },
+    }
+
+
+def format_drift_report(drift: dict) -> str:
+    """
+    Render compute_drift output as the plain-text block shown on the analysis page.
+    """
+    quarters = drift["quarters"]
+    lines = [f"Analyst focus drift for {drift['company']} ({quarters[0]} - {quarters[-1]})"]
+    lines.append("Jensen-Shannon divergence: 0 = same focus, 1 = completely different focus.\n")
+
+    lines.append("== Quarter-over-Quarter ==")
+    for step in drift["steps"]:
+        lines.append(
+            f"\n- {step['from']} -> {step['to']}: JS {step['jensen_shannon']:.3f}, cosine distance {step['cosine']:.3f}"
+        )
+        lines.append(f"    Rising: {', '.join(step['rising']) or '-'}")
+        lines.append(f"    Falling: {', '.join(step['falling']) or '-'}")
+
+    overall = drift["overall"]
+    lines.append("\n\n== Whole Range ==")
+    lines.append(f"\n- {quarters[0]} -> {quarters[-1]}: JS {overall['jensen_shannon']:.3f}, cosine distance {overall['cosine']:.3f}")
+    lines.append(f"    Rising: {', '.join(overall['rising']) or '-'}")
+    lines.append(f"    Falling: {', '.join(overall['falling']) or '-'}")
+
+    if drift["steps"]:
+        biggest = sorted(drift["steps"], key=lambda step: step["jensen_shannon"], reverse=True)[:3]
+        lines.append("\n\n== Largest Shifts ==")
+        for step in biggest:
+            lines.append(f"- {step['from']} -> {step['to']} (JS {step['jensen_shannon']:.3f})")
+
+    return "\n".join(lines)
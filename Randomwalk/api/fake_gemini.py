@@ -0,0 +1,137 @@
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Answer returned by default: valid JSON for the trend formatter, short enough to stream in a few chunks
+DEFAULT_ANSWER = json.dumps({
+    "themes": [{"name": "Cloud growth", "summary": "Analysts focused on cloud demand.",
+                "evidence": [{"quote": "Demand remains strong.", "file": "Amazon_2024Q1.txt"}]}],
+    "turning_points": [],
+    "risks": [],
+})
+
+LATENCY_DISTRIBUTIONS = ("constant", "uniform", "normal", "lognormal", "exponential")
+
+# Error bodies in the shape the Gemini API uses
+_ERRORS = {
+    429: {"code": 429, "message": "Resource has been exhausted (e.g. check quota).", "status": "RESOURCE_EXHAUSTED"},
+    500: {"code": 500, "message": "An internal error has occurred.", "status": "INTERNAL"},
+}
+
+
+def latency_sampler(distribution: str = "constant", mean: float = 0.0, spread: float = 0.0, rng=None):
+    """
+    Return a function that draws one response latency in seconds.
+    `mean` is the average latency and `spread` its standard deviation
+    ('uniform' draws from mean +/- spread; 'exponential' ignores spread).
+    """
+    rng = rng or random.Random()
+    if distribution == "constant" or mean <= 0:
+        return lambda: max(mean, 0.0)
+    if distribution == "uniform":
+        return lambda: max(rng.uniform(mean - spread, mean + spread), 0.0)
+    if distribution == "normal":
+        return lambda: max(rng.gauss(mean, spread), 0.0)
+    if distribution == "lognormal":
+        # Parameters of the underlying normal that give this mean and standard deviation
+        sigma = math.sqrt(math.log(1 + (spread / mean) ** 2))
+        mu = math.log(mean) - sigma ** 2 / 2
+        return lambda: rng.lognormvariate(mu, sigma)
+    if distribution == "exponential":
+        return lambda: rng.expovariate(1 / mean)
+    raise ValueError(f"Unknown latency distribution: {distribution!r} (expected one of {', '.join(LATENCY_DISTRIBUTIONS)})")
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    """
+    Local stand-in for the Gemini REST API. Speaks the generateContent and
+    streamGenerateContent (?alt=sse) wire format used by views.call_gemini_api
+    and views.stream_gemini_api (and by litellm's gemini/ provider), answering
+    after a latency drawn from the server's sampler. A share of the requests
+    can be answered with 429 (rate limited, right away) or 500 instead.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with server.lock:
+            server.requests += 1
+            draw = server.rng.random()
+            latency = server.latency()
+            if draw < server.rate_limit_rate:
+                outcome = 429
+            elif draw < server.rate_limit_rate + server.error_rate:
+                outcome = 500
+            else:
+                outcome = 200
+            server.counts[outcome] = server.counts.get(outcome, 0) + 1
+
+        if outcome == 429:
+            self._send_json(429, {"error": _ERRORS[429]}, retry_after=server.retry_after)
+            return
+        time.sleep(latency)
+        if outcome != 200:
+            self._send_json(outcome, {"error": _ERRORS[outcome]})
+            return
+
+        if ":streamGenerateContent" in self.path:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            answer = server.answer
+            step = max(1, len(answer) // server.stream_chunks)
+            for start in range(0, len(answer), step):
+                event = {"candidates": [{"content": {"parts": [{"text": answer[start:start + step]}], "role": "model"}}]}
+                self.wfile.write(f"data: {json.dumps(event)}\r\n\r\n".encode("utf-8"))
+                self.wfile.flush()
+            self.close_connection = True
+            return
+
+        self._send_json(200, {
+            "candidates": [{"content": {"parts": [{"text": server.answer}], "role": "model"}, "finishReason": "STOP"}],
+            "usageMetadata": {"promptTokenCount": 0, "candidatesTokenCount": 0, "totalTokenCount": 0},
+        })
+
+    def _send_json(self, status: int, data: dict, retry_after: float = None):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if retry_after is not None:
+            self.send_header("Retry-After", f"{retry_after:g}")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_gemini(latency=0.0, answer: str = DEFAULT_ANSWER, host: str = "127.0.0.1", port: int = 0,
+                      rate_limit_rate: float = 0.0, error_rate: float = 0.0, retry_after: float = None, seed=None):
+    """
+    Start a FakeGeminiHandler server on a background thread and return it.
+    `latency` is seconds or a latency_sampler(); `rate_limit_rate` and
+    `error_rate` are the shares of requests answered with 429 and 500.
+    `server.base_url` can be used as views.API_URL_BASE (or LLM_API_BASE);
+    `server.counts` holds the answers by status. Call server.shutdown() when done.
+    """
+    server = ThreadingHTTPServer((host, port), FakeGeminiHandler)
+    server.daemon_threads = True
+    server.latency = latency if callable(latency) else latency_sampler("constant", latency)
+    server.answer = answer
+    server.stream_chunks = 4
+    server.rate_limit_rate = rate_limit_rate
+    server.error_rate = error_rate
+    server.retry_after = retry_after
+    server.rng = random.Random(seed)
+    server.requests = 0
+    server.counts = {}
+    server.lock = threading.Lock()
+    server.base_url = f"http://{host}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, name="fake-gemini", daemon=True).start()
+    return server
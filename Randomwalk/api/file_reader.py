@@ -1,6 +1,12 @@
 import os
+import sys
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from pypdf import PdfReader
+from django.conf import settings
+
+from .pdf_extract import extract_pdf_text, extract_pdf_texts
+from .transcript_store import is_stored, read_stored_text
 
 # Base directory of the project (where manage.py lives)
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -28,15 +34,151 @@ def build_doc_path(filename: str) -> Path:
     return path
 
 
+class TextCache:
+    """
+    Process-wide LRU cache of decoded document text.
+
+    Entries are keyed by the resolved path plus its mtime and size, so an edited
+    file is simply a cache miss. The cache is bounded by the total size of the
+    cached strings (in bytes) rather than by entry count.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # path -> (mtime_ns, size, text, nbytes)
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, path: Path, mtime_ns: int, size: int):
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry and entry[0] == mtime_ns and entry[1] == size:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+            return None
+
+    def put(self, path: Path, mtime_ns: int, size: int, text: str) -> None:
+        nbytes = sys.getsizeof(text)
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old:
+                self.current_bytes -= old[3]
+            self._entries[path] = (mtime_ns, size, text, nbytes)
+            self.current_bytes += nbytes
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted[3]
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+_text_cache = None
+
+
+def get_text_cache() -> TextCache:
+    """
+    Return the shared TextCache, sized from settings.TRANSCRIPT_CACHE_MAX_BYTES.
+    """
+    global _text_cache
+    if _text_cache is None:
+        _text_cache = TextCache(getattr(settings, "TRANSCRIPT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+    return _text_cache
+
+
 def read_text_from_path(path: Path) -> str:
     """
     Read text content from a .txt or .pdf file.
+
+    Files ingested with `manage.py ingest_transcripts` are decoded, already
+    normalized, from the memory-mapped transcript store on every call. They are
+    not kept in the TextCache, so worker processes share the store's pages
+    instead of each holding its own copy. Other files are decoded once and
+    served from the shared TextCache until the file changes.
     """
     _assert_under_data(path)
 
     if not path.exists():
         raise FileNotFoundError(str(path))
 
+    path = path.resolve()
+    stat = path.stat()
+
+    text = read_stored_text(path, stat)
+    if text is not None:
+        return text
+
+    cache = get_text_cache()
+    text = cache.get(path, stat.st_mtime_ns, stat.st_size)
+    if text is None:
+        text = _read_text_uncached(path)
+        cache.put(path, stat.st_mtime_ns, stat.st_size, text)
+    return text
+
+
+def read_section_from_path(path: Path, section: str):
+    """
+    Return one section ("participants", "presentation" or "qa") of an ingested
+    transcript straight from the store, or None when the file is not in the
+    store or the section was not found at ingest time.
+    """
+    _assert_under_data(path)
+    path = path.resolve()
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return read_stored_text(path, stat, section)
+
+
+def prefetch_texts(paths) -> None:
+    """
+    Load several documents into the TextCache at once, so uncached PDFs are
+    extracted in parallel rather than one after another on first read.
+    """
+    cache = get_text_cache()
+    pdfs = {}
+    for path in paths:
+        _assert_under_data(path)
+        path = path.resolve()
+        if path.suffix.lower() != ".pdf" or not path.exists():
+            continue
+        stat = path.stat()
+        if cache.get(path, stat.st_mtime_ns, stat.st_size) is not None:
+            continue
+        # Ingested PDFs are read from the transcript store; nothing to extract
+        if not is_stored(path, stat):
+            pdfs[path] = stat
+    if pdfs:
+        for path, text in extract_pdf_texts(list(pdfs)).items():
+            cache.put(path, pdfs[path].st_mtime_ns, pdfs[path].st_size, text)
+
+
+def _read_text_uncached(path: Path) -> str:
+    """
+    Decode a .txt file or extract the text of every page of a .pdf file.
+    """
     ext = path.suffix.lower()
 
     if ext == ".txt":
@@ -44,15 +186,7 @@ def read_text_from_path(path: Path) -> str:
             return f.read()
 
     if ext == ".pdf":
-        reader = PdfReader(str(path))
-        chunks = []
-        # Attempt to extract text from each page
-        for page in reader.pages:
-            try:
-                # Use .extract_text() and default to empty string if extraction fails
-                chunks.append(page.extract_text() or "")
-            except Exception:
-                chunks.append("")
-        return "\n".join(chunks)
+        # Extracted in a process pool and kept as a content-hashed sidecar
+        return extract_pdf_text(path)
 
     raise ValueError(f"Unsupported file type: {ext}")
\ No newline at end of file
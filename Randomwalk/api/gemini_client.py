@@ -0,0 +1,80 @@
+import asyncio
+import importlib.util
+import random
+import weakref
+import httpx
+from django.conf import settings
+
+# One client + semaphore per event loop. Under ASGI that is one per worker process;
+# under WSGI each async_to_sync call gets its own loop, and connections cannot be
+# shared across loops anyway.
+_clients = weakref.WeakKeyDictionary()
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def _http2_enabled() -> bool:
+    """
+    HTTP/2 needs the optional 'h2' package; fall back to HTTP/1.1 keep-alive without it.
+    """
+    return getattr(settings, "GEMINI_HTTP2", False) and importlib.util.find_spec("h2") is not None
+
+
+def get_gemini_client() -> httpx.AsyncClient:
+    """
+    Return the long-lived, connection-pooled client for the running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        max_concurrency = getattr(settings, "GEMINI_MAX_CONCURRENCY", 8)
+        client = httpx.AsyncClient(
+            timeout=60.0,
+            http2=_http2_enabled(),
+            limits=httpx.Limits(
+                max_connections=max_concurrency,
+                max_keepalive_connections=max_concurrency,
+                keepalive_expiry=60.0,
+            ),
+        )
+        _clients[loop] = client
+    return client
+
+
+def get_gemini_semaphore() -> asyncio.Semaphore:
+    """
+    Return the semaphore capping in-flight provider calls (GEMINI_MAX_CONCURRENCY)
+    for the running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(getattr(settings, "GEMINI_MAX_CONCURRENCY", 8))
+        _semaphores[loop] = semaphore
+    return semaphore
+
+
+def backoff_delay(attempt: int, response: httpx.Response = None) -> float:
+    """
+    Seconds to wait before retry number `attempt` (0-based): the server's
+    Retry-After if it sent one, otherwise exponential backoff with full jitter.
+    """
+    max_delay = getattr(settings, "GEMINI_BACKOFF_MAX_SECONDS", 16.0)
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return min(float(retry_after), max_delay)
+            except ValueError:
+                pass
+    base = getattr(settings, "GEMINI_BACKOFF_BASE_SECONDS", 1.0)
+    return random.uniform(0, min(max_delay, base * (2 ** attempt)))
+
+
+async def aclose_gemini_clients() -> None:
+    """
+    Close pooled clients (e.g. on shutdown or between tests).
+    """
+    for client in list(_clients.values()):
+        await client.aclose()
+    _clients.clear()
+    _semaphores.clear()
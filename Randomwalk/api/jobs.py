@@ -0,0 +1,121 @@
+import asyncio
+import logging
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from .analysis import AnalysisError, get_file_paths_for_range, get_ticker, run_trend_analysis
+from .models import AnalysisJob
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_analysis(company: str, start_q: str, end_q: str) -> AnalysisJob:
+    """
+    Validate the range and queue a background analysis. Raises ValueError /
+    FileNotFoundError for bad input so the caller can answer immediately.
+    """
+    get_file_paths_for_range(company, start_q, end_q)
+    return AnalysisJob.objects.create(company=company, start_quarter=start_q, end_quarter=end_q)
+
+
+def claim_next_job():
+    """
+    Atomically move the oldest queued job to 'running' and return it (or None).
+
+    The claim is a conditional UPDATE, so two workers racing for the same row
+    cannot both win, on SQLite as well as PostgreSQL.
+    """
+    while True:
+        candidate = (
+            AnalysisJob.objects.filter(status=AnalysisJob.STATUS_QUEUED)
+            .order_by('created_at')
+            .values_list('pk', flat=True)
+            .first()
+        )
+        if candidate is None:
+            return None
+        claimed = AnalysisJob.objects.filter(pk=candidate, status=AnalysisJob.STATUS_QUEUED).update(
+            status=AnalysisJob.STATUS_RUNNING,
+            started_at=timezone.now(),
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return AnalysisJob.objects.get(pk=candidate)
+
+
+def requeue_stale_jobs() -> int:
+    """
+    Put 'running' jobs whose worker died (older than ANALYSIS_JOB_TIMEOUT_SECONDS) back in the queue.
+    """
+    timeout = getattr(settings, 'ANALYSIS_JOB_TIMEOUT_SECONDS', 900)
+    return AnalysisJob.objects.filter(
+        status=AnalysisJob.STATUS_RUNNING,
+        started_at__lt=timezone.now() - timedelta(seconds=timeout),
+    ).update(status=AnalysisJob.STATUS_QUEUED)
+
+
+def run_job(job: AnalysisJob) -> None:
+    """
+    Run the trend analysis for a claimed job and store the outcome.
+    Provider failures and unparseable answers (AnalysisError) mark the job failed.
+    """
+    try:
+        paths = get_file_paths_for_range(job.company, job.start_quarter, job.end_quarter)
+        job.result = run_trend_analysis(
+            paths, job.company, job.start_quarter, job.end_quarter, get_ticker(job.company)
+        )
+        job.status = AnalysisJob.STATUS_DONE
+    except AnalysisError as e:
+        logger.warning("Analysis job %s failed: %s", job.pk, str(e)[:200])
+        job.error = str(e)
+        job.status = AnalysisJob.STATUS_FAILED
+    except Exception as e:
+        logger.exception("Analysis job %s failed", job.pk)
+        job.error = str(e)
+        job.status = AnalysisJob.STATUS_FAILED
+    job.finished_at = timezone.now()
+    job.save(update_fields=['result', 'error', 'status', 'finished_at'])
+
+
+def run_next_job() -> bool:
+    """
+    Claim and run one job. Returns False when the queue is empty.
+    Runs in a worker thread, so it manages its own DB connection.
+    """
+    close_old_connections()
+    try:
+        job = claim_next_job()
+        if job is None:
+            return False
+        run_job(job)
+        return True
+    finally:
+        close_old_connections()
+
+
+async def _worker(stop: asyncio.Event, drain: bool) -> None:
+    poll = getattr(settings, 'ANALYSIS_JOB_POLL_SECONDS', 1.0)
+    while not stop.is_set():
+        # run_trend_analysis is blocking, so each job runs on its own thread
+        ran = await sync_to_async(run_next_job, thread_sensitive=False)()
+        if not ran:
+            if drain:
+                return
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=poll)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def run_workers(workers: int, stop: asyncio.Event = None, drain: bool = False) -> None:
+    """
+    Run `workers` concurrent job consumers until `stop` is set
+    (or, with drain=True, until the queue is empty).
+    """
+    stop = stop or asyncio.Event()
+    await sync_to_async(requeue_stale_jobs, thread_sensitive=False)()
+    await asyncio.gather(*[_worker(stop, drain) for _ in range(workers)])
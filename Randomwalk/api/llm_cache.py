@@ -0,0 +1,102 @@
+import hashlib
+import json
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import LLMResponse
+
+
+def _enabled() -> bool:
+    return getattr(settings, "LLM_CACHE_ENABLED", True)
+
+
+def make_cache_key(model_name: str, system_prompt: str, user_prompt: str, temperature=None) -> str:
+    """
+    Content address for an LLM call: sha256 over everything that changes the answer.
+    """
+    payload = json.dumps([model_name, system_prompt, user_prompt, temperature], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get_cached_response(key: str):
+    """
+    Return the cached response text for a key, or None if missing/expired.
+    """
+    if not _enabled():
+        return None
+
+    entry = LLMResponse.objects.filter(key=key).only("id", "response", "created_at").first()
+    if entry is None:
+        return None
+
+    ttl = getattr(settings, "LLM_CACHE_TTL_SECONDS", 0)
+    if ttl and entry.created_at < timezone.now() - timedelta(seconds=ttl):
+        entry.delete()
+        return None
+
+    # Bump usage in one UPDATE so eviction can prefer rarely used rows
+    LLMResponse.objects.filter(pk=entry.pk).update(hits=F("hits") + 1, last_used_at=timezone.now())
+    return entry.response
+
+
+def store_response(key: str, model_name: str, response: str) -> None:
+    """
+    Save a successful LLM response and evict the least recently used rows if the
+    cache grew past LLM_CACHE_MAX_BYTES.
+    """
+    if not _enabled():
+        return
+
+    LLMResponse.objects.update_or_create(
+        key=key,
+        defaults={
+            "model_name": model_name,
+            "response": response,
+            "size_bytes": len(response.encode("utf-8")),
+            "created_at": timezone.now(),
+        },
+    )
+    evict_expired_and_oversize()
+
+
+def delete_response(key: str) -> None:
+    """
+    Forget a cached response (e.g. one that turned out to be unusable) so the next call asks the provider again.
+    """
+    LLMResponse.objects.filter(key=key).delete()
+
+
+def evict_expired_and_oversize() -> int:
+    """
+    Drop expired rows, then the least recently used rows until the total stored
+    size fits LLM_CACHE_MAX_BYTES. Returns the number of rows deleted.
+    """
+    deleted = 0
+    ttl = getattr(settings, "LLM_CACHE_TTL_SECONDS", 0)
+    if ttl:
+        deleted += LLMResponse.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=ttl)).delete()[0]
+
+    max_bytes = getattr(settings, "LLM_CACHE_MAX_BYTES", 0)
+    if not max_bytes:
+        return deleted
+
+    total = LLMResponse.objects.aggregate(total=Sum("size_bytes"))["total"] or 0
+    if total <= max_bytes:
+        return deleted
+
+    to_delete = []
+    for pk, size in LLMResponse.objects.order_by("last_used_at").values_list("pk", "size_bytes").iterator():
+        if total <= max_bytes:
+            break
+        to_delete.append(pk)
+        total -= size
+    deleted += LLMResponse.objects.filter(pk__in=to_delete).delete()[0]
+    return deleted
+
+
+# Async variants for the ASGI views
+aget_cached_response = sync_to_async(get_cached_response)
+astore_response = sync_to_async(store_response)
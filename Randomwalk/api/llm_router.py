@@ -1,11 +1,25 @@
 import os
+from django.conf import settings
 from litellm import completion
 
-def call_llm(model_name: str, system_prompt: str, user_prompt: str) -> str:
+from .llm_cache import make_cache_key, get_cached_response, store_response
+
+# Fixed sampling temperature; part of the response cache key
+TEMPERATURE = 0.2
+
+def call_llm(model_name: str, system_prompt: str, user_prompt: str, use_cache: bool = True) -> str:
     """
     Unified LLM caller.
     ...
+    Identical calls are answered from the persistent response cache unless
+    use_cache is False (the fresh answer is still stored).
     """
+    cache_key = make_cache_key(model_name, system_prompt, user_prompt, TEMPERATURE)
+    if use_cache:
+        cached = get_cached_response(cache_key)
+        if cached is not None:
+            return cached
+
     # *** CRITICAL FIX: Explicitly pass the Google API Key ***
     # We retrieve the key from the environment variable GOOGLE_API_KEY
     # This prevents confusion with other cached keys (like the invalid OpenAI key).
@@ -29,8 +43,12 @@ def call_llm(model_name: str, system_prompt: str, user_prompt: str) -> str:
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt},
         ],
-        temperature=0.2,
+        temperature=TEMPERATURE,
         # Pass the key directly as a parameter
         api_key=api_key_to_use, 
+        # None = the provider's own endpoint
+        api_base=getattr(settings, "LLM_API_BASE", None),
     )
-    return response["choices"][0]["message"]["content"]
+    content = response["choices"][0]["message"]["content"]
+    store_response(cache_key, model_name, content)
+    return content
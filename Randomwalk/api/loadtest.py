@@ -0,0 +1,205 @@
+import asyncio
+import json
+import random
+import re
+import statistics
+import time
+from collections import Counter
+
+from .catalog import get_companies, get_quarters
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+HISTOGRAM_BOUNDS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Request mix used when --mix is not given (relative weights)
+DEFAULT_MIX = {"analysis": 2, "analysis_stream": 1, "tracking": 5, "ab": 2}
+
+_UPSTREAM_ERROR_RE = re.compile(r"API Error \(HTTP (\d+)\)")
+
+
+def parse_mix(text: str) -> dict:
+    """
+    Parse "analysis=2,tracking=5" into {scenario: weight}.
+    """
+    mix = {}
+    for part in filter(None, (p.strip() for p in text.split(","))):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario: {name!r} (expected one of {', '.join(SCENARIOS)})")
+        mix[name] = float(weight or 1)
+        if mix[name] < 0:
+            raise ValueError(f"Negative weight for {name}")
+    if not any(mix.values()):
+        raise ValueError("The request mix is empty.")
+    return mix
+
+
+def _upstream_outcome(text: str) -> str:
+    """
+    The analysis views answer 200 even when the provider call failed; classify
+    the provider error carried in the page or event stream.
+    """
+    match = _UPSTREAM_ERROR_RE.search(text)
+    if match:
+        return f"upstream HTTP {match.group(1)}"
+    if "failed after multiple retries" in text:
+        return "upstream retries exhausted"
+    if "An unexpected error occurred during API call" in text:
+        return "upstream unreachable"
+    if "An error occurred during analysis" in text:
+        return "analysis error"
+    return "ok"
+
+
+def _random_range(rng: random.Random) -> dict:
+    company = rng.choice(get_companies())
+    quarters = get_quarters(company)
+    start = rng.randrange(len(quarters))
+    end = rng.randrange(start, len(quarters))
+    # refresh=1 sends every analysis to the provider instead of the response cache
+    return {"company": company, "start_quarter": quarters[start], "end_quarter": quarters[end], "refresh": "1"}
+
+
+async def _analysis(client, rng):
+    response = await client.post("/analysis/", data=_random_range(rng))
+    if response.status_code != 200:
+        return f"HTTP {response.status_code}"
+    # Only the rendered result: the page's script contains the same error wording
+    page = response.text
+    start = page.find("Analysis Results")
+    if start < 0:
+        return "no result"
+    return _upstream_outcome(page[start:page.find("<!-- Streaming Output", start)])
+
+
+async def _analysis_stream(client, rng):
+    async with client.stream("POST", "/analysis/stream/", data=_random_range(rng)) as response:
+        if response.status_code != 200:
+            await response.aread()
+            return f"HTTP {response.status_code}"
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:") and event == "error":
+                return _upstream_outcome(json.loads(line[5:]).get("message", ""))
+    return "ok" if event == "done" else "stream incomplete"
+
+
+async def _tracking(client, rng):
+    beacon = {"events": [{"path": "/analysis/", "duration": rng.randint(1, 300)}]}
+    response = await client.post("/tracking/api/update-time/", content=json.dumps(beacon),
+                                 headers={"Content-Type": "application/json"})
+    return "ok" if response.status_code == 200 else f"HTTP {response.status_code}"
+
+
+async def _ab(client, rng):
+    response = await client.get("/9ad7709")
+    return "ok" if response.status_code == 200 else f"HTTP {response.status_code}"
+
+
+# Name -> coroutine(client, rng) returning "ok" or an error label
+SCENARIOS = {
+    "analysis": _analysis,
+    "analysis_stream": _analysis_stream,
+    "tracking": _tracking,
+    "ab": _ab,
+}
+
+
+async def run_load(base_url: str, mix: dict, rps: float, duration: float, max_in_flight: int = 200,
+                   arrivals: str = "poisson", timeout: float = 120.0, seed=None) -> dict:
+    """
+    Open-loop load: start requests at `rps` per second for `duration` seconds,
+    picking the scenario by `mix` weight, whether or not earlier requests have
+    finished ('poisson' or evenly spaced 'uniform' arrivals). A request that
+    would exceed `max_in_flight` is counted as dropped instead of being sent.
+
+    Returns {"elapsed", "scenarios": {name: {"latencies": [seconds], "outcomes": Counter}}}.
+    """
+    import httpx
+
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    results = {name: {"latencies": [], "outcomes": Counter()} for name in names}
+    in_flight = set()
+
+    async def one(client, name):
+        started = time.perf_counter()
+        try:
+            outcome = await SCENARIOS[name](client, rng)
+        except httpx.HTTPError as e:
+            outcome = type(e).__name__
+        results[name]["latencies"].append(time.perf_counter() - started)
+        results[name]["outcomes"][outcome] += 1
+
+    limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        # Warm-up request gets the visitor cookie the tracking beacons are matched to
+        await client.get("/analysis/")
+
+        started = time.perf_counter()
+        next_at = 0.0
+        while next_at < duration:
+            delay = started + next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            name = rng.choices(names, weights)[0]
+            if len(in_flight) >= max_in_flight:
+                results[name]["outcomes"]["dropped (max in flight)"] += 1
+            else:
+                task = asyncio.create_task(one(client, name))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+            next_at += rng.expovariate(rps) if arrivals == "poisson" else 1 / rps
+        if in_flight:
+            await asyncio.gather(*in_flight)
+        elapsed = time.perf_counter() - started
+    return {"elapsed": elapsed, "scenarios": results}
+
+
+def histogram(latencies: list) -> list:
+    """
+    [(bucket label, count)] over HISTOGRAM_BOUNDS_MS.
+    """
+    counts = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+    for seconds in latencies:
+        ms = seconds * 1000
+        index = next((i for i, bound in enumerate(HISTOGRAM_BOUNDS_MS) if ms <= bound), len(HISTOGRAM_BOUNDS_MS))
+        counts[index] += 1
+    labels = [f"<= {bound} ms" for bound in HISTOGRAM_BOUNDS_MS] + [f"> {HISTOGRAM_BOUNDS_MS[-1]} ms"]
+    return list(zip(labels, counts))
+
+
+def summarize(results: dict) -> dict:
+    """
+    Per scenario and overall: requests, ok, throughput (completed/s),
+    goodput (ok/s), latency percentiles in ms and the error breakdown.
+    """
+    elapsed = results["elapsed"]
+
+    def stats(latencies, outcomes):
+        ordered = sorted(latencies)
+        ok = outcomes.get("ok", 0)
+        summary = {
+            "requests": sum(outcomes.values()),
+            "completed": len(ordered),
+            "ok": ok,
+            "throughput": len(ordered) / elapsed if elapsed else 0.0,
+            "goodput": ok / elapsed if elapsed else 0.0,
+            "errors": {label: n for label, n in outcomes.most_common() if label != "ok"},
+        }
+        if ordered:
+            summary.update({
+                "p50_ms": statistics.median(ordered) * 1000,
+                "p95_ms": ordered[max(0, int(len(ordered) * 0.95) - 1)] * 1000,
+                "p99_ms": ordered[max(0, int(len(ordered) * 0.99) - 1)] * 1000,
+                "max_ms": ordered[-1] * 1000,
+            })
+        return summary
+
+    scenarios = {name: stats(r["latencies"], r["outcomes"]) for name, r in results["scenarios"].items()}
+    every = [seconds for r in results["scenarios"].values() for seconds in r["latencies"]]
+    outcomes = sum((r["outcomes"] for r in results["scenarios"].values()), Counter())
+    return {"elapsed": elapsed, "total": stats(every, outcomes), "scenarios": scenarios}
@@ -0,0 +1,95 @@
+import json
+import platform
+import sys
+import tempfile
+from pathlib import Path
+from unittest import mock
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from api.benchmarks import BENCHMARKS, compare_to_baseline, run_benchmarks
+from tracking.buffer import VisitBuffer
+
+
+class Command(BaseCommand):
+    help = ('Offline benchmarks of the analysis pipeline (stub LLM, throwaway database and cache directory) with '
+            'p50/p95 and allocations, compared against a stored baseline. No baseline is committed (timings depend '
+            'on the machine): record one first with --save-baseline')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', action='append', choices=list(BENCHMARKS), help='Run only this benchmark (repeatable)')
+        parser.add_argument('--iterations', type=int, default=50, help='Timed calls per benchmark')
+        parser.add_argument('--warmup', type=int, default=3, help='Untimed calls before timing')
+        parser.add_argument('--llm-latency-ms', type=float, default=20.0,
+                            help='Latency of the stub LLM and of the local fake Gemini endpoint')
+        parser.add_argument('--no-allocations', action='store_true', help='Skip the tracemalloc pass')
+        parser.add_argument('--baseline', default=str(Path(settings.BASE_DIR) / 'benchmarks' / 'analysis_baseline.json'),
+                            help='Baseline file to compare against; it must exist unless --save-baseline is given')
+        parser.add_argument('--save-baseline', action='store_true', help='Store these results as the new baseline')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed slowdown / allocation growth vs the baseline (0.25 = 25%%)')
+
+    def handle(self, *args, **options):
+        baseline_path = Path(options['baseline'])
+        baseline = None
+        if not options['save_baseline']:
+            # Checked up front: the suite takes a while, and without a baseline there is nothing to compare
+            try:
+                with baseline_path.open('r', encoding='utf-8') as f:
+                    baseline = json.load(f)
+            except OSError:
+                raise CommandError(f"No baseline at {baseline_path} (record one first with --save-baseline)")
+
+        names = options['only'] or list(BENCHMARKS)
+        llm_latency = options['llm_latency_ms'] / 1000
+        self.stdout.write(f"{'benchmark':<24}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}{'peak KB':>10}{'kept KB':>10}")
+
+        def report(name, result):
+            self.stdout.write(
+                f"{name:<24}{result['p50_ms']:>10.3f}{result['p95_ms']:>10.3f}{result['mean_ms']:>10.3f}"
+                f"{result.get('peak_kb', float('nan')):>10.1f}{result.get('retained_kb', float('nan')):>10.1f}"
+            )
+
+        # Same isolation as the test runner: a throwaway database, and page visits are never written.
+        # Transcript and BM25 indexes, manifests and PDF sidecars are written to a temporary
+        # ANALYSIS_CACHE_DIR; the transcript store (TRANSCRIPT_STORE_PATH) is only read.
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        visit_buffer = VisitBuffer()
+        visit_buffer._start = lambda: None
+        try:
+            with tempfile.TemporaryDirectory() as cache_dir, \
+                    override_settings(ANALYSIS_CACHE_DIR=Path(cache_dir)), \
+                    mock.patch('tracking.middleware.get_visit_buffer', return_value=visit_buffer):
+                results = run_benchmarks(names, options['iterations'], options['warmup'], llm_latency,
+                                         allocations=not options['no_allocations'], report=report)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        environment = {
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'llm_latency_ms': options['llm_latency_ms'],
+            'iterations': options['iterations'],
+        }
+        if options['save_baseline']:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            with baseline_path.open('w', encoding='utf-8') as f:
+                json.dump({'environment': environment, 'results': results}, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {baseline_path}"))
+            return
+
+        if baseline['environment'].get('llm_latency_ms') != options['llm_latency_ms']:
+            self.stdout.write(self.style.WARNING(
+                f"Baseline was recorded with --llm-latency-ms {baseline['environment'].get('llm_latency_ms')}"
+            ))
+
+        regressions = compare_to_baseline(results, baseline['results'], options['tolerance'])
+        for name, metric, before, after in regressions:
+            self.stdout.write(self.style.ERROR(f"REGRESSION {name} {metric}: {before} -> {after}"))
+        if regressions:
+            raise CommandError(f"{len(regressions)} regression(s) against {baseline_path}")
+        self.stdout.write(self.style.SUCCESS(f"No regressions against {baseline_path} (tolerance {options['tolerance']:.0%})"))
@@ -0,0 +1,48 @@
+import time
+from django.core.management.base import BaseCommand
+
+from api.fake_gemini import LATENCY_DISTRIBUTIONS, latency_sampler, start_fake_gemini
+
+
+def add_fake_gemini_arguments(parser):
+    """
+    Options shared with `manage.py load_test`, which starts the same server.
+    """
+    parser.add_argument('--latency-ms', type=float, default=800.0, help='Mean provider latency')
+    parser.add_argument('--latency-spread-ms', type=float, default=300.0, help='Standard deviation of the latency')
+    parser.add_argument('--latency-distribution', choices=LATENCY_DISTRIBUTIONS, default='lognormal')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Share of calls answered with 429 (0-1)')
+    parser.add_argument('--retry-after', type=float, default=None, help='Retry-After seconds sent with each 429')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of calls answered with 500 (0-1)')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for latencies and injected errors')
+
+
+def start_from_options(options, host='127.0.0.1', port=0):
+    latency = latency_sampler(options['latency_distribution'], options['latency_ms'] / 1000,
+                              options['latency_spread_ms'] / 1000)
+    return start_fake_gemini(latency=latency, host=host, port=port, rate_limit_rate=options['rate_limit_rate'],
+                             error_rate=options['error_rate'], retry_after=options['retry_after'], seed=options['seed'])
+
+
+class Command(BaseCommand):
+    help = 'Runs a local stand-in for the Gemini API (generateContent / streamGenerateContent) for load tests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        add_fake_gemini_arguments(parser)
+
+    def handle(self, *args, **options):
+        server = start_from_options(options, options['host'], options['port'])
+        self.stdout.write(f"Fake Gemini API listening on {server.base_url}")
+        self.stdout.write("Point the app at it with:")
+        self.stdout.write(f"  GEMINI_API_BASE={server.base_url} LLM_API_BASE={server.base_url} GOOGLE_API_KEY=fake")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.shutdown()
+            counts = ", ".join(f"{status}: {n}" for status, n in sorted(server.counts.items())) or "none"
+            self.stdout.write(f"{server.requests} request(s) answered ({counts})")
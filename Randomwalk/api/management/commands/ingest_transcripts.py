@@ -0,0 +1,81 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.catalog import get_catalog
+from api.context_packer import estimate_tokens
+from api.file_reader import DATA_DIR, _read_text_uncached
+from api.pdf_extract import extract_pdf_texts
+from api.transcript_store import get_store_path, normalize_transcript, write_store
+
+
+class Command(BaseCommand):
+    help = 'Normalizes every transcript in data/ into the compact transcript store read by api.file_reader'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.PDF_EXTRACT_WORKERS,
+                            help='Processes used to normalize transcripts (1 = in this process)')
+        parser.add_argument('--output', help='Store file to write (default: settings.TRANSCRIPT_STORE_PATH)')
+        parser.add_argument('--summary-only', action='store_true', help='Only print the totals, not one line per file')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        output = Path(options['output']) if options['output'] else get_store_path()
+
+        sources = []
+        for company, quarters in get_catalog()['entries'].items():
+            for quarter, entry in quarters.items():
+                path = DATA_DIR / entry['path']
+                # Stat before reading: if the file changes meanwhile, its store entry is simply stale
+                sources.append((company, quarter, path, path.stat()))
+
+        # Raw text straight from data/ (never from an older store); PDFs go through the extraction pool
+        pdf_texts = extract_pdf_texts([path for _, _, path, _ in sources if path.suffix.lower() == '.pdf'])
+        raw_texts = [pdf_texts.get(path) or _read_text_uncached(path) for _, _, path, _ in sources]
+
+        workers = options['workers']
+        if workers > 1 and len(raw_texts) > 1:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+                texts = list(pool.map(normalize_transcript, raw_texts, chunksize=4))
+        else:
+            texts = [normalize_transcript(text) for text in raw_texts]
+
+        documents = []
+        for (company, quarter, path, stat), raw, text in zip(sources, raw_texts, texts):
+            documents.append({
+                'name': path.name,
+                'text': text,
+                'company': company,
+                'quarter': quarter,
+                'source_mtime_ns': stat.st_mtime_ns,
+                'source_size': stat.st_size,
+                'raw_bytes': len(raw.encode('utf-8')),
+                'raw_tokens': estimate_tokens(raw),
+                'tokens': estimate_tokens(text),
+            })
+        index = write_store(output, documents)
+
+        raw_bytes = raw_tokens = stored_bytes = stored_tokens = 0
+        for document in documents:
+            entry = index['entries'][document['name']]
+            raw_bytes += entry['raw_bytes']
+            raw_tokens += entry['raw_tokens']
+            stored_bytes += entry['length']
+            stored_tokens += entry['tokens']
+            if not options['summary_only']:
+                self.stdout.write(self.format_line(document['name'], entry['raw_bytes'], entry['length'],
+                                                   entry['raw_tokens'], entry['tokens']))
+
+        self.stdout.write(self.format_line('TOTAL', raw_bytes, stored_bytes, raw_tokens, stored_tokens))
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {len(documents)} transcript(s) to {output} ({output.stat().st_size:,} bytes) "
+            f"in {time.monotonic() - started:.1f}s"
+        ))
+
+    def format_line(self, name, raw_bytes, stored_bytes, raw_tokens, stored_tokens):
+        saved = 100.0 * (raw_bytes - stored_bytes) / raw_bytes if raw_bytes else 0.0
+        return (f"{name:<28} {raw_bytes:>10,} -> {stored_bytes:>10,} bytes ({saved:4.1f}% saved)  "
+                f"{raw_tokens:>8,} -> {stored_tokens:>8,} tokens ({raw_tokens - stored_tokens:,} saved)")
@@ -0,0 +1,130 @@
+import asyncio
+import importlib.util
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.loadtest import DEFAULT_MIX, histogram, parse_mix, run_load, summarize
+from api.management.commands.fake_gemini_server import add_fake_gemini_arguments, start_from_options
+
+
+class Command(BaseCommand):
+    help = ('Open-loop load test of the ASGI app (analysis, tracking and A/B endpoints) at a target RPS, '
+            'against uvicorn workers wired to a local fake Gemini API')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rps', type=float, default=20.0, help='Target requests per second')
+        parser.add_argument('--duration', type=float, default=30.0, help='Seconds of load')
+        parser.add_argument('--mix', default=','.join(f'{k}={v}' for k, v in DEFAULT_MIX.items()),
+                            help='Scenario weights, e.g. analysis=2,analysis_stream=1,tracking=5,ab=2')
+        parser.add_argument('--arrivals', choices=('poisson', 'uniform'), default='poisson')
+        parser.add_argument('--max-in-flight', type=int, default=200,
+                            help='Client-side cap on open requests; arrivals beyond it are counted as dropped')
+        parser.add_argument('--timeout', type=float, default=120.0, help='Per-request timeout in seconds')
+        parser.add_argument('--workers', type=int, default=1, help='uvicorn worker processes to start')
+        parser.add_argument('--url', default=None,
+                            help='Load an already running server instead (start it with GEMINI_API_BASE pointing '
+                                 'at `manage.py fake_gemini_server`)')
+        parser.add_argument('--json', action='store_true', help='Print the summary as JSON')
+        add_fake_gemini_arguments(parser)
+
+    def handle(self, *args, **options):
+        if importlib.util.find_spec('httpx') is None:
+            raise CommandError("The load test needs httpx installed (pip install -r requirements-dev.txt)")
+        try:
+            mix = parse_mix(options['mix'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options['rps'] <= 0:
+            raise CommandError("--rps must be positive")
+
+        fake = server = None
+        base_url = options['url']
+        try:
+            if base_url is None:
+                fake = start_from_options(options)
+                base_url, server = self.start_server(options['workers'], fake.base_url)
+            results = asyncio.run(run_load(
+                base_url.rstrip('/'), mix, options['rps'], options['duration'], options['max_in_flight'],
+                options['arrivals'], options['timeout'], options['seed'],
+            ))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=30)
+            if fake is not None:
+                fake.shutdown()
+
+        summary = summarize(results)
+        if fake is not None:
+            summary['provider'] = {'requests': fake.requests, 'by_status': fake.counts}
+        if options['json']:
+            summary['histograms'] = {name: histogram(r['latencies']) for name, r in results['scenarios'].items()}
+            self.stdout.write(json.dumps(summary, indent=2))
+        else:
+            self.write_report(summary, results, options)
+
+    def start_server(self, workers, provider_url):
+        """
+        Start `uvicorn myproject.asgi:application` with every provider call
+        going to the fake API; returns (base URL, process) once it answers.
+        """
+        if importlib.util.find_spec('uvicorn') is None:
+            raise CommandError("The load test needs uvicorn installed (pip install -r requirements-dev.txt, or pass --url)")
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            port = s.getsockname()[1]
+        env = dict(os.environ, GEMINI_API_BASE=provider_url, LLM_API_BASE=provider_url)
+        env.setdefault('GOOGLE_API_KEY', 'fake')
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'myproject.asgi:application', '--host', '127.0.0.1',
+             '--port', str(port), '--workers', str(max(1, workers)), '--log-level', 'warning', '--no-access-log'],
+            cwd=settings.BASE_DIR, env=env,
+        )
+        self.stdout.write(f"Starting {max(1, workers)} uvicorn worker(s) on port {port}...")
+        deadline = time.monotonic() + 120
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f"uvicorn exited with status {process.returncode}")
+            try:
+                with socket.create_connection(('127.0.0.1', port), timeout=1):
+                    return f"http://127.0.0.1:{port}", process
+            except OSError:
+                time.sleep(0.2)
+        process.terminate()
+        raise CommandError("uvicorn did not start within 120s")
+
+    def write_report(self, summary, results, options):
+        total = summary['total']
+        self.stdout.write(
+            f"Target {options['rps']:g} req/s for {options['duration']:g}s ({options['arrivals']} arrivals): "
+            f"{total['requests']} requests in {summary['elapsed']:.1f}s"
+        )
+        self.stdout.write(f"{'scenario':<18}{'req':>7}{'ok':>7}{'req/s':>8}{'ok/s':>8}"
+                          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+        for name, s in list(summary['scenarios'].items()) + [('TOTAL', total)]:
+            self.stdout.write(
+                f"{name:<18}{s['requests']:>7}{s['ok']:>7}{s['throughput']:>8.1f}{s['goodput']:>8.1f}"
+                f"{s.get('p50_ms', 0):>9.1f}{s.get('p95_ms', 0):>9.1f}{s.get('p99_ms', 0):>9.1f}{s.get('max_ms', 0):>9.1f}"
+            )
+
+        self.stdout.write("Latency histogram (all scenarios):")
+        every = [seconds for r in results['scenarios'].values() for seconds in r['latencies']]
+        widest = max([count for _, count in histogram(every)] + [1])
+        for label, count in histogram(every):
+            self.stdout.write(f"  {label:>12} {count:>7} {'#' * round(40 * count / widest)}")
+
+        self.stdout.write("Errors:")
+        errors = [(name, label, n) for name, s in summary['scenarios'].items() for label, n in s['errors'].items()]
+        for name, label, n in errors:
+            self.stdout.write(f"  {name:<18}{label:<32}{n:>7}")
+        if not errors:
+            self.stdout.write("  none")
+        if 'provider' in summary:
+            counts = ", ".join(f"{status}: {n}" for status, n in sorted(summary['provider']['by_status'].items()))
+            self.stdout.write(f"Fake provider: {summary['provider']['requests']} call(s) ({counts or 'none'})")
@@ -0,0 +1,33 @@
+import asyncio
+import signal
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.jobs import run_workers
+
+
+class Command(BaseCommand):
+    help = 'Runs a pool of local workers that process queued background analysis jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.ANALYSIS_JOB_WORKERS,
+                            help='Number of jobs processed concurrently')
+        parser.add_argument('--drain', action='store_true',
+                            help='Exit once the queue is empty instead of polling forever')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        self.stdout.write(f"Starting {workers} analysis worker(s)...")
+        asyncio.run(self._run(workers, options['drain']))
+        self.stdout.write("Analysis workers stopped.")
+
+    async def _run(self, workers, drain):
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        # Finish the jobs in progress on Ctrl+C / deploy shutdown, then exit
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except NotImplementedError:
+                pass
+        await run_workers(workers, stop=stop, drain=drain)
@@ -0,0 +1,75 @@
+import asyncio
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.catalog import get_companies, resolve_range
+from api.precompute import (
+    RANGE_KINDS, RateBudget, enumerate_ranges, estimate_warmup, load_state, queued_sqlite_writes, range_key,
+    range_signature, warm_ranges,
+)
+
+
+class Command(BaseCommand):
+    help = ('Runs the trend analysis for every company x range (full history, calendar years, adjacent quarters) '
+            'to warm the summaries and LLM responses used by background analysis jobs and the '
+            'cached answers of the interactive /analysis/ page')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', action='append', help='Only this company (repeatable)')
+        parser.add_argument('--kind', action='append', choices=RANGE_KINDS, help='Only these range families (repeatable)')
+        parser.add_argument('--concurrency', type=int, default=settings.ANALYSIS_WARM_CONCURRENCY,
+                            help='Analysis steps (map, reduce or page) in flight at once')
+        parser.add_argument('--calls-per-minute', type=float, default=settings.ANALYSIS_WARM_CALLS_PER_MINUTE,
+                            help='Provider call rate budget (0 = unlimited)')
+        parser.add_argument('--max-calls', type=int, default=0,
+                            help='Stop after this many provider calls; run again to continue (0 = no limit)')
+        parser.add_argument('--force', action='store_true', help='Ignore ranges recorded as warm by earlier runs')
+        parser.add_argument('--dry-run', action='store_true', help='Only estimate provider calls, tokens and cost')
+        parser.add_argument('--input-price', type=float, default=settings.LLM_INPUT_PRICE_PER_MTOK,
+                            help='USD per million input tokens, for --dry-run')
+        parser.add_argument('--output-price', type=float, default=settings.LLM_OUTPUT_PRICE_PER_MTOK,
+                            help='USD per million output tokens, for --dry-run')
+
+    def handle(self, *args, **options):
+        companies = options['company']
+        unknown = set(companies or []) - set(get_companies())
+        if unknown:
+            raise CommandError(f"Unknown company: {', '.join(sorted(unknown))}")
+
+        ranges = enumerate_ranges(companies, options['kind'] or RANGE_KINDS)
+        state = {} if options['force'] else load_state()
+        pending = []
+        for item in ranges:
+            done = state.get(range_key(item))
+            paths = resolve_range(item['company'], item['start'], item['end'])
+            # A range stays warm until one of its transcripts (or a model) changes
+            if done is None or done['signature'] != range_signature(paths):
+                pending.append(item)
+        self.stdout.write(f"{len(ranges)} range(s), {len(ranges) - len(pending)} already warm, {len(pending)} to run")
+
+        if options['dry_run']:
+            self.write_estimate(estimate_warmup(pending), options['input_price'], options['output_price'])
+            return
+        if not pending:
+            return
+
+        started = time.monotonic()
+        budget = RateBudget(options['calls_per_minute'], options['max_calls'])
+        with queued_sqlite_writes():
+            counts = asyncio.run(warm_ranges(pending, max(1, options['concurrency']), budget, state, self.stdout.write))
+        self.stdout.write(self.style.SUCCESS(
+            f"Warmed {counts['warmed']}, already cached {counts['cached']}, failed {counts['failed']}, "
+            f"deferred {counts['deferred']} in {time.monotonic() - started:.1f}s ({budget.calls} provider call(s))"
+        ))
+        if counts['deferred'] or counts['failed']:
+            self.stdout.write("Run the command again to continue with the remaining ranges.")
+
+    def write_estimate(self, totals, input_price, output_price):
+        cost = totals['input_tokens'] / 1e6 * input_price + totals['output_tokens'] / 1e6 * output_price
+        self.stdout.write(f"Map calls (missing quarter summaries): {totals['map_calls']}")
+        self.stdout.write(f"Reduce calls (uncached ranges): {totals['reduce_calls']}")
+        self.stdout.write(f"Page calls (uncached /analysis/ answers): {totals['page_calls']}")
+        self.stdout.write(f"Estimated input tokens: {totals['input_tokens']:,}")
+        self.stdout.write(f"Estimated output tokens: {totals['output_tokens']:,}")
+        self.stdout.write(f"Estimated cost: ${cost:.4f} (at ${input_price}/M input, ${output_price}/M output)")
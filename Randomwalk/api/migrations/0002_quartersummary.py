@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuarterSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=100)),
+                ('company', models.CharField(max_length=50)),
+                ('quarter', models.CharField(max_length=6)),
+                ('source_digest', models.CharField(max_length=64)),
+                ('model_name', models.CharField(max_length=100)),
+                ('summary', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'unique_together': {('source', 'source_digest', 'model_name')},
+            },
+        ),
+    ]
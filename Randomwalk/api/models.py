@@ -0,0 +1,72 @@
+import uuid
+from django.db import models
+
+
+class LLMResponse(models.Model):
+    """
+    Cached LLM answer, addressed by a hash of (model, system prompt, user prompt, temperature).
+    """
+    key = models.CharField(max_length=64, unique=True)
+    model_name = models.CharField(max_length=100)
+    response = models.TextField()
+    size_bytes = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now=True, db_index=True)
+    hits = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.model_name} - {self.key[:12]}"
+
+
+class QuarterSummary(models.Model):
+    """
+    Map-stage output: the analyst-focus summary of one Company_Quarter transcript.
+    Reused by every range that includes the quarter until the source text changes.
+    """
+    source = models.CharField(max_length=100)
+    company = models.CharField(max_length=50)
+    quarter = models.CharField(max_length=6)
+    source_digest = models.CharField(max_length=64)
+    model_name = models.CharField(max_length=100)
+    summary = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('source', 'source_digest', 'model_name')
+
+    def __str__(self):
+        return f"{self.company} {self.quarter} summary"
+
+
+class AnalysisJob(models.Model):
+    """
+    Background trend analysis request, processed by `manage.py run_analysis_workers`.
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    company = models.CharField(max_length=50)
+    start_quarter = models.CharField(max_length=6)
+    end_quarter = models.CharField(max_length=6)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    result = models.TextField(blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+    def __str__(self):
+        return f"{self.company} {self.start_quarter}-{self.end_quarter} ({self.status})"
@@ -0,0 +1,110 @@
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from django.conf import settings
+from pypdf import PdfReader
+
+from .cache_files import write_atomic
+
+logger = logging.getLogger(__name__)
+
+# Bump this when extraction changes so old sidecars are ignored.
+EXTRACT_VERSION = 1
+
+# Pages handed to one worker task; each task re-opens the PDF, so not too small
+PAGES_PER_TASK = 8
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _extract_page_range(path: str, start: int, stop: int) -> list:
+    """
+    Extract pages [start, stop) of a PDF. Runs in a worker process.
+    """
+    reader = PdfReader(path)
+    chunks = []
+    for page in reader.pages[start:stop]:
+        try:
+            # Use .extract_text() and default to empty string if extraction fails
+            chunks.append(page.extract_text() or "")
+        except Exception:
+            chunks.append("")
+    return chunks
+
+
+def get_extract_pool():
+    """
+    Return the shared process pool, or None when PDF_EXTRACT_WORKERS <= 1.
+    Workers are spawned (not forked) so a threaded server process is never copied.
+    """
+    global _pool
+    workers = getattr(settings, "PDF_EXTRACT_WORKERS", os.cpu_count() or 1)
+    if workers <= 1:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def content_digest(path: Path) -> str:
+    """
+    sha256 of the file's bytes, so a sidecar follows the content, not the name or mtime.
+    """
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _sidecar_path(digest: str) -> Path:
+    return Path(settings.ANALYSIS_CACHE_DIR) / "pdf_text" / f"{digest}.v{EXTRACT_VERSION}.txt"
+
+
+def extract_pdf_texts(paths: list) -> dict:
+    """
+    Return {path: text} for several PDFs.
+
+    Text already extracted for the same content is read from its sidecar in
+    ANALYSIS_CACHE_DIR/pdf_text. Everything else is split into page ranges and
+    extracted in the process pool, all files at once, then saved as a sidecar.
+    """
+    texts = {}
+    tasks = {}
+    pool = get_extract_pool()
+    for path in paths:
+        sidecar = _sidecar_path(content_digest(path))
+        try:
+            texts[path] = sidecar.read_text(encoding="utf-8")
+            continue
+        except OSError:
+            pass
+
+        page_count = len(PdfReader(str(path)).pages)
+        if pool is None:
+            texts[path] = "\n".join(_extract_page_range(str(path), 0, page_count))
+            write_atomic(sidecar, texts[path])
+            continue
+        tasks[path] = (sidecar, [
+            pool.submit(_extract_page_range, str(path), start, min(start + PAGES_PER_TASK, page_count))
+            for start in range(0, page_count, PAGES_PER_TASK)
+        ])
+
+    for path, (sidecar, futures) in tasks.items():
+        texts[path] = "\n".join(chunk for future in futures for chunk in future.result())
+        write_atomic(sidecar, texts[path])
+        logger.info("Extracted %s in %d page range(s)", path.name, len(futures))
+    return texts
+
+
+def extract_pdf_text(path: Path) -> str:
+    """
+    Text of every page of one PDF (see extract_pdf_texts).
+    """
+    return extract_pdf_texts([path])[path]
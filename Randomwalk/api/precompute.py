@@ -0,0 +1,378 @@
+import asyncio
+import json
+import logging
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.db.models import Count
+
+from .analysis import (
+    MODEL_NAME, SUMMARY_SYSTEM_PROMPT, AnalysisError, build_quarter_prompt, build_trend_prompt,
+    get_map_inputs, get_quarter_summaries, get_ticker, run_trend_analysis,
+)
+from .cache_files import write_json_atomic
+from .catalog import get_companies, get_quarters, resolve_range
+from .context_packer import estimate_tokens
+from .gemini_client import aclose_gemini_clients
+from .llm_cache import make_cache_key
+from .llm_router import TEMPERATURE
+from .models import AnalysisJob, LLMResponse
+from .prompts import TREND_JSON_PROMPT
+from .views import GEMINI_MODEL, build_gemini_request, call_gemini_api, get_stock_data
+
+logger = logging.getLogger(__name__)
+
+# What gets warmed, per range: the stored quarter summaries and the reduce answer that
+# run_trend_analysis reads for background jobs (/analysis/jobs/), and the cached Gemini
+# answer that the interactive /analysis/ page and its stream (/analysis/stream/) look up.
+
+# Range families warmed by `manage.py warm_analysis_cache`, in default priority order
+RANGE_KINDS = ("full", "yearly", "adjacent")
+
+# Assumed response sizes, only used for the --dry-run estimate
+MAP_OUTPUT_TOKENS = 300
+REDUCE_OUTPUT_TOKENS = 1500
+PAGE_OUTPUT_TOKENS = 400
+
+
+def enumerate_ranges(companies=None, kinds=RANGE_KINDS) -> list:
+    """
+    Return the ranges to warm as {"company", "start", "end", "kind", "requests"}
+    dicts: the full history, every complete calendar year and every pair of
+    adjacent quarters of each company. Ranges users already asked for
+    (AnalysisJob rows) come first, most requested first; then by kind, newest first.
+    """
+    ranges = {}
+    for company in companies or get_companies():
+        quarters = get_quarters(company)
+        candidates = []
+        if "full" in kinds and len(quarters) > 1:
+            candidates.append((quarters[0], quarters[-1], "full"))
+        if "yearly" in kinds:
+            for year in sorted({q[:4] for q in quarters}, reverse=True):
+                if all(f"{year}Q{n}" in quarters for n in range(1, 5)):
+                    candidates.append((f"{year}Q1", f"{year}Q4", "yearly"))
+        if "adjacent" in kinds:
+            for i in range(len(quarters) - 1, 0, -1):
+                candidates.append((quarters[i - 1], quarters[i], "adjacent"))
+
+        for start, end, kind in candidates:
+            try:
+                resolve_range(company, start, end)
+            except (ValueError, FileNotFoundError):
+                continue
+            ranges.setdefault((company, start, end), {"company": company, "start": start, "end": end, "kind": kind})
+
+    requested = {
+        (company, start, end): n
+        for company, start, end, n in AnalysisJob.objects.values("company", "start_quarter", "end_quarter")
+        .annotate(n=Count("id")).values_list("company", "start_quarter", "end_quarter", "n")
+    }
+    # sorted() is stable, so ties keep the kind / newest-first order
+    order = sorted(ranges, key=lambda key: -requested.get(key, 0))
+    return [dict(ranges[key], requests=requested.get(key, 0)) for key in order]
+
+
+def range_key(item: dict) -> str:
+    return f"{item['company']}:{item['start']}-{item['end']}"
+
+
+def range_signature(paths: list) -> list:
+    """
+    What a warmed range depends on: the models and the source files' mtime/size.
+    """
+    signature = [MODEL_NAME, GEMINI_MODEL]
+    for path in paths:
+        stat = path.stat()
+        signature.append([path.name, stat.st_mtime_ns, stat.st_size])
+    return signature
+
+
+def _state_path() -> Path:
+    return Path(settings.ANALYSIS_CACHE_DIR) / "warm_analysis.json"
+
+
+def load_state() -> dict:
+    """
+    {range key: {"signature", "finished_at"}} for ranges warmed by earlier runs.
+    """
+    try:
+        with _state_path().open("r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state: dict) -> None:
+    write_json_atomic(_state_path(), state)
+
+
+def _reduce_cache_key(paths: list, summaries: dict, item: dict) -> tuple:
+    """
+    (response cache key, estimated prompt tokens) of a range's reduce call.
+    """
+    system_prompt, user_prompt = build_trend_prompt(
+        paths, summaries, item["company"], item["start"], item["end"], get_ticker(item["company"])
+    )
+    return make_cache_key(MODEL_NAME, system_prompt, user_prompt, TEMPERATURE), estimate_tokens(system_prompt + user_prompt)
+
+
+def _page_request(item: dict) -> tuple:
+    """
+    (api_data, response cache key, estimated prompt tokens) of the /analysis/ page's Gemini call for a range.
+    """
+    api_data = get_stock_data(item["company"], item["start"], item["end"])
+    system_instruction, user_query, _ = build_gemini_request(api_data)
+    return api_data, make_cache_key(GEMINI_MODEL, system_instruction, user_query), estimate_tokens(system_instruction + user_query)
+
+
+def estimate_warmup(ranges: list) -> dict:
+    """
+    Count the provider calls and (estimated) tokens a warm-up of `ranges` needs,
+    without calling the LLM. Map calls are the quarters with no stored summary;
+    a reduce or page call is needed when its prompt is not in the response cache. A
+    range whose summaries don't exist yet can't be built exactly, so its reduce
+    prompt is estimated from the context and evidence budgets.
+    """
+    paths_by_range = [resolve_range(item["company"], item["start"], item["end"]) for item in ranges]
+    unique_paths = list(dict.fromkeys(path for paths in paths_by_range for path in paths))
+    summaries = {}
+    totals = {"map_calls": 0, "reduce_calls": 0, "page_calls": 0, "input_tokens": 0, "output_tokens": 0}
+
+    for path, company, quarter, digest, text, stored in get_map_inputs(unique_paths):
+        if stored is not None:
+            summaries[path] = stored
+            continue
+        totals["map_calls"] += 1
+        totals["input_tokens"] += estimate_tokens(SUMMARY_SYSTEM_PROMPT + build_quarter_prompt(company, quarter, text))
+        totals["output_tokens"] += MAP_OUTPUT_TOKENS
+
+    context_budget = getattr(settings, "ANALYSIS_CONTEXT_TOKEN_BUDGET", 16000)
+    evidence_budget = getattr(settings, "ANALYSIS_EVIDENCE_TOKEN_BUDGET", 3000)
+    for item, paths in zip(ranges, paths_by_range):
+        _, page_key, page_tokens = _page_request(item)
+        if not LLMResponse.objects.filter(key=page_key).exists():
+            totals["page_calls"] += 1
+            totals["input_tokens"] += page_tokens
+            totals["output_tokens"] += PAGE_OUTPUT_TOKENS
+
+        if all(path in summaries for path in paths):
+            key, tokens = _reduce_cache_key(paths, summaries, item)
+            if LLMResponse.objects.filter(key=key).exists():
+                continue
+        else:
+            tokens = (estimate_tokens(TREND_JSON_PROMPT) + evidence_budget
+                      + min(len(paths) * MAP_OUTPUT_TOKENS, context_budget))
+        totals["reduce_calls"] += 1
+        totals["input_tokens"] += tokens
+        totals["output_tokens"] += REDUCE_OUTPUT_TOKENS
+    return totals
+
+
+class RateBudget:
+    """
+    Provider call budget shared by the warm-up tasks: calls are spaced evenly at
+    `per_minute` calls per minute (0 = unlimited), with no burst at start-up,
+    plus an optional cap on the total number of calls in this run.
+    """
+
+    def __init__(self, per_minute: float, max_calls: int = 0):
+        self.per_minute = per_minute
+        self.max_calls = max_calls
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.calls = 0
+        self._lock = asyncio.Lock()
+
+    def exhausted(self) -> bool:
+        return bool(self.max_calls) and self.calls >= self.max_calls
+
+    async def acquire(self) -> bool:
+        """
+        Wait for one call's worth of budget. Returns False once max_calls is spent.
+        """
+        async with self._lock:
+            if self.exhausted():
+                return False
+            while self.per_minute > 0:
+                now = time.monotonic()
+                self.tokens = min(1.0, self.tokens + (now - self.updated) * self.per_minute / 60.0)
+                self.updated = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    break
+                await asyncio.sleep((1.0 - self.tokens) * 60.0 / self.per_minute)
+            self.calls += 1
+            return True
+
+
+@contextmanager
+def queued_sqlite_writes(alias: str = "default", timeout: float = 20.0):
+    """
+    SQLite only, for this process: connections opened inside the block begin
+    transactions with IMMEDIATE (take the write lock up front) and wait up to
+    `timeout` seconds for it. Concurrent warm-up threads then queue for the
+    lock instead of failing with "database is locked" when a read transaction
+    tries to upgrade. Web workers keep the default DEFERRED transactions.
+    """
+    if connections[alias].vendor != "sqlite":
+        yield
+        return
+    options = connections.settings[alias].setdefault("OPTIONS", {})
+    saved = dict(options)
+    options.update(transaction_mode="IMMEDIATE", timeout=timeout)
+    connections[alias].close()
+    try:
+        yield
+    finally:
+        options.clear()
+        options.update(saved)
+        connections[alias].close()
+
+
+def _in_worker_thread(func, *args):
+    # Each warm-up step runs on its own thread with its own DB connection (as in jobs.run_next_job)
+    close_old_connections()
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+
+async def _run(func, *args):
+    return await sync_to_async(_in_worker_thread, thread_sensitive=False)(func, *args)
+
+
+def _missing_summaries(paths: list) -> list:
+    return [path for path, *_, stored in get_map_inputs(paths) if stored is None]
+
+
+def _reduce_is_cached(paths: list, item: dict) -> bool:
+    """
+    Whether the range's reduce answer is cached; only stored summaries are used
+    (no provider calls outside the RateBudget), so a missing one means False.
+    """
+    summaries = {path: stored for path, *_, stored in get_map_inputs(paths)}
+    if any(stored is None for stored in summaries.values()):
+        return False
+    key, _ = _reduce_cache_key(paths, summaries, item)
+    return LLMResponse.objects.filter(key=key).exists()
+
+
+def _run_range(paths: list, item: dict) -> bool:
+    """
+    Run the analysis for a range; it is warm only when the answer parsed
+    (run_trend_analysis drops an unusable answer from the cache, so it is retried).
+    """
+    try:
+        run_trend_analysis(paths, item["company"], item["start"], item["end"], get_ticker(item["company"]))
+    except AnalysisError as e:
+        logger.warning("Warm-up of %s failed: %s", range_key(item), str(e)[:200])
+        return False
+    return True
+
+
+def _is_cached(key: str) -> bool:
+    return LLMResponse.objects.filter(key=key).exists()
+
+
+async def _warm_reduce(paths: list, item: dict, budget: "RateBudget") -> str:
+    """
+    The background-job answer of a range: "cached", "warmed", "deferred" (no budget) or "failed".
+    """
+    if await _run(_reduce_is_cached, paths, item):
+        return "cached"
+    if not await budget.acquire():
+        return "deferred"
+    return "warmed" if await _run(_run_range, paths, item) else "failed"
+
+
+async def _warm_page(paths: list, item: dict, budget: "RateBudget") -> str:
+    """
+    The /analysis/ page's answer of a range, stored by call_gemini_api under the key the page looks up.
+    """
+    api_data, key, _ = _page_request(item)
+    if await _run(_is_cached, key):
+        return "cached"
+    if not await budget.acquire():
+        return "deferred"
+    # Errors come back as text (never cached), so success is the answer being in the cache
+    answer = await call_gemini_api(api_data)
+    if await _run(_is_cached, key):
+        return "warmed"
+    logger.warning("Warm-up of the page answer for %s failed: %s", range_key(item), answer[:200])
+    return "failed"
+
+
+async def warm_ranges(ranges: list, concurrency: int, budget: RateBudget, state: dict, report=None) -> dict:
+    """
+    Warm the map summaries, then the reduce and /analysis/ page responses, of `ranges` with at most
+    `concurrency` steps in flight and every provider call drawn from `budget`.
+
+    Each finished range is recorded in `state` and saved right away, so an
+    interrupted or budget-limited run continues where it stopped. Returns
+    counts of warmed, cached (no call needed), failed and deferred ranges.
+    """
+    report = report or (lambda message: None)
+    semaphore = asyncio.Semaphore(concurrency)
+    paths_by_key = {range_key(item): resolve_range(item["company"], item["start"], item["end"]) for item in ranges}
+    counts = {"warmed": 0, "cached": 0, "failed": 0, "deferred": 0}
+
+    # 1. Map: every missing quarter summary once, however many ranges share it
+    unique_paths = list(dict.fromkeys(path for paths in paths_by_key.values() for path in paths))
+    missing = await _run(_missing_summaries, unique_paths)
+    failed_paths = set()
+
+    async def summarize(path):
+        async with semaphore:
+            if not await budget.acquire():
+                failed_paths.add(path)
+                return
+            try:
+                await _run(get_quarter_summaries, [path])
+                report(f"summary {path.name}")
+            except Exception as e:
+                failed_paths.add(path)
+                report(f"summary {path.name} FAILED: {e}")
+
+    await asyncio.gather(*[summarize(path) for path in missing])
+
+    # 2. Reduce, then the interactive page's answer: one call each per range not cached yet
+    async def warm(item):
+        key = range_key(item)
+        paths = paths_by_key[key]
+        if failed_paths.intersection(paths):
+            counts["deferred"] += 1
+            return
+        outcomes = []
+        async with semaphore:
+            for step in (_warm_reduce, _warm_page):
+                try:
+                    outcome = await step(paths, item, budget)
+                except Exception as e:
+                    counts["failed"] += 1
+                    report(f"{key} FAILED: {e}")
+                    return
+                if outcome == "failed":
+                    counts["failed"] += 1
+                    report(f"{key} FAILED")
+                    return
+                if outcome == "deferred":
+                    counts["deferred"] += 1
+                    return
+                outcomes.append(outcome)
+        outcome = "cached" if outcomes == ["cached", "cached"] else "warmed"
+        counts[outcome] += 1
+        state[key] = {"signature": range_signature(paths), "finished_at": time.time()}
+        save_state(state)
+        report(f"{key} {outcome}")
+
+    try:
+        await asyncio.gather(*[warm(item) for item in ranges])
+    finally:
+        # The pooled Gemini clients belong to this event loop
+        await aclose_gemini_clients()
+    return counts
@@ -16,4 +16,42 @@ The paragraph must cover the following points:
 Do not use any structured format, lists, titles, or formatting (like bolding) in the output.
 Your entire output must be ONLY the analytical paragraph.
 """
-# NOTE: ANALYSIS_SCHEMA has been removed as the output format is now free-form text.
\ No newline at end of file
+# NOTE: ANALYSIS_SCHEMA has been removed as the output format is now free-form text.
+
+# Map stage: one short, reusable summary of the analyst questions of a single call.
+QUARTER_SUMMARY_PROMPT = """
+You are a financial analyst reviewing the Q&A section of the {company} earnings call for {year}Q{quarter}.
+Below are the questions asked by sell-side analysts on that call, followed by management's answers when space allows.
+
+Summarize what the analysts focused on in at most 150 words:
+- The 3 to 5 topics they asked about most, in order of emphasis.
+- Any new concern that is specific to this quarter.
+- One short verbatim quote that best captures the main concern.
+
+Write plain sentences without titles or markdown.
+"""
+
+# Reduce stage: the range analysis as JSON, parsed and formatted by analysis.format_trend_result.
+TREND_JSON_PROMPT = """
+You are a world-class financial trend analyst specializing in reviewing earnings call transcripts.
+Your task is to perform a longitudinal thematic analysis of the analyst focus for {ticker}
+from {start_y}Q{start_q} to {end_y}Q{end_q}, based on the per-quarter summaries and evidence passages below.
+
+Return ONLY a JSON object (no markdown, no text before or after it) with exactly these keys:
+{{
+  "themes": [
+    {{"name": "...", "summary": "...", "evidence": [{{"quote": "...", "file": "..."}}]}}
+  ],
+  "turning_points": [
+    {{"year": 2024, "quarter": 1, "description": "...", "evidence": [{{"quote": "...", "file": "..."}}]}}
+  ],
+  "risks": [
+    {{"name": "...", "description": "...", "evidence": [{{"quote": "...", "file": "..."}}]}}
+  ]
+}}
+
+- "themes": 3 to 5 recurring strategic themes and how the focus on them evolved over the range.
+- "turning_points": quarters where management's or the analysts' focus clearly shifted.
+- "risks": the main concerns analysts kept raising.
+Quotes must be copied verbatim from the evidence passages, with "file" set to the passage's FILE name.
+"""
@@ -0,0 +1,177 @@
+import heapq
+import json
+import math
+import re
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from django.conf import settings
+
+from .cache_files import write_json_atomic
+from .file_reader import DATA_DIR
+from .transcript_index import load_transcript_index, ROLE_ANALYST, ROLE_EXECUTIVE
+
+# Bump this when passages or tokenization change so the persisted index is rebuilt.
+INDEX_VERSION = 1
+
+# BM25 parameters (standard Okapi defaults)
+K1 = 1.5
+B = 0.75
+
+# Long answers are split into passages of roughly this many words
+PASSAGE_WORDS = 120
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being
+below between both but by can could did do does doing down during each few for from further
+had has have having he her here hers him his how i if in into is it its itself just let me
+more most my no nor not now of off on once only or other our ours out over own same she
+should so some such than that the their theirs them then there these they this those through
+to too under until up very was we were what when where which while who whom why will with
+would you your yours yeah okay thanks thank question questions guess think kind sort maybe
+""".split())
+
+_index = None
+_checked_at = None  # time.monotonic() when the sources were last compared
+_lock = threading.Lock()
+
+
+def tokenize(text: str) -> list:
+    """
+    Lowercase word tokens without stopwords.
+    """
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS and len(t) > 1]
+
+
+def _index_path() -> Path:
+    return Path(settings.ANALYSIS_CACHE_DIR) / "bm25_index.json"
+
+
+def _source_files() -> dict:
+    """
+    {file name: [mtime_ns, size]} for every transcript, used to detect a stale index.
+    """
+    sources = {}
+    for path in sorted(DATA_DIR.glob("*.txt")):
+        stat = path.stat()
+        sources[path.name] = [stat.st_mtime_ns, stat.st_size]
+    return sources
+
+
+def _split_passage(text: str) -> list:
+    words = text.split()
+    return [" ".join(words[i:i + PASSAGE_WORDS]) for i in range(0, len(words), PASSAGE_WORDS)] or [""]
+
+
+def build_index(sources: dict) -> dict:
+    """
+    Build the inverted index over passage-level chunks of every Q&A turn.
+    """
+    passages = []
+    postings = {}
+    for name in sources:
+        path = DATA_DIR / name
+        company, _, quarter = path.stem.rpartition("_")
+        try:
+            qa = load_transcript_index(path)["qa"]
+        except ValueError:
+            continue
+        for turn in qa:
+            if turn["role"] not in (ROLE_ANALYST, ROLE_EXECUTIVE):
+                continue
+            for chunk in _split_passage(turn["text"]):
+                terms = tokenize(chunk)
+                if not terms:
+                    continue
+                doc_id = len(passages)
+                passages.append({
+                    "file": name,
+                    "company": company,
+                    "quarter": quarter,
+                    "speaker": turn["speaker"],
+                    "role": turn["role"],
+                    "text": chunk,
+                    "length": len(terms),
+                })
+                for term, tf in Counter(terms).items():
+                    postings.setdefault(term, []).append([doc_id, tf])
+
+    total_length = sum(p["length"] for p in passages)
+    return {
+        "version": INDEX_VERSION,
+        "sources": sources,
+        "passages": passages,
+        "postings": postings,
+        "avg_length": total_length / len(passages) if passages else 0.0,
+    }
+
+
+def get_search_index() -> dict:
+    """
+    Return the BM25 index, loading the persisted copy (or building it when the
+    transcripts changed) once per process. The transcripts are re-checked at
+    most every TRANSCRIPT_REVALIDATE_SECONDS, not on every query.
+    """
+    global _index, _checked_at
+    ttl = getattr(settings, "TRANSCRIPT_REVALIDATE_SECONDS", 30.0)
+    with _lock:
+        now = time.monotonic()
+        if _index is not None and _checked_at is not None and now - _checked_at < ttl:
+            return _index
+
+        sources = _source_files()
+        _checked_at = now
+        if _index is not None and _index["sources"] == sources:
+            return _index
+
+        index = None
+        try:
+            with _index_path().open("r", encoding="utf-8") as f:
+                stored = json.load(f)
+            if stored.get("version") == INDEX_VERSION and stored.get("sources") == sources:
+                index = stored
+        except (OSError, ValueError):
+            index = None
+
+        if index is None:
+            index = build_index(sources)
+            write_json_atomic(_index_path(), index)
+        _index = index
+        return _index
+
+
+def search(query: str, company: str = None, quarters=None, k: int = 5, role: str = None) -> list:
+    """
+    Return the top-k passages for a query, scored with BM25, optionally limited
+    to one company, a set of quarters and/or a speaker role.
+    Each hit is a passage dict with an added "score".
+    """
+    index = get_search_index()
+    passages = index["passages"]
+    n = len(passages)
+    if n == 0:
+        return []
+    quarters = set(quarters) if quarters is not None else None
+    avg_length = index["avg_length"]
+
+    scores = {}
+    for term in set(tokenize(query)):
+        postings = index["postings"].get(term)
+        if not postings:
+            continue
+        idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+        for doc_id, tf in postings:
+            passage = passages[doc_id]
+            if company is not None and passage["company"] != company:
+                continue
+            if quarters is not None and passage["quarter"] not in quarters:
+                continue
+            if role is not None and passage["role"] != role:
+                continue
+            norm = K1 * (1 - B + B * passage["length"] / avg_length)
+            scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+
+    top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+    return [dict(passages[doc_id], score=round(score, 4)) for doc_id, score in top]
@@ -0,0 +1,127 @@
+import asyncio
+import threading
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key: the first caller runs the
+    coroutine, later callers with the same key await the same task.
+
+    Tasks are bound to an event loop, so only callers on the same loop are
+    coalesced (one loop per ASGI worker; under WSGI every call runs alone).
+    """
+
+    def __init__(self):
+        self._inflight = {}  # key -> (loop, task)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key, coro_factory):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entry = self._inflight.get(key)
+            if entry is not None and entry[0] is loop and not entry[1].done():
+                self.coalesced += 1
+                task = entry[1]
+            else:
+                self.calls += 1
+                task = loop.create_task(coro_factory())
+                self._inflight[key] = (loop, task)
+                task.add_done_callback(lambda t, key=key: self._forget(key, t))
+        # shield: one caller disconnecting must not cancel the work for the others
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        with self._lock:
+            entry = self._inflight.get(key)
+            if entry is not None and entry[1] is task:
+                del self._inflight[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": len(self._inflight),
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+            }
+
+
+class StreamFlight:
+    """
+    Streaming counterpart of SingleFlight: the first caller starts the async
+    generator in a task of its own; every caller with the same key (also one
+    arriving later) gets the chunks produced so far, then the rest as they come.
+
+    The producer task reads the source at the source's pace, so a slow reader
+    never holds it up (or the provider slot it holds), and a reader that
+    disconnects does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._inflight = {}  # key -> entry dict
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+
+    async def stream(self, key, agen_factory):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entry = self._inflight.get(key)
+            if entry is not None and entry["loop"] is loop and not entry["task"].done():
+                self.coalesced += 1
+            else:
+                self.calls += 1
+                entry = {"loop": loop, "chunks": [], "done": False, "error": None, "changed": asyncio.Event()}
+                entry["task"] = loop.create_task(self._produce(entry, agen_factory))
+                self._inflight[key] = entry
+                entry["task"].add_done_callback(lambda t, key=key, entry=entry: self._forget(key, entry))
+
+        sent = 0
+        while True:
+            changed = entry["changed"]
+            while sent < len(entry["chunks"]):
+                yield entry["chunks"][sent]
+                sent += 1
+            if entry["done"]:
+                if entry["error"] is not None:
+                    raise entry["error"]
+                return
+            await changed.wait()
+
+    @staticmethod
+    def _notify(entry):
+        changed, entry["changed"] = entry["changed"], asyncio.Event()
+        changed.set()
+
+    async def _produce(self, entry, agen_factory):
+        try:
+            async for chunk in agen_factory():
+                entry["chunks"].append(chunk)
+                self._notify(entry)
+        except asyncio.CancelledError:
+            entry["error"] = RuntimeError("The stream was cancelled.")
+            raise
+        except Exception as e:
+            entry["error"] = e
+        finally:
+            entry["done"] = True
+            self._notify(entry)
+
+    def _forget(self, key, entry):
+        with self._lock:
+            if self._inflight.get(key) is entry:
+                del self._inflight[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": len(self._inflight),
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+            }
+
+
+# Shared by every analysis request in this process
+analysis_flights = SingleFlight()
+stream_flights = StreamFlight()
@@ -0,0 +1,845 @@
+import asyncio
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from . import catalog, pdf_extract, search_index, transcript_index, views
+from .cache_files import write_json_atomic
+from .benchmarks import compare_to_baseline, run_benchmarks
+from .fake_gemini import latency_sampler, start_fake_gemini
+from .file_reader import DATA_DIR, TextCache, get_text_cache, read_section_from_path, read_text_from_path
+from .context_packer import allocate_budget, pack_context
+from .gemini_client import aclose_gemini_clients
+from .analysis import TREND_SYSTEM_PROMPT, get_quarter_summaries
+from .jobs import claim_next_job, run_job
+from .loadtest import histogram, summarize
+from .llm_cache import astore_response, get_cached_response, make_cache_key, store_response
+from .llm_router import TEMPERATURE, call_llm
+from .models import AnalysisJob, LLMResponse, QuarterSummary
+from .singleflight import SingleFlight, StreamFlight
+from .transcript_index import parse_transcript
+from .transcript_store import normalize_transcript
+from tracking.buffer import VisitBuffer
+
+
+# Page visits from these requests stay in a private buffer that is never flushed
+_visit_buffer = VisitBuffer()
+_visit_buffer._start = lambda: None
+_tracking_patcher = mock.patch("tracking.middleware.get_visit_buffer", return_value=_visit_buffer)
+
+
+def setUpModule():
+    _tracking_patcher.start()
+
+
+def tearDownModule():
+    _tracking_patcher.stop()
+
+
+class _StubGeminiHandler(BaseHTTPRequestHandler):
+    """
+    Minimal generateContent/streamGenerateContent stub. Prompts containing RATE_LIMITED get two 429s
+    (with Retry-After) before succeeding; prompts containing EMPTY_ANSWER get an empty answer
+    (malformed events when streamed); everything else answers after `delay`.
+    """
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            rate_limited = "RATE_LIMITED" in body and server.rate_limited_left > 0
+            if rate_limited:
+                server.rate_limited_left -= 1
+        try:
+            if rate_limited:
+                self.send_response(429)
+                self.send_header("Retry-After", "1")
+                self.end_headers()
+                self.wfile.write(b'{"error": "rate limited"}')
+                return
+            time.sleep(server.delay)
+            empty = "EMPTY_ANSWER" in body
+            if "streamGenerateContent" in self.path:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                for chunk in ("stub ", "streamed ", "answer"):
+                    event = {"candidates": [{"content": {"parts": [{"text": chunk}]}}]}
+                    line = "data: {\"candidates\": [" if empty else f"data: {json.dumps(event)}"
+                    self.wfile.write(f"{line}\r\n\r\n".encode("utf-8"))
+                    self.wfile.flush()
+                return
+            payload = {"candidates": [{"content": {"parts": [{"text": "" if empty else "stub answer"}]}}]}
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class GeminiClientTests(TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _StubGeminiHandler)
+        self.server.lock = threading.Lock()
+        self.server.in_flight = 0
+        self.server.max_in_flight = 0
+        self.server.rate_limited_left = 2
+        self.server.delay = 0.0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{self.server.server_address[1]}/v1beta/models"
+        patcher = mock.patch.object(views, "API_URL_BASE", base)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    async def test_backoff_does_not_block_other_requests(self):
+        throttled = asyncio.create_task(views.call_gemini_api({"full_text": "RATE_LIMITED"}, use_cache=False))
+        # Let the throttled call receive its first 429 and start backing off
+        await asyncio.sleep(0.2)
+
+        started = time.monotonic()
+        answer = await views.call_gemini_api({"full_text": "hello"}, use_cache=False)
+        elapsed = time.monotonic() - started
+
+        self.assertEqual(answer, "stub answer")
+        self.assertLess(elapsed, 0.5)
+        self.assertFalse(throttled.done())
+        self.assertEqual(await throttled, "stub answer")
+        await aclose_gemini_clients()
+
+    @override_settings(GEMINI_MAX_CONCURRENCY=2)
+    async def test_in_flight_calls_are_capped(self):
+        self.server.delay = 0.1
+        answers = await asyncio.gather(*[
+            views.call_gemini_api({"full_text": f"request {i}"}, use_cache=False)
+            for i in range(6)
+        ])
+        self.assertEqual(answers, ["stub answer"] * 6)
+        self.assertLessEqual(self.server.max_in_flight, 2)
+        await aclose_gemini_clients()
+
+    async def test_empty_answer_is_reported_and_not_cached(self):
+        api_data = {"full_text": "EMPTY_ANSWER"}
+        answer = await views.call_gemini_api(api_data)
+        self.assertEqual(answer, "API Structure Error: The model returned an empty answer.")
+        key = make_cache_key(views.GEMINI_MODEL, *views.build_gemini_request(api_data)[:2])
+        self.assertFalse(await LLMResponse.objects.filter(key=key).aexists())
+        await aclose_gemini_clients()
+
+    async def test_empty_stream_is_an_error_and_not_cached(self):
+        api_data = {"full_text": "EMPTY_ANSWER"}
+        with self.assertRaisesMessage(RuntimeError, "empty answer"):
+            async for _ in views.stream_gemini_api(api_data):
+                pass
+        key = make_cache_key(views.GEMINI_MODEL, *views.build_gemini_request(api_data)[:2])
+        self.assertFalse(await LLMResponse.objects.filter(key=key).aexists())
+        await aclose_gemini_clients()
+
+    async def test_stream_view_forwards_chunks_as_server_sent_events(self):
+        response = await self.async_client.post("/analysis/stream/", {
+            "company": "Amazon", "start_quarter": "2021Q1", "end_quarter": "2021Q4",
+        })
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+
+        body = "".join([chunk.decode("utf-8") async for chunk in response.streaming_content])
+        texts = [json.loads(line[len("data: "):])["text"] for line in body.split("\n") if line.startswith("data: {\"text")]
+
+        self.assertEqual(texts, ["stub ", "streamed ", "answer"])
+        self.assertIn("event: done", body)
+        await aclose_gemini_clients()
+
+
+class SingleFlightTests(TestCase):
+
+    async def test_concurrent_duplicates_share_one_call(self):
+        flights = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "result"
+
+        results = await asyncio.gather(*[flights.do(("Amazon", "2021Q1", "2023Q4"), work) for _ in range(5)])
+
+        self.assertEqual(results, ["result"] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flights.stats(), {"in_flight": 0, "calls": 1, "coalesced": 4})
+
+    async def test_streams_are_shared_and_read_at_the_source_pace(self):
+        flights = StreamFlight()
+        calls = []
+
+        async def source():
+            calls.append(1)
+            for chunk in ("a", "b", "c"):
+                await asyncio.sleep(0.01)
+                yield chunk
+
+        slow = flights.stream("key", source)
+        self.assertEqual(await slow.__anext__(), "a")
+        # The slow reader pauses; the source still runs to the end and a late reader gets every chunk
+        late = [chunk async for chunk in flights.stream("key", source)]
+        self.assertEqual(late, ["a", "b", "c"])
+        self.assertEqual([chunk async for chunk in slow], ["b", "c"])
+        self.assertEqual(len(calls), 1)
+        await asyncio.sleep(0)  # let the finished producer's done-callback run
+        self.assertEqual(flights.stats(), {"in_flight": 0, "calls": 1, "coalesced": 1})
+
+    async def test_stream_errors_reach_every_reader(self):
+        flights = StreamFlight()
+
+        async def failing():
+            yield "partial"
+            raise RuntimeError("API Error (HTTP 500)")
+
+        for _ in range(2):
+            chunks = []
+            with self.assertRaisesMessage(RuntimeError, "API Error (HTTP 500)"):
+                async for chunk in flights.stream("key", failing):
+                    chunks.append(chunk)
+            self.assertEqual(chunks, ["partial"])
+
+
+class AnalysisJobTests(TestCase):
+
+    def test_submit_returns_job_id_and_poll_returns_result(self):
+        response = self.client.post("/analysis/jobs/", {
+            "company": "Amazon", "start_quarter": "2021Q1", "end_quarter": "2021Q2",
+        })
+        self.assertEqual(response.status_code, 202)
+        status_url = response.json()["status_url"]
+        self.assertEqual(self.client.get(status_url).json()["status"], AnalysisJob.STATUS_QUEUED)
+
+        with mock.patch("api.jobs.run_trend_analysis", return_value="Analysis successful:") as analysis:
+            run_job(claim_next_job())
+        self.assertEqual(analysis.call_args.args[1:], ("Amazon", "2021Q1", "2021Q2", "AMZN"))
+
+        job = self.client.get(status_url).json()
+        self.assertEqual(job["status"], AnalysisJob.STATUS_DONE)
+        self.assertEqual(job["result"], "Analysis successful:")
+        self.assertIsNone(claim_next_job())
+
+    def test_unparseable_answer_marks_job_failed(self):
+        self.client.post("/analysis/jobs/", {"company": "Amazon", "start_quarter": "2021Q1", "end_quarter": "2021Q2"})
+        with mock.patch("api.analysis.get_quarter_summaries", side_effect=lambda paths: {p: "summary" for p in paths}), \
+                mock.patch("api.analysis.call_llm", return_value="A single analytical paragraph.") as llm:
+            run_job(claim_next_job())
+        self.assertIn('"themes"', llm.call_args.kwargs["user_prompt"])
+
+        job = AnalysisJob.objects.get()
+        self.assertEqual(job.status, AnalysisJob.STATUS_FAILED)
+        self.assertIn("invalid JSON", job.error)
+        self.assertEqual(job.result, "")
+
+    def test_invalid_range_is_rejected_before_queueing(self):
+        response = self.client.post("/analysis/jobs/", {
+            "company": "Amazon", "start_quarter": "2024Q1", "end_quarter": "2021Q1",
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(AnalysisJob.objects.exists())
+
+
+class ContextPackerTests(TestCase):
+
+    def test_allocate_budget_shares_fairly_and_redistributes(self):
+        # Equal shares when every document needs more than its share
+        self.assertEqual(allocate_budget({"a": 500, "b": 800, "c": 900}, 300), {"a": 100, "b": 100, "c": 100})
+        # What "a" does not need goes to the others, again split fairly
+        self.assertEqual(allocate_budget({"a": 20, "b": 800, "c": 900}, 300), {"a": 20, "b": 140, "c": 140})
+        self.assertEqual(allocate_budget({"a": 20, "b": 100, "c": 900}, 300), {"a": 20, "b": 100, "c": 180})
+        # Everything fits
+        self.assertEqual(allocate_budget({"a": 10, "b": 20}, 300), {"a": 10, "b": 20})
+
+    def test_pack_context_takes_chunks_in_order_and_truncates_the_last(self):
+        documents = {
+            "short": ["q" * 40],                      # 10 tokens
+            "long": ["x" * 80, "y" * 80, "z" * 80],   # 3 x 20 tokens
+        }
+        packed, usage = pack_context(documents, 40, separator="|")
+        self.assertEqual(usage, {"short": 10, "long": 30})
+        self.assertEqual(packed["short"], "q" * 40)
+        self.assertEqual(packed["long"], "x" * 80 + "|" + "y" * 40)
+
+        packed, usage = pack_context(documents, 1000)
+        self.assertEqual(usage, {"short": 10, "long": 60})
+        self.assertEqual(packed["long"].split("\n\n"), documents["long"])
+
+
+class QuarterSummaryTests(TestCase):
+
+    def test_finished_summaries_are_kept_when_one_quarter_fails(self):
+        paths = catalog.resolve_range("Amazon", "2021Q1", "2021Q4")
+
+        def summarize(company, quarter, text):
+            if quarter == "2021Q3":
+                raise RuntimeError("provider down")
+            return f"summary of {quarter}"
+
+        with mock.patch("api.analysis._summarize_quarter_text", side_effect=summarize), \
+                mock.patch("api.analysis.connection") as worker_connection:
+            with self.assertRaisesMessage(RuntimeError, "provider down"):
+                get_quarter_summaries(paths)
+        self.assertEqual(worker_connection.close.call_count, 4)
+        self.assertEqual(sorted(QuarterSummary.objects.values_list("quarter", flat=True)), ["2021Q1", "2021Q2", "2021Q4"])
+
+        with mock.patch("api.analysis._summarize_quarter_text", return_value="retried") as retry:
+            summaries = get_quarter_summaries(paths)
+        self.assertEqual(retry.call_count, 1)
+        self.assertEqual(summaries[paths[2]], "retried")
+
+
+class DriftTests(TestCase):
+
+    def test_drift_mode_renders_report_without_llm(self):
+        with mock.patch.object(views, "call_gemini_api") as gemini:
+            response = self.client.post("/analysis/", {
+                "company": "Amazon", "start_quarter": "2022Q1", "end_quarter": "2023Q4", "mode": "drift",
+            })
+        gemini.assert_not_called()
+        self.assertContains(response, "Analyst focus drift for Amazon (2022Q1 - 2023Q4)")
+        self.assertContains(response, "2022Q4 -> 2023Q1")
+
+
+class CatalogTests(TestCase):
+
+    def test_catalog_drives_options_and_range_resolution(self):
+        self.assertEqual(catalog.get_companies(), ["Amazon", "Microsoft"])
+        self.assertEqual(catalog.get_quarters("Amazon")[0], "2020Q1")
+        paths = catalog.resolve_range("Microsoft", "2024Q3", "2025Q1")
+        self.assertEqual([p.name for p in paths], ["Microsoft_2024Q3.txt", "Microsoft_2024Q4.txt", "Microsoft_2025Q1.txt"])
+        with self.assertRaises(ValueError):
+            catalog.resolve_range("Tesla", "2024Q3", "2025Q1")
+        with self.assertRaises(ValueError):
+            catalog.resolve_range("Amazon", "2025Q1", "2024Q3")
+
+    def test_catalog_is_revalidated_after_the_ttl_only(self):
+        with tempfile.TemporaryDirectory() as tmp, tempfile.TemporaryDirectory() as data, \
+                override_settings(ANALYSIS_CACHE_DIR=tmp, TRANSCRIPT_REVALIDATE_SECONDS=30), \
+                mock.patch.object(catalog, "DATA_DIR", Path(data)), mock.patch.object(catalog, "_catalog", None), \
+                mock.patch.object(catalog, "_checked_at", None), \
+                mock.patch.object(catalog.time, "monotonic", return_value=1000.0) as clock:
+            source = Path(data) / "Amazon_2024Q1.txt"
+            source.write_text("short", encoding="utf-8")
+            dir_mtime = Path(data).stat().st_mtime_ns
+            self.assertEqual(catalog.get_catalog()["entries"]["Amazon"]["2024Q1"]["size"], 5)
+
+            # Same name, new content: the directory's mtime does not change
+            source.write_text("a longer transcript", encoding="utf-8")
+            self.assertEqual(Path(data).stat().st_mtime_ns, dir_mtime)
+            # Within the TTL lookups are served from memory without touching data/
+            with mock.patch.object(catalog.os, "scandir") as scandir:
+                self.assertEqual(catalog.get_quarters("Amazon"), ["2024Q1"])
+                catalog.resolve_range("Amazon", "2024Q1", "2024Q1")
+            scandir.assert_not_called()
+            self.assertEqual(catalog.get_catalog()["entries"]["Amazon"]["2024Q1"]["size"], 5)
+
+            clock.return_value = 1031.0
+            self.assertEqual(catalog.get_catalog()["entries"]["Amazon"]["2024Q1"]["size"], 19)
+
+    def test_unavailable_selection_is_rejected_before_analysis(self):
+        with mock.patch.object(views, "call_gemini_api") as gemini:
+            response = self.client.post("/analysis/", {
+                "company": "Amazon", "start_quarter": "2024Q1", "end_quarter": "2031Q4",
+            })
+        gemini.assert_not_called()
+        self.assertContains(response, "Error: Invalid quarter selection.")
+        self.assertEqual(response.context["companies"], ["Amazon", "Microsoft"])
+
+
+def _qa_turn(role, text):
+    return {"speaker": "Jane Doe", "role": role, "text": text}
+
+
+# Q&A turns served in place of the parsed transcripts, by file name
+_SEARCH_FIXTURE = {
+    "Amazon_2024Q1.txt": [
+        _qa_turn("analyst", "How is cloud demand trending? Cloud cloud cloud."),
+        _qa_turn("executive", "Cloud demand remains strong and margins expanded."),
+        _qa_turn("operator", "Next question, cloud."),
+    ],
+    "Amazon_2024Q2.txt": [_qa_turn("analyst", "Can you talk about advertising revenue and cloud?")],
+    "Microsoft_2024Q1.txt": [_qa_turn("analyst", "Azure cloud growth and capacity constraints?")],
+}
+
+
+class LLMResponseCacheTests(TestCase):
+
+    @override_settings(LLM_CACHE_TTL_SECONDS=60)
+    def test_expired_response_is_a_miss_and_deleted(self):
+        store_response("fresh", "gemini/test", "answer")
+        store_response("stale", "gemini/test", "answer")
+        LLMResponse.objects.filter(key="stale").update(created_at=timezone.now() - timedelta(seconds=61))
+        self.assertEqual(get_cached_response("fresh"), "answer")
+        self.assertIsNone(get_cached_response("stale"))
+        self.assertEqual(list(LLMResponse.objects.filter(key__in=["fresh", "stale"]).values_list("key", flat=True)), ["fresh"])
+
+    @override_settings(LLM_CACHE_MAX_BYTES=10)
+    def test_least_recently_used_rows_are_evicted_over_the_size_limit(self):
+        now = timezone.now()
+        store_response("a", "gemini/test", "aaaaa")
+        store_response("b", "gemini/test", "bbbbb")
+        LLMResponse.objects.filter(key="a").update(last_used_at=now - timedelta(minutes=2))
+        LLMResponse.objects.filter(key="b").update(last_used_at=now - timedelta(minutes=1))
+        # Reading "a" makes it the most recently used
+        self.assertEqual(get_cached_response("a"), "aaaaa")
+        store_response("c", "gemini/test", "ccccc")
+        self.assertEqual(sorted(LLMResponse.objects.values_list("key", flat=True)), ["a", "c"])
+        self.assertEqual(LLMResponse.objects.get(key="a").hits, 1)
+
+    def test_use_cache_false_bypasses_the_lookup_but_stores_the_answer(self):
+        answers = iter(["first", "second"])
+
+        def completion(**kwargs):
+            return {"choices": [{"message": {"content": next(answers)}}]}
+
+        with mock.patch.dict("os.environ", {"GOOGLE_API_KEY": "fake"}), \
+                mock.patch("api.llm_router.completion", side_effect=completion) as provider:
+            self.assertEqual(call_llm("gemini/gemini-1.5-flash", "system", "user"), "first")
+            self.assertEqual(call_llm("gemini/gemini-1.5-flash", "system", "user"), "first")
+            self.assertEqual(provider.call_count, 1)
+            self.assertEqual(call_llm("gemini/gemini-1.5-flash", "system", "user", use_cache=False), "second")
+            self.assertEqual(provider.call_count, 2)
+            self.assertEqual(call_llm("gemini/gemini-1.5-flash", "system", "user"), "second")
+        key = make_cache_key("gemini/gemini-1.5-flash", "system", "user", TEMPERATURE)
+        self.assertEqual(LLMResponse.objects.get(key=key).response, "second")
+
+
+class TextCacheTests(TestCase):
+
+    def test_lru_eviction_by_bytes_and_counters(self):
+        a, b, c = (Path(f"/data/{name}.txt") for name in "abc")
+        text = "x" * 1000
+        nbytes = sys.getsizeof(text)
+        cache = TextCache(max_bytes=2 * nbytes)
+
+        self.assertIsNone(cache.get(a, 1, 1000))
+        cache.put(a, 1, 1000, text)
+        cache.put(b, 1, 1000, text)
+        self.assertEqual(cache.get(a, 1, 1000), text)
+        # Over the byte limit: b is the least recently used entry
+        cache.put(c, 1, 1000, text)
+        self.assertIsNone(cache.get(b, 1, 1000))
+        self.assertEqual(cache.get(c, 1, 1000), text)
+        self.assertEqual(cache.stats(), {
+            "entries": 2, "bytes": 2 * nbytes, "max_bytes": 2 * nbytes, "hits": 2, "misses": 2, "evictions": 1,
+        })
+
+        # A changed mtime or size is a miss; replacing an entry does not count its old bytes twice
+        self.assertIsNone(cache.get(a, 2, 1000))
+        cache.put(a, 2, 1000, text)
+        self.assertEqual(cache.stats()["bytes"], 2 * nbytes)
+        # Larger than the whole cache: not stored, nothing evicted
+        cache.put(b, 1, 10000, "y" * 10000)
+        self.assertIsNone(cache.get(b, 1, 10000))
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertEqual(cache.stats()["entries"], 2)
+
+
+class CacheFileTests(TestCase):
+
+    def test_concurrent_writers_of_one_file_never_collide(self):
+        errors = []
+
+        def writer(n):
+            try:
+                for i in range(50):
+                    write_json_atomic(path, {"writer": n, "i": i, "pad": "x" * 2000})
+            except OSError as e:
+                errors.append(e)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "index.json"
+            threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(errors, [])
+            self.assertEqual(json.loads(path.read_text(encoding="utf-8"))["i"], 49)
+            self.assertEqual([p.name for p in Path(tmp).iterdir()], ["index.json"])
+
+
+class SearchIndexTests(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        settings_patch = override_settings(ANALYSIS_CACHE_DIR=self.tmp.name)
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+        self.qa = dict(_SEARCH_FIXTURE)
+        self.sources = {name: [1, 100] for name in self.qa}
+        for patch in (
+            mock.patch.object(search_index, "_index", None),
+            mock.patch.object(search_index, "_checked_at", None),
+            mock.patch.object(search_index, "_source_files", side_effect=lambda: dict(self.sources)),
+            mock.patch.object(search_index, "load_transcript_index",
+                              side_effect=lambda path: {"qa": self.qa[path.name]}),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_bm25_ranks_by_term_frequency_and_rarity(self):
+        hits = search_index.search("cloud", k=10)
+        # Operator turns are not indexed
+        self.assertEqual(len(hits), 4)
+        self.assertEqual(hits[0]["text"], "How is cloud demand trending? Cloud cloud cloud.")
+        self.assertEqual(hits, sorted(hits, key=lambda hit: -hit["score"]))
+
+        # "azure" occurs in one passage only, so it outweighs the common "cloud"
+        hits = search_index.search("cloud azure", k=1)
+        self.assertEqual(hits[0]["file"], "Microsoft_2024Q1.txt")
+        self.assertEqual(search_index.search("the and of"), [])
+
+    def test_company_quarter_and_role_filters(self):
+        self.assertEqual({hit["company"] for hit in search_index.search("cloud", company="Microsoft")}, {"Microsoft"})
+        hits = search_index.search("cloud", company="Amazon", quarters=["2024Q2"])
+        self.assertEqual([hit["file"] for hit in hits], ["Amazon_2024Q2.txt"])
+        hits = search_index.search("cloud", role="executive")
+        self.assertEqual([hit["text"] for hit in hits], ["Cloud demand remains strong and margins expanded."])
+        self.assertEqual(search_index.search("cloud", company="Tesla"), [])
+
+    @override_settings(TRANSCRIPT_REVALIDATE_SECONDS=30)
+    def test_index_is_persisted_and_rebuilt_when_transcripts_change(self):
+        with mock.patch.object(search_index, "build_index", wraps=search_index.build_index) as build, \
+                mock.patch.object(search_index.time, "monotonic", return_value=1000.0) as clock:
+            search_index.get_search_index()
+            self.assertTrue((Path(self.tmp.name) / "bm25_index.json").exists())
+            # A new process loads the stored index instead of rebuilding it
+            search_index._index = None
+            search_index.get_search_index()
+            self.assertEqual(build.call_count, 1)
+
+            self.assertEqual(search_index.search("datacenter"), [])
+
+            # Edited transcript: new mtime and size, noticed once the TTL has passed
+            self.qa["Microsoft_2024Q1.txt"] = [_qa_turn("analyst", "Any update on datacenter leases?")]
+            self.sources["Microsoft_2024Q1.txt"] = [2, 120]
+            calls = search_index._source_files.call_count
+            self.assertEqual(search_index.search("datacenter"), [])
+            self.assertEqual(search_index._source_files.call_count, calls)
+            clock.return_value = 1031.0
+            self.assertEqual([hit["file"] for hit in search_index.search("datacenter")], ["Microsoft_2024Q1.txt"])
+            self.assertEqual(build.call_count, 2)
+            search_index._index = None
+            search_index.get_search_index()
+            self.assertEqual(build.call_count, 2)
+
+
+def _make_pdf(page_texts) -> bytes:
+    """
+    Minimal uncompressed PDF with one line of Helvetica text per page.
+    """
+    n = len(page_texts)
+    page_ids = [4 + 2 * i for i in range(n)]
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        ("<< /Type /Pages /Kids [%s] /Count %d >>" % (" ".join(f"{i} 0 R" for i in page_ids), n)).encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for page_id, text in zip(page_ids, page_texts):
+        objects.append((
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_id + 1} 0 R >>"
+        ).encode())
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+class PdfExtractTests(TestCase):
+
+    def test_pages_are_extracted_in_the_pool_once_per_content(self):
+        with tempfile.TemporaryDirectory() as tmp, override_settings(ANALYSIS_CACHE_DIR=tmp, PDF_EXTRACT_WORKERS=2):
+            pdf = Path(tmp) / "Amazon_2019Q1.pdf"
+            pdf.write_bytes(_make_pdf([f"Page {i} guidance" for i in range(20)]))
+
+            text = pdf_extract.extract_pdf_text(pdf)
+            self.assertEqual(text.splitlines()[0], "Page 0 guidance")
+            self.assertEqual(text.splitlines()[-1], "Page 19 guidance")
+            self.assertEqual(len(list((Path(tmp) / "pdf_text").glob("*.txt"))), 1)
+
+            # Same bytes under another name: served from the sidecar, no extraction
+            copy = Path(tmp) / "copy.pdf"
+            copy.write_bytes(pdf.read_bytes())
+            with mock.patch.object(pdf_extract, "PdfReader") as reader:
+                self.assertEqual(pdf_extract.extract_pdf_text(copy), text)
+            reader.assert_not_called()
+
+
+# Trimmed S&P Global layout: table of contents, participants, page furniture and disclaimer
+_TRANSCRIPT_FIXTURE = """Table of Contents
+Call Participants
+Presentation
+Question and Answer
+Call Participants
+EXECUTIVES
+Andrew R. Jassy
+President, CEO & Director
+ANALYSTS
+Brian Nowak
+Morgan Stanley, Research
+Division
+Presentation
+Operator
+Good day, and welcome to the call.
+Andrew R. Jassy
+President, CEO & Director
+Thanks. Demand is strong.
+Copyright (c) 2023 S&P Global Market Intelligence, a division of S&P Global Inc. All rights reserved.
+spglobal.com/marketintelligence 4
+AMAZON.COM, INC. FQ1 2023 EARNINGS CALL APR 27, 2023
+Customers keep optimizing spend.
+Question and Answer
+Operator
+Our first question comes from Brian Nowak.
+Brian Nowak
+Morgan Stanley, Research
+Division
+How is {topic} trending?
+Andrew R. Jassy
+President, CEO & Director
+It is stabilizing.
+Copyright (c) 2023 by S&P Global Market Intelligence. Disclaimer text.
+"""
+
+
+class TranscriptIndexTests(TestCase):
+
+    def test_parse_transcript_splits_sections_and_tags_roles(self):
+        index = parse_transcript(_TRANSCRIPT_FIXTURE.format(topic="AWS"))
+        self.assertEqual(index["participants"], {
+            "executive": [{"name": "Andrew R. Jassy", "affiliation": "President, CEO & Director"}],
+            "analyst": [{"name": "Brian Nowak", "affiliation": "Morgan Stanley, Research Division"}],
+        })
+        self.assertEqual([(t["speaker"], t["role"]) for t in index["presentation"]],
+                         [("Operator", "operator"), ("Andrew R. Jassy", "executive")])
+        # Page footer and header lines are dropped from the turn
+        self.assertEqual(index["presentation"][1]["text"], "Thanks. Demand is strong. Customers keep optimizing spend.")
+        self.assertEqual([(t["role"], t["text"]) for t in index["qa"]], [
+            ("operator", "Our first question comes from Brian Nowak."),
+            ("analyst", "How is AWS trending?"),
+            ("executive", "It is stabilizing."),
+        ])
+        self.assertEqual(index["qa_by_role"], {"operator": [0], "executive": [2], "analyst": [1]})
+        with self.assertRaises(ValueError):
+            parse_transcript("No headers here.")
+
+    def test_index_is_persisted_and_rebuilt_when_the_file_changes(self):
+        with tempfile.TemporaryDirectory() as tmp, override_settings(ANALYSIS_CACHE_DIR=tmp), \
+                mock.patch("api.file_reader.DATA_DIR", Path(tmp).resolve()), \
+                mock.patch.object(transcript_index, "parse_transcript", wraps=parse_transcript) as parse:
+            source = Path(tmp) / "Amazon_2023Q1.txt"
+            source.write_text(_TRANSCRIPT_FIXTURE.format(topic="AWS"), encoding="utf-8")
+            self.assertEqual(transcript_index.get_analyst_questions(source)[0]["text"], "How is AWS trending?")
+            self.assertTrue((Path(tmp) / "transcript_index" / "Amazon_2023Q1.json").exists())
+
+            # Served from memory, then from the persisted index in a fresh process
+            transcript_index.load_transcript_index(source)
+            transcript_index._memo.clear()
+            transcript_index.load_transcript_index(source)
+            self.assertEqual(parse.call_count, 1)
+
+            source.write_text(_TRANSCRIPT_FIXTURE.format(topic="advertising"), encoding="utf-8")
+            stat = source.stat()
+            os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+            self.assertEqual(transcript_index.get_analyst_questions(source)[0]["text"], "How is advertising trending?")
+            self.assertEqual(parse.call_count, 2)
+
+
+class TranscriptStoreTests(TestCase):
+
+    def test_ingested_transcripts_are_read_normalized_from_the_store(self):
+        source = DATA_DIR / "Amazon_2023Q1.txt"
+        raw = source.read_text(encoding="utf-8")
+        normalized = normalize_transcript(raw)
+        self.assertNotIn("All Rights reserved", normalized)
+        self.assertNotIn("\n\n\n", normalized)
+        self.assertEqual(normalized.count("EARNINGS CALL APR 27, 2023"), 1)
+        self.assertEqual(parse_transcript(normalized), parse_transcript(raw))
+
+        with tempfile.TemporaryDirectory() as tmp, override_settings(TRANSCRIPT_STORE_PATH=Path(tmp) / "store.pack"):
+            call_command("ingest_transcripts", workers=1, summary_only=True, stdout=io.StringIO())
+            get_text_cache().clear()
+            self.assertEqual(read_text_from_path(source), normalized)
+            # Decoded from the shared mapping on each read, never copied into the per-process cache
+            self.assertEqual(get_text_cache().stats()["entries"], 0)
+            qa = read_section_from_path(source, "qa")
+            self.assertTrue(qa.startswith("Operator\n"))
+            self.assertIn(qa, normalized)
+
+
+def _fake_call_llm(model_name, system_prompt, user_prompt, use_cache=True):
+    response = '{"themes": [], "turning_points": [], "risks": []}'
+    store_response(make_cache_key(model_name, system_prompt, user_prompt, TEMPERATURE), model_name, response)
+    return response
+
+
+async def _fake_call_gemini_api(api_data, use_cache=True):
+    system_instruction, user_query, _ = views.build_gemini_request(api_data)
+    answer = f"Warm analysis of {api_data['ticker']} {api_data['start_y']}Q{api_data['start_q']}-{api_data['end_y']}Q{api_data['end_q']}."
+    await astore_response(make_cache_key(views.GEMINI_MODEL, system_instruction, user_query), views.GEMINI_MODEL, answer)
+    return answer
+
+
+class WarmAnalysisCacheTests(TransactionTestCase):
+
+    def test_warm_up_is_budgeted_and_resumable(self):
+        # One step at a time: the in-memory test database has table-level locks shared by all threads
+        args = ["warm_analysis_cache", "--company", "Microsoft", "--kind", "yearly",
+                "--calls-per-minute", "0", "--concurrency", "1"]
+        with tempfile.TemporaryDirectory() as tmp, override_settings(ANALYSIS_CACHE_DIR=tmp), \
+                mock.patch("api.analysis.call_llm", side_effect=_fake_call_llm) as llm, \
+                mock.patch("api.precompute.call_gemini_api", side_effect=_fake_call_gemini_api) as page:
+            out = io.StringIO()
+            call_command(*args, "--dry-run", stdout=out)
+            self.assertIn("Map calls (missing quarter summaries): 20", out.getvalue())
+            self.assertIn("Reduce calls (uncached ranges): 5", out.getvalue())
+            self.assertIn("Page calls (uncached /analysis/ answers): 5", out.getvalue())
+            llm.assert_not_called()
+
+            # 20 map calls + one range's reduce and page answer fit the budget; the rest is left for the next run
+            call_command(*args, "--max-calls", "22", stdout=io.StringIO())
+            self.assertEqual((llm.call_count, page.call_count), (21, 1))
+            self.assertEqual(QuarterSummary.objects.filter(company="Microsoft").count(), 20)
+
+            out = io.StringIO()
+            call_command(*args, stdout=out)
+            self.assertIn("1 already warm, 4 to run", out.getvalue())
+            self.assertEqual((llm.call_count, page.call_count), (25, 5))
+
+            out = io.StringIO()
+            call_command(*args, stdout=out)
+            self.assertIn("5 already warm, 0 to run", out.getvalue())
+
+    def test_warmed_range_is_served_from_cache_by_the_analysis_page(self):
+        args = ["warm_analysis_cache", "--company", "Microsoft", "--kind", "yearly",
+                "--calls-per-minute", "0", "--concurrency", "1"]
+        with tempfile.TemporaryDirectory() as tmp, override_settings(ANALYSIS_CACHE_DIR=tmp), \
+                mock.patch("api.analysis.call_llm", side_effect=_fake_call_llm), \
+                mock.patch("api.precompute.call_gemini_api", side_effect=_fake_call_gemini_api):
+            call_command(*args, stdout=io.StringIO())
+
+        # The page's own lookup finds the answer, so the provider is never contacted
+        with mock.patch.object(views, "get_gemini_client", side_effect=AssertionError("provider called")):
+            response = self.client.post("/analysis/", {"company": "Microsoft", "start_quarter": "2020Q1",
+                                                       "end_quarter": "2020Q4"})
+        self.assertContains(response, "Warm analysis of MSFT 2020Q1-2020Q4.")
+
+    def test_unparseable_reduce_answer_is_not_recorded_as_warm(self):
+        args = ["warm_analysis_cache", "--company", "Microsoft", "--kind", "yearly",
+                "--calls-per-minute", "0", "--concurrency", "1"]
+
+        def paragraph_reduce(model_name, system_prompt, user_prompt, use_cache=True):
+            if system_prompt == TREND_SYSTEM_PROMPT:
+                store_response(make_cache_key(model_name, system_prompt, user_prompt, TEMPERATURE), model_name, "Prose.")
+                return "Prose."
+            return _fake_call_llm(model_name, system_prompt, user_prompt, use_cache)
+
+        with tempfile.TemporaryDirectory() as tmp, override_settings(ANALYSIS_CACHE_DIR=tmp):
+            out = io.StringIO()
+            with mock.patch("api.analysis.call_llm", side_effect=paragraph_reduce), \
+                    mock.patch("api.precompute.call_gemini_api", side_effect=_fake_call_gemini_api) as page:
+                call_command(*args, stdout=out)
+            page.assert_not_called()
+            self.assertIn("Warmed 0, already cached 0, failed 5", out.getvalue())
+            self.assertFalse(LLMResponse.objects.filter(response="Prose.").exists())
+
+            out = io.StringIO()
+            with mock.patch("api.analysis.call_llm", side_effect=_fake_call_llm), \
+                    mock.patch("api.precompute.call_gemini_api", side_effect=_fake_call_gemini_api):
+                call_command(*args, stdout=out)
+            self.assertIn("0 already warm, 5 to run", out.getvalue())
+            self.assertIn("Warmed 5,", out.getvalue())
+
+
+class BenchmarkTests(TestCase):
+
+    def test_run_and_compare_to_baseline(self):
+        results = run_benchmarks(["file_paths_for_range", "format_result", "selection_view"], 3, 1, 0.0)
+        self.assertEqual(set(results["format_result"]), {"iterations", "p50_ms", "p95_ms", "mean_ms", "peak_kb", "retained_kb"})
+        self.assertEqual(compare_to_baseline(results, results, 0.25), [])
+
+        slower = {name: dict(result, p50_ms=result["p50_ms"] * 3 + 1) for name, result in results.items()}
+        regressions = compare_to_baseline(slower, results, 0.25)
+        self.assertEqual(sorted(name for name, metric, *_ in regressions),
+                         ["file_paths_for_range", "format_result", "selection_view"])
+
+
+class FakeGeminiLoadTests(TestCase):
+
+    def serve(self, **kwargs):
+        server = start_fake_gemini(seed=1, **kwargs)
+        self.addCleanup(server.shutdown)
+        patcher = mock.patch.object(views, "API_URL_BASE", server.base_url)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return server
+
+    async def test_injected_errors_reach_the_view_helpers(self):
+        server = self.serve(rate_limit_rate=1.0, retry_after=0)
+        answer = await views.call_gemini_api({"full_text": "hello"}, use_cache=False)
+        self.assertTrue(answer.startswith("API Error (HTTP 429)"))
+        self.assertEqual(server.counts, {429: views.MAX_RETRIES})
+
+        server.rate_limit_rate, server.error_rate = 0.0, 1.0
+        answer = await views.call_gemini_api({"full_text": "hello"}, use_cache=False)
+        self.assertTrue(answer.startswith("API Error (HTTP 500)"))
+
+        server.error_rate = 0.0
+        chunks = [chunk async for chunk in views.stream_gemini_api({"full_text": "hello"}, use_cache=False)]
+        self.assertEqual("".join(chunks), server.answer)
+        await aclose_gemini_clients()
+
+    def test_latency_distributions_and_summary(self):
+        sample = latency_sampler("lognormal", 0.5, 0.2, random.Random(1))
+        draws = [sample() for _ in range(2000)]
+        self.assertAlmostEqual(sum(draws) / len(draws), 0.5, delta=0.03)
+
+        results = {"elapsed": 2.0, "scenarios": {
+            "ab": {"latencies": [0.004, 0.02, 0.3], "outcomes": Counter(ok=2, **{"HTTP 500": 1})},
+        }}
+        summary = summarize(results)
+        self.assertEqual(summary["total"]["ok"], 2)
+        self.assertEqual(summary["total"]["goodput"], 1.0)
+        self.assertEqual(summary["scenarios"]["ab"]["errors"], {"HTTP 500": 1})
+        self.assertEqual([n for _, n in histogram(results["scenarios"]["ab"]["latencies"]) if n], [1, 1, 1])
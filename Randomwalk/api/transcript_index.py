@@ -0,0 +1,262 @@
+import json
+import re
+from pathlib import Path
+from django.conf import settings
+
+from .cache_files import write_json_atomic
+from .file_reader import _assert_under_data, read_text_from_path
+from .transcript_store import PARTICIPANTS_HEADER, PRESENTATION_HEADER, QA_HEADER
+
+# Bump this when the parser output changes so stale index files get rebuilt.
+INDEX_VERSION = 1
+
+# Speaker roles used to tag every turn
+ROLE_OPERATOR = "operator"
+ROLE_EXECUTIVE = "executive"
+ROLE_ANALYST = "analyst"
+
+# Page furniture repeated on every page of the transcript
+_PAGE_FOOTER_RE = re.compile(r"^Copyright .*S&P Global")
+_PAGE_FOOTER_TAIL_RE = re.compile(r"^Global Inc\. All Rights reserved\.$", re.IGNORECASE)
+_PAGE_NUMBER_RE = re.compile(r"^spglobal\.com/marketintelligence\s*\d*$")
+_PAGE_HEADER_RE = re.compile(r"EARNINGS CALL\s+[A-Z]{3} \d{1,2}, \d{4}$")
+# The legal disclaimer after the last turn starts with "Copyright (c) 2023 by S&P Global..."
+_DISCLAIMER_RE = re.compile(r"^Copyright .* by S&P Global")
+# A few transcripts glue the Operator label onto the first line of the turn
+_GLUED_OPERATOR_RE = re.compile(r"^Operator(?=[A-Z\[])")
+
+# In-process memo: resolved path -> (mtime_ns, index)
+_memo = {}
+
+
+def _index_dir() -> Path:
+    return Path(settings.ANALYSIS_CACHE_DIR) / "transcript_index"
+
+
+def _index_path_for(path: Path) -> Path:
+    return _index_dir() / f"{path.stem}.json"
+
+
+def _squash(text: str) -> str:
+    """
+    Remove all whitespace so participant names/titles can be matched even when
+    the PDF-to-text conversion wrapped or glued them differently.
+    """
+    return re.sub(r"\s+", "", text)
+
+
+def _clean_lines(lines):
+    """
+    Strip blank lines and the per-page copyright/page-number/header furniture.
+    """
+    cleaned = []
+    for raw in lines:
+        line = raw.strip()
+        if not line:
+            continue
+        if (_PAGE_FOOTER_RE.match(line) or _PAGE_FOOTER_TAIL_RE.match(line)
+                or _PAGE_NUMBER_RE.match(line) or _PAGE_HEADER_RE.search(line)):
+            continue
+        cleaned.append(line)
+    return cleaned
+
+
+def _last_index(lines, header, before=None):
+    stop = len(lines) if before is None else before
+    for i in range(stop - 1, -1, -1):
+        if lines[i].strip() == header:
+            return i
+    return -1
+
+
+def _participant_keys(block_lines):
+    """
+    Split the "Call Participants" block into a whitespace-free lookup string per role.
+    """
+    keys = {ROLE_EXECUTIVE: [], ROLE_ANALYST: []}
+    role = None
+    for raw in block_lines:
+        line = raw.strip()
+        if line == "EXECUTIVES":
+            role = ROLE_EXECUTIVE
+        elif line in ("ANALYSTS", "ATTENDEES"):
+            role = ROLE_ANALYST
+        elif role and line:
+            keys[role].append(line)
+    return {role: _squash("".join(parts)) for role, parts in keys.items()}
+
+
+def _match_speaker(lines, i, participant_keys):
+    """
+    Check whether lines[i] starts a speaker header ("Name" followed by title/firm lines).
+    Returns (name, role, affiliation, next_line_index) or None.
+    """
+    line = lines[i]
+    if line == "Operator":
+        return "Operator", ROLE_OPERATOR, "", i + 1
+    if len(line) > 60 or i + 1 >= len(lines):
+        return None
+
+    name_key = _squash(line)
+    for role, block_key in participant_keys.items():
+        if not block_key:
+            continue
+        # The name alone must be followed by at least one title/firm line from the block
+        key = name_key + _squash(lines[i + 1])
+        if key not in block_key:
+            continue
+        j = i + 2
+        # Greedily swallow wrapped title/firm lines that still continue the block entry
+        while j < len(lines) and len(lines[j]) <= 60 and (key + _squash(lines[j])) in block_key:
+            key += _squash(lines[j])
+            j += 1
+        return line, role, " ".join(lines[i + 1:j]), j
+    return None
+
+
+def _split_turns(lines, participant_keys):
+    """
+    Split a section into speaker turns tagged with the speaker role.
+    """
+    turns = []
+    current = None
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+
+        glued = _GLUED_OPERATOR_RE.match(line)
+        if glued:
+            current = {"speaker": "Operator", "role": ROLE_OPERATOR, "affiliation": "", "lines": []}
+            turns.append(current)
+            current["lines"].append(line[len("Operator"):])
+            i += 1
+            continue
+
+        match = _match_speaker(lines, i, participant_keys)
+        if match:
+            name, role, affiliation, i = match
+            current = {"speaker": name, "role": role, "affiliation": affiliation, "lines": []}
+            turns.append(current)
+            continue
+
+        if current is not None:
+            current["lines"].append(line)
+        i += 1
+
+    return [
+        {
+            "speaker": turn["speaker"],
+            "role": turn["role"],
+            "affiliation": turn["affiliation"],
+            "text": " ".join(turn["lines"]),
+        }
+        for turn in turns
+        if turn["lines"]
+    ]
+
+
+def parse_transcript(text: str) -> dict:
+    """
+    Split an S&P Global earnings call transcript into call participants,
+    presentation turns and Q&A turns. Every turn is tagged with the speaker role
+    (operator, executive or analyst).
+    """
+    raw_lines = text.splitlines()
+
+    qa_at = _last_index(raw_lines, QA_HEADER)
+    presentation_at = _last_index(raw_lines, PRESENTATION_HEADER, before=qa_at if qa_at >= 0 else None)
+    participants_at = _last_index(raw_lines, PARTICIPANTS_HEADER, before=presentation_at if presentation_at >= 0 else None)
+
+    if presentation_at < 0 or participants_at < 0:
+        raise ValueError("Transcript does not contain the expected section headers.")
+
+    end = len(raw_lines)
+    for i in range(max(qa_at, presentation_at), len(raw_lines)):
+        if _DISCLAIMER_RE.match(raw_lines[i].strip()):
+            end = i
+            break
+
+    participant_keys = _participant_keys(raw_lines[participants_at + 1:presentation_at])
+    presentation_lines = _clean_lines(raw_lines[presentation_at + 1:qa_at if qa_at >= 0 else end])
+    qa_lines = _clean_lines(raw_lines[qa_at + 1:end]) if qa_at >= 0 else []
+
+    presentation = _split_turns(presentation_lines, participant_keys)
+    qa = _split_turns(qa_lines, participant_keys)
+
+    participants = {ROLE_EXECUTIVE: {}, ROLE_ANALYST: {}}
+    for turn in presentation + qa:
+        if turn["role"] in participants:
+            participants[turn["role"]].setdefault(turn["speaker"], turn["affiliation"])
+
+    return {
+        "participants": {
+            role: [{"name": name, "affiliation": affiliation} for name, affiliation in people.items()]
+            for role, people in participants.items()
+        },
+        "presentation": presentation,
+        "qa": qa,
+        # Precomputed positions so callers can pull one role's turns without re-scanning
+        "qa_by_role": {
+            role: [i for i, turn in enumerate(qa) if turn["role"] == role]
+            for role in (ROLE_OPERATOR, ROLE_EXECUTIVE, ROLE_ANALYST)
+        },
+    }
+
+
+def load_transcript_index(path: Path) -> dict:
+    """
+    Return the parsed segment index for a .txt transcript.
+
+    The index is persisted under ANALYSIS_CACHE_DIR and only rebuilt when the
+    transcript's mtime (or size) changes; repeat calls in the same process are
+    served from memory.
+    """
+    _assert_under_data(path)
+    path = path.resolve()
+    stat = path.stat()
+
+    memo = _memo.get(path)
+    if memo and memo[0] == (stat.st_mtime_ns, stat.st_size):
+        return memo[1]
+
+    index_path = _index_path_for(path)
+    index = None
+    try:
+        with index_path.open("r", encoding="utf-8") as f:
+            stored = json.load(f)
+        if (stored.get("version") == INDEX_VERSION
+                and stored.get("mtime_ns") == stat.st_mtime_ns
+                and stored.get("size") == stat.st_size):
+            index = stored
+    except (OSError, ValueError):
+        index = None
+
+    if index is None:
+        index = parse_transcript(read_text_from_path(path))
+        index.update({
+            "version": INDEX_VERSION,
+            "source": path.name,
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+        })
+        write_json_atomic(index_path, index)
+
+    _memo[path] = ((stat.st_mtime_ns, stat.st_size), index)
+    return index
+
+
+def get_qa_turns(path: Path, role: str = None) -> list:
+    """
+    Return the Q&A turns of a transcript, optionally only those of one speaker role.
+    """
+    index = load_transcript_index(path)
+    if role is None:
+        return index["qa"]
+    return [index["qa"][i] for i in index["qa_by_role"].get(role, [])]
+
+
+def get_analyst_questions(path: Path) -> list:
+    """
+    Return the analyst turns from the Q&A section of a transcript.
+    """
+    return get_qa_turns(path, ROLE_ANALYST)
@@ -0,0 +1,233 @@
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+from pathlib import Path
+from django.conf import settings
+
+# Bump this when normalization, section_spans or the file layout changes so old stores are ignored.
+STORE_VERSION = 2
+
+# File layout: header | normalized UTF-8 texts back to back | JSON index
+_MAGIC = b"RWTS"
+_HEADER = struct.Struct("<4sIQQ")  # magic, version, index offset, index length
+
+# The cover-page copyright block, wrapped one word per line: "COPYRIGHT", "(c)", "2023", ... "reserved"
+_WORD_BLOCK_START = "COPYRIGHT"
+_WORD_BLOCK_END = "reserved"
+_WORD_BLOCK_MAX_LINES = 80
+# Per-page footer ("Copyright (c) 2023 S&P Global ... All Rights reserved." + "spglobal.com/marketintelligence 3")
+_PAGE_FOOTER_RE = re.compile(r"^Copyright .*S&P Global")
+_PAGE_FOOTER_TAIL_RE = re.compile(r"^Global Inc\. All Rights reserved\.$", re.IGNORECASE)
+_PAGE_NUMBER_RE = re.compile(r"^spglobal\.com/marketintelligence\s*\d*$")
+# Per-page header ("AMAZON.COM, INC. FQ1 2023 EARNINGS CALL  APR 27, 2023")
+_PAGE_HEADER_RE = re.compile(r"EARNINGS CALL\s+[A-Z]{3} \d{1,2}, \d{4}$")
+# The legal disclaimer after the last turn ("Copyright (c) 2023 by S&P Global...") runs to the end
+_DISCLAIMER_RE = re.compile(r"^Copyright .* by S&P Global")
+# Table of contents entries ("Presentation ..........")
+_DOT_LEADER_RE = re.compile(r"\.{5,}\s*\d*$")
+_TOC_TITLES = ("Contents", "Table of Contents")
+_SPACES_RE = re.compile(r" {2,}")
+
+# Section headers used by the S&P Global transcripts (the table of contents repeats
+# them, so the LAST occurrence of each is used; transcript_index does the same).
+PARTICIPANTS_HEADER = "Call Participants"
+PRESENTATION_HEADER = "Presentation"
+QA_HEADER = "Question and Answer"
+
+# Section names with byte ranges in the index (see section_spans)
+SECTIONS = ("participants", "presentation", "qa")
+_SECTION_HEADERS = dict(zip((PARTICIPANTS_HEADER, PRESENTATION_HEADER, QA_HEADER), SECTIONS))
+
+# Open store: ((path, mtime_ns, size), mmap, index)
+_opened = None
+_lock = threading.Lock()
+
+
+def normalize_transcript(text: str) -> str:
+    """
+    Strip the S&P Global page furniture from a transcript: the word-per-line
+    copyright block, per-page footers and page numbers, repeated page headers
+    (the first is kept as the title), table of contents lines and the closing
+    legal disclaimer. Trailing whitespace is trimmed, runs of spaces and of
+    blank lines are collapsed.
+
+    Section headers and speaker lines are left untouched, so
+    transcript_index.parse_transcript gives the same turns for both versions.
+    """
+    lines = text.splitlines()
+    out = []
+    seen_header = False
+    i = 0
+    while i < len(lines):
+        line = _SPACES_RE.sub(" ", lines[i].strip())
+        i += 1
+
+        if line == _WORD_BLOCK_START:
+            for j in range(i, min(i + _WORD_BLOCK_MAX_LINES, len(lines))):
+                if lines[j].strip() == _WORD_BLOCK_END:
+                    i = j + 1
+                    line = None
+                    break
+            if line is None:
+                continue
+        if _DISCLAIMER_RE.match(line):
+            break
+        if (_PAGE_FOOTER_RE.match(line) or _PAGE_FOOTER_TAIL_RE.match(line)
+                or _PAGE_NUMBER_RE.match(line) or _DOT_LEADER_RE.search(line) or line in _TOC_TITLES):
+            continue
+        if _PAGE_HEADER_RE.search(line):
+            if seen_header:
+                continue
+            seen_header = True
+
+        if line or (out and out[-1]):
+            out.append(line)
+
+    while out and not out[-1]:
+        out.pop()
+    return "\n".join(out) + "\n"
+
+
+def get_store_path() -> Path:
+    return Path(getattr(settings, "TRANSCRIPT_STORE_PATH", Path(settings.ANALYSIS_CACHE_DIR) / "transcripts.pack"))
+
+
+def section_spans(text: str) -> dict:
+    """
+    Byte ranges {section: [start, stop]} of the participants, presentation and
+    Q&A sections of a normalized transcript, taken from the last line equal to
+    each header (as transcript_index does). Each section runs up to the next
+    header line or the end of the text; missing sections are left out.
+    """
+    headers = {}  # section -> (header line start, body start)
+    offset = 0
+    for line in text.encode("utf-8").splitlines(keepends=True):
+        name = _SECTION_HEADERS.get(line.strip().decode("utf-8", errors="ignore"))
+        if name:
+            headers[name] = (offset, offset + len(line))
+        offset += len(line)
+
+    ordered = sorted(headers.items(), key=lambda item: item[1])
+    return {
+        name: [body_start, ordered[i + 1][1][0] if i + 1 < len(ordered) else offset]
+        for i, (name, (_, body_start)) in enumerate(ordered)
+    }
+
+
+def write_store(path: Path, documents: list) -> dict:
+    """
+    Write normalized documents to a single store file and return its index.
+
+    `documents` is a list of dicts with "name" (source file name), "text"
+    (normalized) and any extra metadata to keep in the index (source mtime/size,
+    company, quarter, ...). The byte ranges of each text's SECTIONS are added
+    as "sections". Written to a temp file and renamed into place, so readers
+    never see a half-written store.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    entries = {}
+    with tmp_path.open("wb") as f:
+        f.write(_HEADER.pack(_MAGIC, STORE_VERSION, 0, 0))
+        for document in documents:
+            data = document["text"].encode("utf-8")
+            entry = {key: value for key, value in document.items() if key not in ("name", "text")}
+            entry.update({"offset": f.tell(), "length": len(data), "sections": section_spans(document["text"])})
+            entries[document["name"]] = entry
+            f.write(data)
+
+        index = {"version": STORE_VERSION, "entries": entries}
+        index_data = json.dumps(index).encode("utf-8")
+        index_offset = f.tell()
+        f.write(index_data)
+        f.seek(0)
+        f.write(_HEADER.pack(_MAGIC, STORE_VERSION, index_offset, len(index_data)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return index
+
+
+def _open_store(path: Path):
+    """
+    Map the store file read-only and parse its index, once per process (again
+    only when the file is replaced). Returns (mmap, index), or None when there
+    is no current store. Nothing but the header and index is read here: the
+    texts are paged in from the shared page cache when a slice is decoded.
+    """
+    global _opened
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    key = (str(path), stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        if _opened is not None and _opened[0] == key:
+            return _opened[1:] if _opened[2] is not None else None
+
+        mapped, index = None, None
+        if stat.st_size >= _HEADER.size:
+            with path.open("rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, index_offset, index_length = _HEADER.unpack_from(mapped)
+            if magic == _MAGIC and version == STORE_VERSION:
+                index = json.loads(str(memoryview(mapped)[index_offset:index_offset + index_length], "utf-8"))
+        # A replaced store's old mapping is released once no reader holds a slice of it
+        _opened = (key, mapped, index)
+        return (mapped, index) if index is not None else None
+
+
+def load_store_index(path: Path = None):
+    """
+    Return the index of the store file, or None when there is no (current) store.
+    """
+    opened = _open_store(path or get_store_path())
+    return opened[1] if opened else None
+
+
+def _stored_entry(source: Path, stat: os.stat_result):
+    """
+    (mmap, index entry) for a source file, or None when the store is missing or
+    was built from a different version of that file.
+    """
+    opened = _open_store(get_store_path())
+    if opened is None:
+        return None
+    mapped, index = opened
+    entry = index["entries"].get(source.name)
+    if entry is None or entry.get("source_mtime_ns") != stat.st_mtime_ns or entry.get("source_size") != stat.st_size:
+        return None
+    return mapped, entry
+
+
+def is_stored(source: Path, stat: os.stat_result) -> bool:
+    """
+    Whether the store holds the current version of a source file (nothing is decoded).
+    """
+    return _stored_entry(source, stat) is not None
+
+
+def read_stored_text(source: Path, stat: os.stat_result, section: str = None):
+    """
+    Return the normalized text of a source file (or one of its SECTIONS) from
+    the store, or None when the file is not stored (see _stored_entry) or has
+    no such section.
+
+    The bytes are decoded straight out of the shared mapping, so the only
+    per-process copy is the returned str, which lives as long as the caller
+    keeps it.
+    """
+    stored = _stored_entry(source, stat)
+    if stored is None:
+        return None
+    mapped, entry = stored
+    start, stop = entry["offset"], entry["offset"] + entry["length"]
+    if section is not None:
+        span = entry.get("sections", {}).get(section)
+        if span is None:
+            return None
+        start, stop = entry["offset"] + span[0], entry["offset"] + span[1]
+    return str(memoryview(mapped)[start:stop], "utf-8")
@@ -5,6 +5,16 @@ urlpatterns = [
     # Main page view (default path for the app)
     path('', views.quarterly_selection_view, name='quarterly_selection'),
 
+    # Server-sent events version of the analysis (used by the page's JavaScript)
+    path('stream/', views.analysis_stream_view, name='analysis_stream'),
+
+    # Background jobs: submit a range, then poll for the result
+    path('jobs/', views.analysis_job_create_view, name='analysis_job_create'),
+    path('jobs/<uuid:job_id>/', views.analysis_job_status_view, name='analysis_job_status'),
+
+    # Staff-only counters for caches and request coalescing
+    path('metrics/', views.analysis_metrics_view, name='analysis_metrics'),
+
     # Analytics / Tracking endpoint
     # This path maps to the update_visit_time function in api/views.py
     path('tracking/api/update-time/', views.update_visit_time, name='update_time'),
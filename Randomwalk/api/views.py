@@ -1,17 +1,30 @@
-import time
+import asyncio
 import os
+import time
 import json
 import httpx 
 import random 
-from django.shortcuts import render
-from django.http import HttpRequest, JsonResponse, HttpResponse 
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.shortcuts import render, get_object_or_404
+from django.urls import reverse
+from django.http import HttpRequest, JsonResponse, HttpResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt 
+from django.contrib.admin.views.decorators import staff_member_required
 from .prompts import TREND_PROMPT 
+from .llm_cache import make_cache_key, aget_cached_response, astore_response
+from .gemini_client import get_gemini_client, get_gemini_semaphore, backoff_delay
+from .singleflight import analysis_flights, stream_flights
+from .file_reader import get_text_cache
+from .jobs import enqueue_analysis
+from .drift import compute_drift, format_drift_report
+from .catalog import get_companies, get_quarters, resolve_range
+from .models import AnalysisJob
 
 # --- Constants for Simulation and API ---
 MAX_RETRIES = 5
 GEMINI_MODEL = "gemini-2.5-flash-preview-09-2025" 
-API_URL_BASE = "https://generativelanguage.googleapis.com/v1beta/models"
+API_URL_BASE = os.environ.get("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta/models")
 
 # --- Helper Function: Quarter Comparison ---
 def compare_quarters(q1: str, q2: str) -> int:
@@ -32,12 +45,27 @@ def compare_quarters(q1: str, q2: str) -> int:
 
 # --- Helper Function: Generate Quarter Options ---
 def get_quarter_options() -> list:
-    """Generates a list of quarter strings from 2020Q1 to 2025Q4."""
-    quarters = []
-    for year in range(2020, 2026):
-        for q in range(1, 5):
-            quarters.append(f"{year}Q{q}")
-    return quarters
+    """Quarters available in the data catalog (any company), oldest first."""
+    return get_quarters()
+
+# --- Helper Function: Validate a Selection Against the Catalog ---
+def catalog_error(company: str, start_q: str, end_q: str):
+    """
+    Returns an error message when the data catalog cannot serve the selection
+    (unknown company or quarter, reversed range, missing quarter), else None.
+    """
+    if company not in get_companies():
+        return f"Error: Unknown company: {company}"
+    quarters = get_quarters()
+    if start_q not in quarters or end_q not in quarters:
+        return "Error: Invalid quarter selection."
+    if compare_quarters(start_q, end_q) == 1:
+        return "Error: Starting quarter cannot be later than the ending quarter."
+    try:
+        resolve_range(company, start_q, end_q)
+    except (ValueError, FileNotFoundError) as e:
+        return f"Error: {e}"
+    return None
 
 # --- Helper Function: Simulate Stock Data Fetching ---
 def get_stock_data(company: str, start_q: str, end_q: str) -> dict:
@@ -81,10 +109,10 @@ Analyst Question: "Given Azure's increasing market dominance, particularly in th
         'full_text': data
     }
 
-# --- Core Function: Call the Real Gemini API ---
-async def call_gemini_api(api_data: dict) -> str:
+# --- Helper Function: Build the Gemini Request ---
+def build_gemini_request(api_data: dict) -> tuple:
     """
-    Calls the Gemini API to fetch a plain text analytical paragraph.
+    Returns (system_instruction, user_query, payload) for a generateContent call.
     """
     system_instruction = TREND_PROMPT.format(
         ticker=api_data.get('ticker', 'UNKNOWN'),
@@ -96,41 +124,180 @@ async def call_gemini_api(api_data: dict) -> str:
     
     user_query = f"Analyze the following file excerpts and output the result according to the provided instructions:\n\n---\n{api_data.get('full_text', 'No content provided.')}\n---\n"
     
-    api_key = os.environ.get('GOOGLE_API_KEY', os.environ.get('GEMINI_API_KEY', ""))
-    api_url = f"{API_URL_BASE}/{GEMINI_MODEL}:generateContent?key={api_key}"
-    
     payload = {
         "contents": [{"role": "user", "parts": [{"text": user_query}]}],
         "systemInstruction": {"parts": [{"text": system_instruction}]}
     }
+    return system_instruction, user_query, payload
+
+def gemini_url(method: str, **params) -> str:
+    """
+    Full URL for a Gemini model method ('generateContent' or 'streamGenerateContent').
+    """
+    api_key = os.environ.get('GOOGLE_API_KEY', os.environ.get('GEMINI_API_KEY', ""))
+    query = "".join(f"&{name}={value}" for name, value in params.items())
+    return f"{API_URL_BASE}/{GEMINI_MODEL}:{method}?key={api_key}{query}"
+
+# --- Core Function: Call the Real Gemini API ---
+async def call_gemini_api(api_data: dict, use_cache: bool = True) -> str:
+    """
+    Calls the Gemini API to fetch a plain text analytical paragraph.
+    Successful answers are cached by prompt digest; pass use_cache=False to force a fresh call.
+    """
+    system_instruction, user_query, payload = build_gemini_request(api_data)
     
-    async with httpx.AsyncClient(timeout=60.0) as client: 
-        for attempt in range(MAX_RETRIES):
-            try:
+    cache_key = make_cache_key(GEMINI_MODEL, system_instruction, user_query)
+    if use_cache:
+        cached = await aget_cached_response(cache_key)
+        if cached is not None:
+            return cached
+
+    api_url = gemini_url("generateContent")
+    
+    # Pooled keep-alive client shared by every request on this event loop
+    client = get_gemini_client()
+    for attempt in range(MAX_RETRIES):
+        try:
+            # Only the provider round trip holds a concurrency slot, not the backoff
+            async with get_gemini_semaphore():
                 response = await client.post(
                     api_url, 
                     headers={'Content-Type': 'application/json'},
-                    data=json.dumps(payload)
+                    content=json.dumps(payload)
                 )
-                response.raise_for_status()
-                result = response.json()
-                
-                try:
-                    final_text = result['candidates'][0]['content']['parts'][0]['text']
-                    return final_text.strip() 
-                except (KeyError, IndexError) as e:
-                    return f"API Structure Error: The model returned an unexpected format. Details: {e}"
-
-            except httpx.HTTPStatusError as e:
-                if e.response.status_code == 429 and attempt < MAX_RETRIES - 1:
-                    time.sleep(2 ** attempt) 
-                else:
-                    return f"API Error (HTTP {e.response.status_code}): {e.response.text}"
-            except Exception as e:
-                return f"An unexpected error occurred during API call: {type(e).__name__} - {e}"
+            response.raise_for_status()
+            result = response.json()
+            
+            try:
+                final_text = result['candidates'][0]['content']['parts'][0]['text'].strip()
+            except (KeyError, IndexError) as e:
+                return f"API Structure Error: The model returned an unexpected format. Details: {e}"
+            if not final_text:
+                # Not cached: a blank analysis would be served for the whole cache TTL
+                return "API Structure Error: The model returned an empty answer."
+            await astore_response(cache_key, GEMINI_MODEL, final_text)
+            return final_text
+
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 429 and attempt < MAX_RETRIES - 1:
+                # Non-blocking: other requests on the event loop keep running
+                await asyncio.sleep(backoff_delay(attempt, e.response))
+            else:
+                return f"API Error (HTTP {e.response.status_code}): {e.response.text}"
+        except Exception as e:
+            return f"An unexpected error occurred during API call: {type(e).__name__} - {e}"
 
     return "Error: API call failed after multiple retries."
 
+# --- Core Function: Stream the Gemini API Response ---
+async def stream_gemini_api(api_data: dict, use_cache: bool = True):
+    """
+    Async generator version of call_gemini_api using streamGenerateContent (SSE).
+    Yields text chunks as the model produces them; a cached answer is yielded in one piece.
+    Errors are raised as RuntimeError so the caller can report them to the client.
+
+    A provider slot is held while the stream is read, so consume it promptly
+    (analysis_stream_view reads it through stream_flights, not at the client's
+    pace). The stream is cut off after GEMINI_STREAM_MAX_SECONDS.
+    """
+    system_instruction, user_query, payload = build_gemini_request(api_data)
+
+    cache_key = make_cache_key(GEMINI_MODEL, system_instruction, user_query)
+    if use_cache:
+        cached = await aget_cached_response(cache_key)
+        if cached is not None:
+            yield cached
+            return
+
+    api_url = gemini_url("streamGenerateContent", alt="sse")
+    client = get_gemini_client()
+    max_seconds = getattr(settings, "GEMINI_STREAM_MAX_SECONDS", 120.0)
+    for attempt in range(MAX_RETRIES):
+        parts = []
+        async with get_gemini_semaphore():
+            async with client.stream(
+                "POST",
+                api_url,
+                headers={'Content-Type': 'application/json'},
+                content=json.dumps(payload),
+            ) as response:
+                if response.status_code == 429 and attempt < MAX_RETRIES - 1:
+                    delay = backoff_delay(attempt, response)
+                elif response.status_code != 200:
+                    body = (await response.aread()).decode("utf-8", errors="ignore")
+                    raise RuntimeError(f"API Error (HTTP {response.status_code}): {body}")
+                else:
+                    # Stalled reads are bounded by the client timeout, the whole stream by this deadline
+                    deadline = time.monotonic() + max_seconds
+                    async for line in response.aiter_lines():
+                        if time.monotonic() > deadline:
+                            raise RuntimeError(f"API Error: the stream took longer than {max_seconds:g}s.")
+                        if not line.startswith("data:"):
+                            continue
+                        try:
+                            event = json.loads(line[5:])
+                            chunk = event['candidates'][0]['content']['parts'][0]['text']
+                        except (ValueError, KeyError, IndexError):
+                            continue
+                        parts.append(chunk)
+                        yield chunk
+                    delay = None
+        if delay is None:
+            text = "".join(parts).strip()
+            if not text:
+                # Every event was malformed or blank: report it, and never cache the empty answer
+                raise RuntimeError("API Structure Error: The model returned an empty answer.")
+            await astore_response(cache_key, GEMINI_MODEL, text)
+            return
+        # Back off outside the concurrency slot, without blocking the event loop
+        await asyncio.sleep(delay)
+
+    raise RuntimeError("API call failed after multiple retries.")
+
+def _sse_event(data: dict, event: str = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+# --- Streaming View Function ---
+@csrf_exempt
+async def analysis_stream_view(request: HttpRequest):
+    """
+    Same form fields as quarterly_selection_view, but answers with server-sent
+    events so the page can render the analysis while it is being generated.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'invalid method'}, status=405)
+
+    company = request.POST.get('company')
+    start_q = request.POST.get('start_quarter')
+    end_q = request.POST.get('end_quarter')
+
+    if not (company and start_q and end_q):
+        return JsonResponse({'status': 'error', 'message': "Please select all fields (Company, Starting Quarter, and Ending Quarter)."}, status=400)
+    error = catalog_error(company, start_q, end_q)
+    if error:
+        return JsonResponse({'status': 'error', 'message': error}, status=400)
+
+    api_data = get_stock_data(company, start_q, end_q)
+    use_cache = request.POST.get('refresh') != '1'
+
+    # Identical streams in flight share one provider call, read at the provider's pace
+    flight_key = (company.strip(), start_q.strip().upper(), end_q.strip().upper(), use_cache)
+
+    async def events():
+        try:
+            async for chunk in stream_flights.stream(flight_key, lambda: stream_gemini_api(api_data, use_cache=use_cache)):
+                yield _sse_event({'text': chunk})
+            yield _sse_event({}, event='done')
+        except Exception as e:
+            yield _sse_event({'message': f"An error occurred during analysis: {e}"}, event='error')
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Ask reverse proxies (nginx, Render) not to buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 # --- Main View Function ---
 @csrf_exempt 
 async def quarterly_selection_view(request: HttpRequest):
@@ -139,11 +306,12 @@ async def quarterly_selection_view(request: HttpRequest):
     """
     context = {
         'quarters': get_quarter_options(),
-        'companies': ['Amazon', 'Microsoft'],
+        'companies': get_companies(),
         'analysis_result': None,
         'selected_company': None,
         'selected_start': None,
         'selected_end': None,
+        'selected_mode': 'llm',
     }
 
     if request.method == 'POST':
@@ -154,15 +322,33 @@ async def quarterly_selection_view(request: HttpRequest):
         context['selected_company'] = company
         context['selected_start'] = start_q
         context['selected_end'] = end_q
+        context['selected_mode'] = request.POST.get('mode', 'llm')
 
         if company and start_q and end_q:
-            if compare_quarters(start_q, end_q) == 1:
-                context['analysis_result'] = "Error: Starting quarter cannot be later than the ending quarter."
+            # Checked against the in-memory data catalog before any work is done
+            error = catalog_error(company, start_q, end_q)
+            if error:
+                context['analysis_result'] = error
+                return render(request, 'api/index.html', context)
+
+            if request.POST.get('mode') == 'drift':
+                # Quantitative fast path: term-frequency drift, no LLM call. It parses and
+                # counts whole transcripts, so it runs in a worker thread, off the event loop
+                try:
+                    report = await sync_to_async(compute_drift, thread_sensitive=False)(company, start_q, end_q)
+                    context['analysis_result'] = format_drift_report(report)
+                except (ValueError, OSError) as e:
+                    context['analysis_result'] = f"An error occurred during analysis: {e}"
                 return render(request, 'api/index.html', context)
 
             try:
                 api_data = get_stock_data(company, start_q, end_q)
-                analysis_text = await call_gemini_api(api_data)
+                use_cache = request.POST.get('refresh') != '1'
+                # Identical analyses already in flight share one provider call
+                flight_key = (company.strip(), start_q.strip().upper(), end_q.strip().upper(), use_cache)
+                analysis_text = await analysis_flights.do(
+                    flight_key, lambda: call_gemini_api(api_data, use_cache=use_cache)
+                )
                 context['analysis_result'] = analysis_text
             except Exception as e:
                 context['analysis_result'] = f"An error occurred during analysis: {e}"
@@ -171,6 +357,60 @@ async def quarterly_selection_view(request: HttpRequest):
 
     return render(request, 'api/index.html', context)
 
+# --- Background Job Views ---
+@csrf_exempt
+def analysis_job_create_view(request: HttpRequest):
+    """
+    Queue a trend analysis and return its job id right away.
+    The result is produced by `manage.py run_analysis_workers`.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'invalid method'}, status=405)
+
+    company = request.POST.get('company')
+    start_q = request.POST.get('start_quarter')
+    end_q = request.POST.get('end_quarter')
+    if not (company and start_q and end_q):
+        return JsonResponse({'status': 'error', 'message': "Please select all fields (Company, Starting Quarter, and Ending Quarter)."}, status=400)
+
+    try:
+        job = enqueue_analysis(company, start_q, end_q)
+    except (ValueError, FileNotFoundError) as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    return JsonResponse({
+        'job_id': str(job.pk),
+        'status': job.status,
+        'status_url': reverse('analysis_job_status', args=[job.pk]),
+    }, status=202)
+
+def analysis_job_status_view(request: HttpRequest, job_id):
+    """
+    Poll a background analysis: status, and the result once it is done.
+    """
+    job = get_object_or_404(AnalysisJob, pk=job_id)
+    return JsonResponse({
+        'job_id': str(job.pk),
+        'company': job.company,
+        'start_quarter': job.start_quarter,
+        'end_quarter': job.end_quarter,
+        'status': job.status,
+        'result': job.result if job.status == AnalysisJob.STATUS_DONE else None,
+        'error': job.error or None,
+    })
+
+# --- Metrics View ---
+@staff_member_required
+def analysis_metrics_view(request: HttpRequest):
+    """
+    JSON counters for the in-process analysis caches and request coalescing.
+    """
+    return JsonResponse({
+        'singleflight': analysis_flights.stats(),
+        'stream_singleflight': stream_flights.stats(),
+        'text_cache': get_text_cache().stats(),
+    })
+
 # --- Analytics / Tracking View ---
 @csrf_exempt
 def update_visit_time(request: HttpRequest):
@@ -4,6 +4,7 @@ Django settings for myproject project.
 
 from pathlib import Path
 import os
+import sys
 import dj_database_url
 from dotenv import load_dotenv
 
@@ -22,9 +23,9 @@ load_dotenv(DOTENV_PATH)
 # CRITICAL DEBUG: Check if the key was loaded from the .env file (for local testing)
 google_key_check = os.environ.get('GOOGLE_API_KEY')
 if google_key_check:
-    print(f"SETTINGS DEBUG: Successfully loaded GOOGLE_API_KEY (First 4 chars: {google_key_check[:4]})")
+    print(f"SETTINGS DEBUG: Successfully loaded GOOGLE_API_KEY (First 4 chars: {google_key_check[:4]})", file=sys.stderr)
 else:
-    print(f"SETTINGS DEBUG: WARNING! GOOGLE_API_KEY not found in environment after loading {DOTENV_PATH}")
+    print(f"SETTINGS DEBUG: WARNING! GOOGLE_API_KEY not found in environment after loading {DOTENV_PATH}", file=sys.stderr)
 
 
 # ---
@@ -170,3 +171,77 @@ STORAGES = {
 }
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# ---
+# ANALYSIS CACHES
+# ---
+# Derived files (transcript indexes, caches) live here so the data/ folder stays read-only.
+ANALYSIS_CACHE_DIR = Path(os.environ.get('ANALYSIS_CACHE_DIR', BASE_DIR / 'cache'))
+
+# How long a process trusts its transcript catalog and search index before re-checking data/ for changes.
+TRANSCRIPT_REVALIDATE_SECONDS = float(os.environ.get('TRANSCRIPT_REVALIDATE_SECONDS', 30.0))
+
+# Upper bound (in bytes) for the in-memory cache of decoded transcript text, per process.
+TRANSCRIPT_CACHE_MAX_BYTES = int(os.environ.get('TRANSCRIPT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+# Persistent LLM response cache (api.LLMResponse). TTL and size limit of 0 disable that bound.
+LLM_CACHE_ENABLED = os.environ.get('LLM_CACHE_ENABLED', 'True') == 'True'
+LLM_CACHE_TTL_SECONDS = int(os.environ.get('LLM_CACHE_TTL_SECONDS', 30 * 24 * 3600))
+LLM_CACHE_MAX_BYTES = int(os.environ.get('LLM_CACHE_MAX_BYTES', 50 * 1024 * 1024))
+
+# Parallel provider calls when generating missing per-quarter summaries
+ANALYSIS_MAP_WORKERS = int(os.environ.get('ANALYSIS_MAP_WORKERS', 4))
+
+# Gemini HTTP client: in-flight call limit per worker, retry backoff and optional HTTP/2 (needs 'h2')
+GEMINI_MAX_CONCURRENCY = int(os.environ.get('GEMINI_MAX_CONCURRENCY', 8))
+GEMINI_BACKOFF_BASE_SECONDS = float(os.environ.get('GEMINI_BACKOFF_BASE_SECONDS', 1.0))
+GEMINI_BACKOFF_MAX_SECONDS = float(os.environ.get('GEMINI_BACKOFF_MAX_SECONDS', 16.0))
+GEMINI_HTTP2 = os.environ.get('GEMINI_HTTP2', 'False') == 'True'
+# Longest a streamed analysis may hold a provider slot
+GEMINI_STREAM_MAX_SECONDS = float(os.environ.get('GEMINI_STREAM_MAX_SECONDS', 120.0))
+
+# Background analysis jobs (api.AnalysisJob), consumed by `manage.py run_analysis_workers`
+ANALYSIS_JOB_WORKERS = int(os.environ.get('ANALYSIS_JOB_WORKERS', 2))
+ANALYSIS_JOB_POLL_SECONDS = float(os.environ.get('ANALYSIS_JOB_POLL_SECONDS', 1.0))
+ANALYSIS_JOB_TIMEOUT_SECONDS = int(os.environ.get('ANALYSIS_JOB_TIMEOUT_SECONDS', 900))
+
+# Token budgets (estimated) for the per-quarter map prompts and the combined reduce prompt
+ANALYSIS_MAP_TOKEN_BUDGET = int(os.environ.get('ANALYSIS_MAP_TOKEN_BUDGET', 6000))
+ANALYSIS_CONTEXT_TOKEN_BUDGET = int(os.environ.get('ANALYSIS_CONTEXT_TOKEN_BUDGET', 16000))
+
+# Evidence passages retrieved from the local BM25 index for the reduce prompt
+ANALYSIS_EVIDENCE_PER_QUERY = int(os.environ.get('ANALYSIS_EVIDENCE_PER_QUERY', 3))
+ANALYSIS_EVIDENCE_TOKEN_BUDGET = int(os.environ.get('ANALYSIS_EVIDENCE_TOKEN_BUDGET', 3000))
+
+# Page visit tracking: visits are buffered in memory and written in batches
+TRACKING_FLUSH_SECONDS = float(os.environ.get('TRACKING_FLUSH_SECONDS', 5.0))
+TRACKING_BUFFER_MAX_EVENTS = int(os.environ.get('TRACKING_BUFFER_MAX_EVENTS', 500))
+# Visits (and durations) kept for retry while the database is failing; older ones are dropped
+TRACKING_BUFFER_MAX_BACKLOG = int(os.environ.get('TRACKING_BUFFER_MAX_BACKLOG', 50000))
+# Run PageViewMiddleware in async mode under ASGI (see `manage.py benchmark_tracking`)
+TRACKING_MIDDLEWARE_ASYNC = os.environ.get('TRACKING_MIDDLEWARE_ASYNC', 'False') == 'True'
+# Signed cookie that identifies anonymous visitors for tracking.SiteVisit (no session row needed)
+TRACKING_VISITOR_COOKIE = os.environ.get('TRACKING_VISITOR_COOKIE', 'rw_visitor')
+TRACKING_VISITOR_COOKIE_AGE = int(os.environ.get('TRACKING_VISITOR_COOKIE_AGE', 365 * 24 * 3600))
+# How long a time-on-page beacon waits for its visit to be written before it is dropped
+TRACKING_DURATION_RETRY_SECONDS = float(os.environ.get('TRACKING_DURATION_RETRY_SECONDS', 60.0))
+# `manage.py archive_visits`: visits older than this move to gzip JSONL files in TRACKING_ARCHIVE_DIR
+TRACKING_RETENTION_DAYS = int(os.environ.get('TRACKING_RETENTION_DAYS', 90))
+TRACKING_ARCHIVE_DIR = Path(os.environ.get('TRACKING_ARCHIVE_DIR', BASE_DIR / 'archive'))
+
+# Processes used to extract PDF pages (1 or 0 = extract in the calling process)
+PDF_EXTRACT_WORKERS = int(os.environ.get('PDF_EXTRACT_WORKERS', os.cpu_count() or 1))
+
+# Normalized transcripts written by `manage.py ingest_transcripts` and read by api.file_reader
+TRANSCRIPT_STORE_PATH = Path(os.environ.get('TRANSCRIPT_STORE_PATH', ANALYSIS_CACHE_DIR / 'transcripts.pack'))
+
+# `manage.py warm_analysis_cache`: steps in flight and provider calls per minute (0 = unlimited)
+ANALYSIS_WARM_CONCURRENCY = int(os.environ.get('ANALYSIS_WARM_CONCURRENCY', 4))
+ANALYSIS_WARM_CALLS_PER_MINUTE = float(os.environ.get('ANALYSIS_WARM_CALLS_PER_MINUTE', 60))
+# Provider list prices (USD per million tokens) used for cost estimates
+LLM_INPUT_PRICE_PER_MTOK = float(os.environ.get('LLM_INPUT_PRICE_PER_MTOK', 0.075))
+LLM_OUTPUT_PRICE_PER_MTOK = float(os.environ.get('LLM_OUTPUT_PRICE_PER_MTOK', 0.30))
+
+# Optional endpoint override for litellm calls (e.g. `manage.py fake_gemini_server` for load tests)
+LLM_API_BASE = os.environ.get('LLM_API_BASE') or None
@@ -27,6 +27,9 @@ urlpatterns = [
 
     # 2. Your app is added under the 'analysis/' path
     path('analysis/', include('api.urls')),
+
+    # Page tracking endpoints (time-on-page beacons)
+    path('tracking/', include('tracking.urls')),
     
     # 3. CRITICAL: A/B Testing Endpoint
     # Matches the sha1 hash of 'patient-sky'
@@ -1,6 +1,6 @@
 # tracking/admin.py
 from django.contrib import admin
-from .models import PageView, SiteVisit
+from .models import PageView, SiteVisit, VisitRollup
 
 @admin.register(PageView)
 class PageViewAdmin(admin.ModelAdmin):
@@ -9,7 +9,12 @@ class PageViewAdmin(admin.ModelAdmin):
 
 @admin.register(SiteVisit)
 class SiteVisitAdmin(admin.ModelAdmin):
-    list_display = ('timestamp', 'path', 'session_key')
+    list_display = ('timestamp', 'path', 'visitor_id', 'session_key')
     list_filter = ('timestamp', 'path')
+
+@admin.register(VisitRollup)
+class VisitRollupAdmin(admin.ModelAdmin):
+    list_display = ('bucket_start', 'period', 'path', 'visits', 'unique_visitors', 'total_time_seconds')
+    list_filter = ('period', 'path')
     
 # Register your models here.
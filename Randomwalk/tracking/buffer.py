@@ -0,0 +1,223 @@
+import atexit
+import logging
+import threading
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import PageView, SiteVisit
+
+logger = logging.getLogger(__name__)
+
+
+class VisitBuffer:
+    """
+    In-process buffer of page visits, written to the database in batches.
+
+    The middleware only appends to a list; a background thread flushes every
+    `flush_seconds`, or as soon as `max_events` visits are waiting. A flush is
+    one bulk_create for SiteVisit plus one atomic F('visits') + n update per
+    path, so concurrent workers never lose counts.
+
+    Time-on-page beacons are queued here too and applied after the visits they
+    belong to have been written, with a single bulk_update. A duration whose
+    visit is not in the database yet (e.g. still buffered by another worker) is
+    retried on later flushes for up to `duration_retry_seconds`.
+
+    While the database is failing, at most `max_backlog` visits (and as many
+    durations) are kept for retry; the oldest are dropped beyond that.
+    """
+
+    def __init__(self, flush_seconds: float = 5.0, max_events: int = 500, duration_retry_seconds: float = 60.0,
+                 max_backlog: int = 50000):
+        self.flush_seconds = flush_seconds
+        self.max_events = max_events
+        self.duration_retry_seconds = duration_retry_seconds
+        self.max_backlog = max_backlog
+        self._events = []
+        self._durations = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.flushed = 0
+        self.flushes = 0
+        self.errors = 0
+        self.dropped_durations = 0
+        self.dropped_events = 0
+
+    def add(self, path: str, visitor_id: str, session_key: str = '') -> None:
+        """
+        Record one visit. Never touches the database.
+        """
+        with self._lock:
+            self._events.append((path, visitor_id, session_key, timezone.now()))
+            full = len(self._events) >= self.max_events
+            if self._thread is None or not self._thread.is_alive():
+                self._start()
+        if full:
+            self._wakeup.set()
+
+    def add_durations(self, visitor_id: str, durations: list) -> None:
+        """
+        Queue [(path, seconds), ...] from one beacon. Never touches the database.
+        """
+        now = timezone.now()
+        with self._lock:
+            self._durations.extend((visitor_id, path, seconds, now) for path, seconds in durations)
+            if self._thread is None or not self._thread.is_alive():
+                self._start()
+
+    def _start(self) -> None:
+        # Started lazily so forked server workers each get their own flusher
+        self._thread = threading.Thread(target=self._run, name="tracking-flush", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self.flush_seconds)
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Flushing buffered page visits failed")
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._events)
+
+    def pending_durations(self) -> int:
+        with self._lock:
+            return len(self._durations)
+
+    def flush(self) -> int:
+        """
+        Write every buffered visit to the database, then apply queued durations.
+        Returns the number of visits written. On a database error the batch is
+        put back and retried on the next flush.
+        """
+        with self._flush_lock:
+            with self._lock:
+                events, self._events = self._events, []
+                durations, self._durations = self._durations, []
+            if not events and not durations:
+                return 0
+            try:
+                if events:
+                    _write_events(events)
+                written = len(events)
+                events = []
+                unmatched = _apply_durations(durations) if durations else []
+            except Exception:
+                with self._lock:
+                    self._events[:0] = events
+                    self._durations[:0] = durations
+                    # Bounded backlog: keep the newest while the database is down
+                    overflow = len(self._events) - self.max_backlog
+                    if overflow > 0:
+                        del self._events[:overflow]
+                        self.dropped_events += overflow
+                    overflow = len(self._durations) - self.max_backlog
+                    if overflow > 0:
+                        del self._durations[:overflow]
+                        self.dropped_durations += overflow
+                self.errors += 1
+                raise
+
+            cutoff = timezone.now() - timedelta(seconds=self.duration_retry_seconds)
+            retry = [item for item in unmatched if item[3] >= cutoff]
+            if retry:
+                with self._lock:
+                    self._durations[:0] = retry
+            self.dropped_durations += len(unmatched) - len(retry)
+            self.flushes += 1
+            self.flushed += written
+            return written
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending(),
+            "pending_durations": self.pending_durations(),
+            "dropped_durations": self.dropped_durations,
+            "dropped_events": self.dropped_events,
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "errors": self.errors,
+        }
+
+
+@transaction.atomic
+def _write_events(events: list) -> None:
+    # One transaction: a failed batch is put back whole, so it must not leave half of it written
+    SiteVisit.objects.bulk_create([
+        SiteVisit(path=path, visitor_id=visitor_id, session_key=session_key, timestamp=timestamp, time_spent_seconds=0)
+        for path, visitor_id, session_key, timestamp in events
+    ])
+
+    counts = Counter(event[0] for event in events)
+    # Make sure every path has a row, then increment in the database (no read-modify-write)
+    PageView.objects.bulk_create([PageView(path=path, visits=0) for path in counts], ignore_conflicts=True)
+    for path, n in counts.items():
+        PageView.objects.filter(path=path).update(visits=F('visits') + n)
+
+
+def _apply_durations(durations: list) -> list:
+    """
+    Set time_spent_seconds on the newest not-yet-timed visits of each
+    (visitor, path) and return the durations that found no visit.
+
+    Each lookup is a LIMIT n scan of the (visitor_id, path, timestamp) index,
+    so the cost does not grow with the size of the table.
+    """
+    wanted = {}
+    for item in durations:
+        # Newest first, to pair with the newest visits
+        wanted.setdefault((item[0], item[1]), []).insert(0, item)
+
+    updates = []
+    unmatched = []
+    for (visitor_id, path), items in wanted.items():
+        pks = list(
+            SiteVisit.objects.filter(visitor_id=visitor_id, path=path, duration_recorded=False)
+            .order_by('-timestamp')
+            .values_list('pk', flat=True)[:len(items)]
+        )
+        updates.extend(
+            SiteVisit(pk=pk, time_spent_seconds=item[2], duration_recorded=True) for pk, item in zip(pks, items)
+        )
+        unmatched.extend(items[len(pks):])
+
+    SiteVisit.objects.bulk_update(updates, ['time_spent_seconds', 'duration_recorded'], batch_size=500)
+    return unmatched
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_visit_buffer() -> VisitBuffer:
+    """
+    Return the visit buffer shared by this process.
+    """
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = VisitBuffer(
+                flush_seconds=getattr(settings, 'TRACKING_FLUSH_SECONDS', 5.0),
+                max_events=getattr(settings, 'TRACKING_BUFFER_MAX_EVENTS', 500),
+                duration_retry_seconds=getattr(settings, 'TRACKING_DURATION_RETRY_SECONDS', 60.0),
+                max_backlog=getattr(settings, 'TRACKING_BUFFER_MAX_BACKLOG', 50000),
+            )
+            atexit.register(_flush_at_exit)
+        return _buffer
+
+
+def _flush_at_exit() -> None:
+    try:
+        _buffer.flush()
+    except Exception:
+        logger.exception("Could not flush page visits at exit")
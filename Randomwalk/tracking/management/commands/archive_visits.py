@@ -0,0 +1,83 @@
+import gzip
+import json
+import os
+import time
+from datetime import timedelta
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from tracking.models import RollupState, SiteVisit
+from tracking.rollups import WATERMARK_NAME, _day_start
+
+ARCHIVE_FIELDS = ('id', 'timestamp', 'path', 'visitor_id', 'session_key', 'time_spent_seconds')
+
+
+class Command(BaseCommand):
+    help = 'Moves old SiteVisit rows into a gzip JSONL archive in small batches, then deletes them (cron-safe)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'TRACKING_RETENTION_DAYS', 90),
+                            help='Keep visits newer than this many days')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows archived and deleted per transaction')
+        parser.add_argument('--pause', type=float, default=0.05, help='Seconds to sleep between batches')
+        parser.add_argument('--archive-dir', default=getattr(settings, 'TRACKING_ARCHIVE_DIR', settings.BASE_DIR / 'archive'))
+        parser.add_argument('--include-unrolled', action='store_true',
+                            help='Also remove visits that rollup_visits has not aggregated yet')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the visits that would be archived')
+
+    def handle(self, *args, **options):
+        # Whole local days only: a partly archived day would lose the archived visits from its
+        # rollups the next time update_rollups recomputes it from the remaining rows
+        cutoff = _day_start(timezone.now() - timedelta(days=options['days']))
+        old_visits = SiteVisit.objects.filter(timestamp__lt=cutoff)
+        if not options['include_unrolled']:
+            # Never drop raw rows whose numbers are not in the rollups yet
+            state = RollupState.objects.filter(name=WATERMARK_NAME).first()
+            old_visits = old_visits.filter(pk__lte=state.last_visit_id if state else 0)
+
+        if options['dry_run']:
+            self.stdout.write(f"{old_visits.count()} visits older than {cutoff:%Y-%m-%d %H:%M} would be archived.")
+            return
+
+        archive_dir = Path(options['archive_dir'])
+        archive_dir.mkdir(parents=True, exist_ok=True)
+        path = archive_dir / f"sitevisits-before-{cutoff:%Y%m%d}-{timezone.now():%Y%m%dT%H%M%S}.jsonl.gz"
+
+        archived = 0
+        batches = 0
+        last_pk = 0
+        with path.open('wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as archive:
+            while True:
+                # Keyset pagination: each batch is one bounded, indexed read
+                rows = list(
+                    old_visits.filter(pk__gt=last_pk).order_by('pk')
+                    .values_list(*ARCHIVE_FIELDS)[:options['batch_size']]
+                )
+                if not rows:
+                    break
+                lines = []
+                for row in rows:
+                    record = dict(zip(ARCHIVE_FIELDS, row))
+                    record['timestamp'] = record['timestamp'].isoformat()
+                    lines.append(json.dumps(record) + "\n")
+                archive.write("".join(lines).encode('utf-8'))
+                # The batch must be on disk before its rows are deleted
+                archive.flush()
+                raw.flush()
+                os.fsync(raw.fileno())
+
+                first_pk, last_pk = rows[0][0], rows[-1][0]
+                # pk-ranged delete (one short autocommit statement); the timestamp condition keeps
+                # any newer visit that happens to sit inside the range
+                old_visits.filter(pk__gte=first_pk, pk__lte=last_pk).delete()
+                archived += len(rows)
+                batches += 1
+                if options['pause']:
+                    time.sleep(options['pause'])
+
+        if archived == 0:
+            path.unlink()
+            self.stdout.write(f"No visits older than {cutoff:%Y-%m-%d %H:%M} to archive.")
+            return
+        self.stdout.write(f"Archived and deleted {archived} visits in {batches} batches to {path}")
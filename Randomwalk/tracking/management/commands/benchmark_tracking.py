@@ -0,0 +1,136 @@
+import asyncio
+import socket
+import statistics
+import threading
+import time
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks per-request overhead of the middleware stack under uvicorn (ASGI)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/analysis/', help='Page to request')
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--in-flight', type=int, default=0,
+                            help='Slow analyses (against a local Gemini stand-in) kept running during the load')
+        parser.add_argument('--analysis-seconds', type=float, default=5.0,
+                            help='How long each in-flight analysis waits on the stand-in')
+        parser.add_argument('--async', dest='async_mode', action='store_true',
+                            help='Run PageViewMiddleware in async mode (as with TRACKING_MIDDLEWARE_ASYNC=True)')
+
+    def handle(self, *args, **options):
+        try:
+            import httpx
+            import uvicorn
+        except ImportError as e:
+            raise CommandError(f"This benchmark needs uvicorn and httpx installed: pip install -r requirements-dev.txt ({e})")
+
+        from tracking.middleware import PageViewMiddleware
+        # Django reads this when it builds the handler below
+        PageViewMiddleware.async_capable = options['async_mode']
+
+        from django.core.asgi import get_asgi_application
+        app = get_asgi_application()
+
+        stub = None
+        if options['in_flight']:
+            from api import views
+            from api.fake_gemini import start_fake_gemini
+            # Answers after --analysis-seconds, so the analyses stay in flight
+            stub = start_fake_gemini(latency=options['analysis_seconds'], answer="Benchmark analysis.")
+            views.API_URL_BASE = stub.base_url
+
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            port = s.getsockname()[1]
+        server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning', lifespan='off'))
+        server_thread = threading.Thread(target=server.run, daemon=True)
+        server_thread.start()
+        while not server.started:
+            time.sleep(0.05)
+
+        def server_threads():
+            # The Gemini stand-in runs a thread per request; those are not the server's
+            return sum(1 for t in threading.enumerate() if 'process_request_thread' not in t.name)
+
+        baseline_threads = server_threads()
+        peak_threads = baseline_threads
+        sampling = True
+
+        def sample_threads():
+            nonlocal peak_threads
+            while sampling:
+                peak_threads = max(peak_threads, server_threads())
+                time.sleep(0.005)
+
+        sampler = threading.Thread(target=sample_threads, daemon=True)
+        sampler.start()
+        try:
+            latencies, elapsed, errors = asyncio.run(self._load(
+                httpx, f"http://127.0.0.1:{port}", options,
+            ))
+        finally:
+            sampling = False
+            server.should_exit = True
+            server_thread.join(timeout=5)
+            if stub is not None:
+                stub.shutdown()
+
+        latencies.sort()
+        mode = 'async middleware chain' if options['async_mode'] else 'sync middleware chain'
+        self.stdout.write(
+            f"{mode}: {len(latencies)} x GET {options['path']}, concurrency {options['concurrency']}, "
+            f"{options['in_flight']} analyses in flight, {errors} errors"
+        )
+        self.stdout.write(f"Throughput: {len(latencies) / elapsed:.1f} req/s")
+        self.stdout.write(
+            f"Latency: p50 {statistics.median(latencies) * 1000:.1f} ms, "
+            f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms, "
+            f"max {latencies[-1] * 1000:.1f} ms"
+        )
+        self.stdout.write(f"Threads in process: {baseline_threads} idle, {peak_threads} peak")
+
+    async def _load(self, httpx, base_url, options):
+        url = base_url + options['path']
+        total, concurrency = options['requests'], options['concurrency']
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+        errors = 0
+        limits = httpx.Limits(max_connections=concurrency + options['in_flight'])
+        async with httpx.AsyncClient(limits=limits, timeout=600) as client:
+            # Warm-up request creates the session cookie, so the run measures steady state
+            await client.get(url)
+
+            # Distinct ranges so the single-flight layer does not merge the analyses
+            quarters = [f"{year}Q{q}" for year in range(2020, 2026) for q in range(1, 5)]
+            ranges = [(company, start) for company in ('Amazon', 'Microsoft') for start in quarters]
+            analyses = [
+                asyncio.create_task(client.post(base_url + '/analysis/', data={
+                    'company': ranges[i % len(ranges)][0],
+                    'start_quarter': ranges[i % len(ranges)][1],
+                    'end_quarter': '2025Q4',
+                    'refresh': '1',
+                }))
+                for i in range(options['in_flight'])
+            ]
+            if analyses:
+                await asyncio.sleep(0.5)
+
+            async def one():
+                nonlocal errors
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await client.get(url)
+                    latencies.append(time.perf_counter() - started)
+                    if response.status_code != 200:
+                        errors += 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*[one() for _ in range(total)])
+            elapsed = time.perf_counter() - started
+            for response in await asyncio.gather(*analyses):
+                if response.status_code != 200:
+                    errors += 1
+            return latencies, elapsed, errors
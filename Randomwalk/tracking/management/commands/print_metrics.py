@@ -1,22 +1,112 @@
-from django.core.management.base import BaseCommand
-from tracking.models import PageView, SiteVisit
-from django.db.models import Sum, Avg
+import csv
+import json
+from datetime import datetime, time
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from tracking.models import PageView, SiteVisit, VisitRollup, RollupState
+from tracking.rollups import WATERMARK_NAME
+from django.db.models import Avg, Count, Sum
+
+VISIT_FIELDS = ('id', 'timestamp', 'path', 'visitor_id', 'session_key', 'time_spent_seconds')
+
+
+def parse_moment(value: str, end_of_day: bool = False):
+    """
+    Parse 'YYYY-MM-DD' or an ISO datetime; naive values use settings.TIME_ZONE.
+    A bare --until date includes that whole day.
+    """
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f"Invalid date: {value}")
+        moment = datetime.combine(day, time.max if end_of_day else time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
 
 class Command(BaseCommand):
-    help = 'Prints page view and site visit metrics'
+    help = 'Prints page view and site visit metrics, or streams visits as CSV/JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Only visits at or after this date/datetime')
+        parser.add_argument('--until', help='Only visits up to this date/datetime (a date includes the whole day)')
+        parser.add_argument('--path', help='Only this exact path')
+        parser.add_argument('--path-prefix', help='Only paths starting with this prefix')
+        parser.add_argument('--format', choices=['text', 'csv', 'jsonl'], default='text',
+                            help='csv/jsonl write one visit per line to stdout (aggregates go to stderr)')
+        parser.add_argument('--no-aggregates', action='store_true', help='Skip the aggregated metrics')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per database round trip')
+
+    def handle(self, *args, **options):
+        visits = SiteVisit.objects.all()
+        page_views = PageView.objects.all()
+        if options['since']:
+            visits = visits.filter(timestamp__gte=parse_moment(options['since']))
+        if options['until']:
+            visits = visits.filter(timestamp__lte=parse_moment(options['until'], end_of_day=True))
+        if options['path']:
+            visits = visits.filter(path=options['path'])
+            page_views = page_views.filter(path=options['path'])
+        if options['path_prefix']:
+            visits = visits.filter(path__startswith=options['path_prefix'])
+            page_views = page_views.filter(path__startswith=options['path_prefix'])
+        filtered = any(options[name] for name in ('since', 'until', 'path', 'path_prefix'))
+
+        # Rows are streamed as tuples in pk order, so memory stays flat whatever the table size
+        rows = visits.order_by('pk').values_list(*VISIT_FIELDS).iterator(chunk_size=options['chunk_size'])
+        fmt = options['format']
+
+        if fmt == 'csv':
+            writer = csv.writer(self.stdout, lineterminator='\n')
+            writer.writerow(VISIT_FIELDS)
+            for row in rows:
+                writer.writerow((row[0], row[1].isoformat()) + row[2:])
+        elif fmt == 'jsonl':
+            for row in rows:
+                record = dict(zip(VISIT_FIELDS, row))
+                record['timestamp'] = record['timestamp'].isoformat()
+                self.stdout.write(json.dumps(record))
+        else:
+            self.stdout.write("Page Views:")
+            for path, count in page_views.order_by('path').values_list('path', 'visits').iterator(chunk_size=options['chunk_size']):
+                self.stdout.write(f"- {path}: {count} visits")
+
+            self.stdout.write("\nSite Visits:")
+            for _, timestamp, path, visitor_id, session_key, seconds in rows:
+                self.stdout.write(f"- {path} at {timestamp} (Visitor: {visitor_id or session_key}, Time Spent: {seconds}s)")
+
+        if options['no_aggregates']:
+            return
+        # Keep the CSV/JSONL stream on stdout clean
+        out = self.stdout if fmt == 'text' else self.stderr
+        out.write("\nAggregated Metrics:")
+        if filtered:
+            self.write_filtered_aggregates(out, visits)
+        else:
+            self.write_rollup_aggregates(out)
 
-    def handle(self, *args, **kwargs):
-        self.stdout.write("Page Views:")
-        for page_view in PageView.objects.all():
-            self.stdout.write(f"- {page_view.path}: {page_view.visits} visits")
+    def write_filtered_aggregates(self, out, visits):
+        # One aggregate query in the database over the filtered rows
+        totals = visits.aggregate(visits=Count('id'), avg_time=Avg('time_spent_seconds'))
+        out.write(f"Total Page Visits: {totals['visits']}")
+        out.write(f"Average Time Spent per Visit: {totals['avg_time'] or 0:.2f} seconds")
 
-        self.stdout.write("\nSite Visits:")
-        for visit in SiteVisit.objects.all():
-            self.stdout.write(f"- {visit.path} at {visit.timestamp} (Session: {visit.session_key}, Time Spent: {visit.time_spent_seconds}s)")
+    def write_rollup_aggregates(self, out):
+        # Aggregates come from the daily rollups (a few hundred rows), not a scan of SiteVisit
+        totals = VisitRollup.objects.filter(period=VisitRollup.PERIOD_DAY).aggregate(
+            visits=Sum('visits'), time=Sum('total_time_seconds')
+        )
+        total_visits = totals['visits'] or 0
+        out.write(f"Total Page Visits: {total_visits}")
 
-        self.stdout.write("\nAggregated Metrics:")
-        total_visits = PageView.objects.aggregate(total_visits=Sum('visits'))['total_visits']
-        self.stdout.write(f"Total Page Visits: {total_visits}")
+        avg_time = (totals['time'] or 0) / total_visits if total_visits else 0
+        out.write(f"Average Time Spent per Visit: {avg_time:.2f} seconds")
 
-        avg_time = SiteVisit.objects.aggregate(avg_time=Avg('time_spent_seconds'))['avg_time'] or 0
-        self.stdout.write(f"Average Time Spent per Visit: {avg_time:.2f} seconds")
+        state = RollupState.objects.filter(name=WATERMARK_NAME).first()
+        if state is None:
+            out.write("(No rollups yet: run `manage.py rollup_visits`)")
+        else:
+            out.write(f"(Rollups as of {state.updated_at}, up to visit #{state.last_visit_id})")
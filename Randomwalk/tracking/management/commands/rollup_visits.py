@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from tracking.rollups import update_rollups
+
+
+class Command(BaseCommand):
+    help = 'Incrementally aggregates new SiteVisit rows into hourly/daily VisitRollup rows (run from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--settle-minutes', type=int, default=60,
+                            help='Always recompute this much recent history (late writes and durations)')
+        parser.add_argument('--full', action='store_true', help='Rebuild every rollup from scratch')
+
+    def handle(self, *args, **options):
+        result = update_rollups(settle_minutes=options['settle_minutes'], full=options['full'])
+        self.stdout.write(
+            f"Recomputed {result['days']} day(s), {result['rollup_rows']} rollup rows. "
+            f"Watermark: visit #{result['last_visit_id']}"
+        )
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracking', '0002_sitevisit_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sitevisit',
+            name='visitor_id',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=32),
+        ),
+        migrations.AlterField(
+            model_name='sitevisit',
+            name='session_key',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=40),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracking', '0003_sitevisit_visitor_id'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sitevisit',
+            name='visitor_id',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddIndex(
+            model_name='sitevisit',
+            index=models.Index(fields=['visitor_id', 'path', 'timestamp'], name='sitevisit_visitor_path_ts'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:36
+
+from django.db import migrations, models
+
+
+def mark_timed_visits(apps, schema_editor):
+    # Visits that already got a beacon (the old "time_spent_seconds > 0" rule)
+    SiteVisit = apps.get_model('tracking', 'SiteVisit')
+    SiteVisit.objects.filter(time_spent_seconds__gt=0).update(duration_recorded=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracking', '0005_visit_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sitevisit',
+            name='duration_recorded',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_timed_visits, migrations.RunPython.noop),
+    ]
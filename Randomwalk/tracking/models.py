@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 class PageView(models.Model):
     path = models.CharField(max_length=255, unique=True)
@@ -9,9 +10,57 @@ class PageView(models.Model):
 
 class SiteVisit(models.Model):
     path = models.CharField(max_length=255)
-    timestamp = models.DateTimeField(auto_now_add=True)
-    session_key = models.CharField(max_length=40, db_index=True)
+    # Set by the visit buffer to the request time, not the (later) flush time
+    timestamp = models.DateTimeField(default=timezone.now, db_index=True)
+    # From the signed visitor cookie; session_key is only set when a real session exists
+    visitor_id = models.CharField(max_length=32, blank=True, default='')
+    session_key = models.CharField(max_length=40, db_index=True, blank=True, default='')
     time_spent_seconds = models.PositiveIntegerField(default=0)
+    # Set once a time-on-page beacon has been applied, so a real 0-second visit is not timed twice
+    duration_recorded = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # Latest visit of a visitor on a page (time-on-page beacons); also covers visitor_id lookups
+            models.Index(fields=['visitor_id', 'path', 'timestamp'], name='sitevisit_visitor_path_ts'),
+        ]
 
     def __str__(self):
         return f"Visit to {self.path} at {self.timestamp}"
+
+class VisitRollup(models.Model):
+    """
+    Visits per path and hour/day, maintained by `manage.py rollup_visits`
+    so metrics never have to scan SiteVisit.
+    """
+    PERIOD_HOUR = 'hour'
+    PERIOD_DAY = 'day'
+    PERIOD_CHOICES = [(PERIOD_HOUR, 'Hour'), (PERIOD_DAY, 'Day')]
+
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    bucket_start = models.DateTimeField()
+    path = models.CharField(max_length=255)
+    visits = models.PositiveIntegerField(default=0)
+    unique_visitors = models.PositiveIntegerField(default=0)
+    total_time_seconds = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('period', 'bucket_start', 'path')
+
+    @property
+    def avg_time_seconds(self):
+        return self.total_time_seconds / self.visits if self.visits else 0.0
+
+    def __str__(self):
+        return f"{self.path} ({self.period} of {self.bucket_start}): {self.visits} visits"
+
+class RollupState(models.Model):
+    """
+    Watermark of the rollup job: the highest SiteVisit id already aggregated.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    last_visit_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_visit_id}"
@@ -0,0 +1,90 @@
+from datetime import datetime, time, timedelta
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import TruncDate, TruncHour
+from django.utils import timezone
+
+from .models import RollupState, SiteVisit, VisitRollup
+
+WATERMARK_NAME = 'site_visits'
+
+
+def _day_start(moment):
+    """
+    Local midnight of the day containing `moment` (days follow settings.TIME_ZONE).
+    """
+    local = timezone.localtime(moment)
+    return local.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _aggregate(visits, *group_by):
+    return visits.values(*group_by).annotate(
+        n_visits=Count('id'),
+        # Visitors are identified by the cookie; rows logged before it existed only have a session key
+        n_visitors=Count('visitor_id', distinct=True, filter=~Q(visitor_id=''))
+                   + Count('session_key', distinct=True, filter=Q(visitor_id='')),
+        total_time=Sum('time_spent_seconds'),
+    )
+
+
+def _rollup_day(day_start) -> int:
+    """
+    Recompute the hourly and daily rollups of one day from raw visits.
+    Reads one day of SiteVisit through the timestamp index.
+    """
+    day_end = _day_start(day_start + timedelta(hours=26))
+    visits = SiteVisit.objects.filter(timestamp__gte=day_start, timestamp__lt=day_end)
+
+    rows = [
+        VisitRollup(
+            period=VisitRollup.PERIOD_HOUR, bucket_start=row['hour'], path=row['path'],
+            visits=row['n_visits'], unique_visitors=row['n_visitors'], total_time_seconds=row['total_time'] or 0,
+        )
+        for row in _aggregate(visits.annotate(hour=TruncHour('timestamp')), 'hour', 'path')
+    ]
+    rows += [
+        VisitRollup(
+            period=VisitRollup.PERIOD_DAY, bucket_start=day_start, path=row['path'],
+            visits=row['n_visits'], unique_visitors=row['n_visitors'], total_time_seconds=row['total_time'] or 0,
+        )
+        for row in _aggregate(visits, 'path')
+    ]
+
+    # Replace the day's buckets in one short transaction
+    with transaction.atomic():
+        VisitRollup.objects.filter(bucket_start__gte=day_start, bucket_start__lt=day_end).delete()
+        VisitRollup.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def update_rollups(settle_minutes: int = 60, full: bool = False) -> dict:
+    """
+    Bring VisitRollup up to date with the visits added since the watermark.
+
+    Only the distinct days holding new visits (by id) are recomputed, plus the
+    days of the last `settle_minutes`: visits can be written a little out of
+    order (buffered flushes from several workers) and receive their duration
+    after insertion. A full rebuild covers the days of the remaining visits,
+    so the rollups of days already archived by `archive_visits` are kept.
+    """
+    state, _ = RollupState.objects.get_or_create(name=WATERMARK_NAME)
+    last_id = 0 if full else state.last_visit_id
+    new = SiteVisit.objects.filter(pk__gt=last_id)
+    max_id = new.aggregate(max_id=Max('pk'))['max_id']
+
+    tz = timezone.get_current_timezone()
+    dates = set(new.annotate(day=TruncDate('timestamp', tzinfo=tz)).values_list('day', flat=True).distinct())
+    now = timezone.now()
+    day = _day_start(now - timedelta(minutes=settle_minutes))
+    while day <= now:
+        dates.add(day.date())
+        day = _day_start(day + timedelta(hours=26))
+
+    rows = 0
+    for date in sorted(dates):
+        rows += _rollup_day(timezone.make_aware(datetime.combine(date, time.min), tz))
+
+    if max_id is not None:
+        state.last_visit_id = max_id
+    state.save()
+    return {'days': len(dates), 'rollup_rows': rows, 'last_visit_id': state.last_visit_id}
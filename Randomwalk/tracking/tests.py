@@ -1,3 +1,231 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import tempfile
+from pathlib import Path
+from datetime import timedelta
+from unittest import mock
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.test import AsyncClient, TestCase
+from django.utils import timezone
 
-# Create your tests here.
+from .buffer import VisitBuffer
+from .middleware import PageViewMiddleware
+from .models import PageView, RollupState, SiteVisit, VisitRollup
+from .rollups import _day_start, update_rollups
+
+
+class VisitBufferTests(TestCase):
+
+    def setUp(self):
+        # No background thread: the tests flush explicitly
+        self.buffer = VisitBuffer(flush_seconds=3600, max_events=1000)
+        self.buffer._start = lambda: None
+        for target in ("tracking.middleware.get_visit_buffer", "tracking.views.get_visit_buffer"):
+            patcher = mock.patch(target, return_value=self.buffer)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_request_path_makes_no_tracking_queries(self):
+        with self.assertNumQueries(0):
+            first = self.client.get("/analysis/")
+            self.client.get("/analysis/")
+        self.assertIn("rw_visitor", first.cookies)
+        self.assertEqual(self.buffer.pending(), 2)
+        self.assertFalse(SiteVisit.objects.exists())
+        self.assertFalse(Session.objects.exists())
+
+    def test_visitor_cookie_is_signed_and_reused(self):
+        self.client.get("/analysis/")
+        self.client.get("/analysis/")
+        self.client.cookies["rw_visitor"] = "forged"
+        self.client.get("/analysis/")
+        visitor_ids = [visitor_id for _, visitor_id, _, _ in self.buffer._events]
+        self.assertEqual(visitor_ids[0], visitor_ids[1])
+        self.assertNotEqual(visitor_ids[2], visitor_ids[0])
+        self.assertNotEqual(visitor_ids[2], "forged")
+
+    async def test_async_mode_records_visits(self):
+        # The handler (and the middleware mode) is built on the first request
+        with mock.patch.object(PageViewMiddleware, "async_capable", True), \
+                mock.patch.object(PageViewMiddleware, "__acall__", autospec=True,
+                                  side_effect=PageViewMiddleware.__acall__) as acall:
+            client = AsyncClient()
+            await client.get("/analysis/")
+            await client.get("/analysis/")
+        self.assertEqual(acall.call_count, 2)
+        self.assertEqual(self.buffer.pending(), 2)
+        self.assertEqual(len({visitor_id for _, visitor_id, _, _ in self.buffer._events}), 1)
+
+    def test_flush_batches_visits_and_increments_counts(self):
+        PageView.objects.create(path="/analysis/", visits=5)
+        for _ in range(3):
+            self.buffer.add("/analysis/", "v1")
+        self.buffer.add("/about/", "v2")
+
+        # Bulk insert visits, insert missing paths, two updates, in one transaction (a savepoint here)
+        with self.assertNumQueries(6):
+            self.assertEqual(self.buffer.flush(), 4)
+
+        self.assertEqual(PageView.objects.get(path="/analysis/").visits, 8)
+        self.assertEqual(PageView.objects.get(path="/about/").visits, 1)
+        self.assertEqual(SiteVisit.objects.filter(visitor_id="v1").count(), 3)
+        self.assertEqual(self.buffer.pending(), 0)
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_failed_flush_is_rolled_back_and_backlog_is_bounded(self):
+        self.buffer.max_backlog = 3
+        for _ in range(2):
+            self.buffer.add("/analysis/", "v1")
+        with mock.patch("tracking.buffer.PageView.objects.filter", side_effect=RuntimeError("db down")):
+            with self.assertRaises(RuntimeError):
+                self.buffer.flush()
+            self.assertFalse(SiteVisit.objects.exists())
+            self.buffer.add("/analysis/", "v1")
+            self.buffer.add("/about/", "v1")
+            with self.assertRaises(RuntimeError):
+                self.buffer.flush()
+        self.assertEqual((self.buffer.pending(), self.buffer.dropped_events), (3, 1))
+
+        self.assertEqual(self.buffer.flush(), 3)
+        self.assertEqual(SiteVisit.objects.count(), 3)
+        self.assertEqual(PageView.objects.get(path="/analysis/").visits, 2)
+
+    def test_beacon_batch_sets_durations_on_latest_visits(self):
+        self.client.get("/analysis/")
+        self.client.get("/")
+        self.client.get("/analysis/")
+        self.buffer.flush()
+
+        payload = {"events": [
+            {"path": "/analysis/", "duration": 12.4},
+            {"path": "/", "duration": 3},
+            {"path": "/analysis/", "duration": 40},
+            {"path": "/missing/", "duration": 5},
+        ]}
+        response = self.client.post("/tracking/api/update-time/", json.dumps(payload), content_type="text/plain")
+        self.assertEqual(response.json(), {"status": "success", "queued": 4})
+
+        # One indexed lookup per (visitor, path) plus a single bulk UPDATE
+        with self.assertNumQueries(4):
+            self.buffer.flush()
+
+        analysis = list(SiteVisit.objects.filter(path="/analysis/").order_by("timestamp")
+                        .values_list("time_spent_seconds", flat=True))
+        self.assertEqual(analysis, [12, 40])
+        self.assertEqual(SiteVisit.objects.get(path="/").time_spent_seconds, 3)
+        self.assertEqual(self.buffer.pending_durations(), 1)  # /missing/ waits for its visit
+
+    def test_zero_second_duration_is_not_overwritten(self):
+        self.client.get("/analysis/")
+        self.buffer.flush()
+        for duration in (0, 30):
+            self.client.post("/tracking/api/update-time/", json.dumps({"path": "/analysis/", "duration": duration}),
+                             content_type="text/plain")
+            self.buffer.flush()
+        visit = SiteVisit.objects.get()
+        self.assertEqual((visit.time_spent_seconds, visit.duration_recorded), (0, True))
+        self.assertEqual(self.buffer.pending_durations(), 1)  # 30s waits for a visit that has no duration yet
+
+    def test_beacon_rejects_bad_payloads(self):
+        for body in ("not json", json.dumps({"events": []}), json.dumps({"path": "x", "duration": 1}),
+                     json.dumps({"events": [{"path": "/a/"}]}),
+                     '{"path": "/a/", "duration": Infinity}', '{"path": "/a/", "duration": 1e999}'):
+            response = self.client.post("/tracking/api/update-time/", body, content_type="text/plain")
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get("/tracking/api/update-time/").status_code, 405)
+
+
+class RollupTests(TestCase):
+
+    def _visit(self, path, visitor_id, when, seconds=0):
+        return SiteVisit.objects.create(path=path, visitor_id=visitor_id, timestamp=when, time_spent_seconds=seconds)
+
+    def test_incremental_rollup_only_recomputes_new_days(self):
+        now = timezone.now()
+        old = now - timedelta(days=3)
+        self._visit("/a/", "v1", old, 10)
+        self._visit("/a/", "v1", old, 20)
+        self._visit("/a/", "v2", old, 30)
+
+        # The old day and today; the days in between hold no new visits
+        self.assertEqual(update_rollups(settle_minutes=0)["days"], 2)
+        day = VisitRollup.objects.get(period=VisitRollup.PERIOD_DAY, path="/a/")
+        self.assertEqual((day.visits, day.unique_visitors, day.total_time_seconds), (3, 2, 60))
+        self.assertEqual(day.avg_time_seconds, 20)
+        self.assertEqual(
+            sum(VisitRollup.objects.filter(period=VisitRollup.PERIOD_HOUR).values_list("visits", flat=True)), 3
+        )
+
+        # Only today's (recent) visits are new: the old day is not touched again
+        self._visit("/b/", "v3", now - timedelta(minutes=5), 4)
+        result = update_rollups()
+        self.assertLessEqual(result["days"], 2)
+        self.assertEqual(result["last_visit_id"], SiteVisit.objects.latest("pk").pk)
+        self.assertEqual(RollupState.objects.get().last_visit_id, result["last_visit_id"])
+        self.assertEqual(VisitRollup.objects.get(period=VisitRollup.PERIOD_DAY, path="/b/").visits, 1)
+        self.assertEqual(VisitRollup.objects.get(period=VisitRollup.PERIOD_DAY, path="/a/").visits, 3)
+
+
+class PrintMetricsTests(TestCase):
+
+    def test_csv_export_is_filtered_and_keeps_aggregates_off_stdout(self):
+        now = timezone.now()
+        SiteVisit.objects.create(path="/analysis/", visitor_id="v1", timestamp=now, time_spent_seconds=7)
+        SiteVisit.objects.create(path="/analysis/", visitor_id="v2", timestamp=now - timedelta(days=10))
+        SiteVisit.objects.create(path="/", visitor_id="v1", timestamp=now)
+
+        out, err = io.StringIO(), io.StringIO()
+        since = (now - timedelta(days=1)).date().isoformat()
+        call_command("print_metrics", "--format", "csv", "--since", since, "--path-prefix", "/analysis",
+                     "--chunk-size", "1", stdout=out, stderr=err)
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], "id,timestamp,path,visitor_id,session_key,time_spent_seconds")
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].endswith(",/analysis/,v1,,7"))
+        self.assertIn("Total Page Visits: 1", err.getvalue())
+
+
+class ArchiveVisitsTests(TestCase):
+
+    def test_old_visits_are_archived_in_batches_then_deleted(self):
+        now = timezone.now()
+        for i in range(5):
+            SiteVisit.objects.create(path=f"/old{i}/", visitor_id="v1", timestamp=now - timedelta(days=100))
+        SiteVisit.objects.create(path="/new/", visitor_id="v1", timestamp=now)
+        update_rollups()
+        # Not aggregated yet, so it must survive
+        SiteVisit.objects.create(path="/late/", visitor_id="v1", timestamp=now - timedelta(days=100))
+
+        with tempfile.TemporaryDirectory() as archive_dir:
+            out = io.StringIO()
+            call_command("archive_visits", "--days", "90", "--batch-size", "2", "--pause", "0",
+                         "--archive-dir", archive_dir, stdout=out)
+            self.assertIn("Archived and deleted 5 visits in 3 batches", out.getvalue())
+            (archive,) = Path(archive_dir).glob("*.jsonl.gz")
+            with gzip.open(archive, "rt") as f:
+                records = [json.loads(line) for line in f]
+
+        self.assertEqual([r["path"] for r in records], [f"/old{i}/" for i in range(5)])
+        self.assertEqual(sorted(SiteVisit.objects.values_list("path", flat=True)), ["/late/", "/new/"])
+        self.assertEqual(VisitRollup.objects.filter(period=VisitRollup.PERIOD_DAY).count(), 6)
+
+    def test_only_whole_days_are_archived(self):
+        now = timezone.now()
+        cutoff = _day_start(now - timedelta(days=90))
+        SiteVisit.objects.create(path="/a/", visitor_id="v1", timestamp=cutoff - timedelta(hours=1))
+        SiteVisit.objects.create(path="/a/", visitor_id="v1", timestamp=cutoff + timedelta(minutes=1))
+        SiteVisit.objects.create(path="/a/", visitor_id="v2", timestamp=now - timedelta(days=90) + timedelta(seconds=1))
+        update_rollups()
+
+        with tempfile.TemporaryDirectory() as archive_dir:
+            call_command("archive_visits", "--days", "90", "--pause", "0", "--archive-dir", archive_dir,
+                         stdout=io.StringIO())
+        self.assertEqual(SiteVisit.objects.count(), 2)
+
+        # Rebuilding keeps the archived day and recomputes the cutoff day in full
+        update_rollups(full=True)
+        days = VisitRollup.objects.filter(period=VisitRollup.PERIOD_DAY, path="/a/").order_by("bucket_start")
+        self.assertEqual([day.visits for day in days], [1, 2])
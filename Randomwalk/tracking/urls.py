@@ -0,0 +1,7 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    # Time-on-page beacons (navigator.sendBeacon), one or many events per request
+    path('api/update-time/', views.update_visit_time, name='update_visit_time'),
+]
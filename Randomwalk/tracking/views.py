@@ -1,8 +1,38 @@
 from django.shortcuts import render
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-from .models import SiteVisit
+from .buffer import get_visit_buffer
+from .visitor import get_visitor_id
 import json
+import math
+
+# A beacon carries the pages of one browsing session; anything larger is not from our pages
+MAX_BEACON_EVENTS = 100
+MAX_DURATION_SECONDS = 24 * 3600
+
+def _parse_beacon(body: bytes) -> list:
+    """
+    Accept {"events": [{"path": ..., "duration": ...}, ...]} or a single
+    {"path": ..., "duration": ...} and return [(path, seconds), ...].
+    """
+    data = json.loads(body)
+    events = data.get('events', [data]) if isinstance(data, dict) else data
+    if not isinstance(events, list) or not events:
+        raise ValueError("Expected a non-empty list of events.")
+    if len(events) > MAX_BEACON_EVENTS:
+        raise ValueError(f"At most {MAX_BEACON_EVENTS} events per beacon.")
+
+    durations = []
+    for event in events:
+        path = event['path']
+        if not isinstance(path, str) or not path.startswith('/'):
+            raise ValueError(f"Invalid path: {path!r}")
+        duration = float(event['duration'])
+        if not math.isfinite(duration):
+            raise ValueError(f"Invalid duration: {event['duration']!r}")
+        seconds = min(max(round(duration), 0), MAX_DURATION_SECONDS)
+        durations.append((path[:255], seconds))
+    return durations
 
 # 这里使用 csrf_exempt 是为了简化演示，生产环境建议配置 CSRF token
 @csrf_exempt 
@@ -10,26 +40,19 @@ def update_visit_time(request):
     if request.method == 'POST':
         try:
             # 1. 解析前端发来的数据
-            data = json.loads(request.body)
-            path = data.get('path')
-            duration = data.get('duration')
-            session_key = request.session.session_key
+            durations = _parse_beacon(request.body)
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
 
-            # 2. 找到最近的一次访问记录 (匹配 Session 和 Path)
-            # 我们使用 .last() 获取该用户在该页面的最后一次访问
-            visit = SiteVisit.objects.filter(
-                session_key=session_key, 
-                path=path
-            ).last()
+        # 2. Durations belong to the visits logged under the visitor cookie
+        visitor_id, is_new = get_visitor_id(request)
+        if is_new:
+            return JsonResponse({'status': 'ignored', 'message': 'Unknown visitor'})
 
-            # 3. 更新时长
-            if visit:
-                visit.time_spent_seconds = float(duration)
-                visit.save()
-                return JsonResponse({'status': 'success'})
-            
-        except Exception as e:
-            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+        # 3. Queue them; the tracking buffer applies the whole batch with one bulk_update
+        # right after it has written the visits themselves
+        get_visit_buffer().add_durations(visitor_id, durations)
+        return JsonResponse({'status': 'success', 'queued': len(durations)})
 
     return JsonResponse({'status': 'invalid method'}, status=405)
 # Create your views here.
@@ -0,0 +1,30 @@
+import uuid
+from django.conf import settings
+
+# Separate salt so a visitor ID cannot be swapped with another signed value from this site
+VISITOR_COOKIE_SALT = 'tracking.visitor'
+
+
+def get_visitor_id(request):
+    """
+    Return (visitor_id, is_new). The ID comes from the signed visitor cookie;
+    a missing or tampered cookie gets a fresh random ID.
+    """
+    visitor_id = request.get_signed_cookie(
+        getattr(settings, 'TRACKING_VISITOR_COOKIE', 'rw_visitor'), default=None, salt=VISITOR_COOKIE_SALT
+    )
+    if visitor_id:
+        return visitor_id, False
+    return uuid.uuid4().hex, True
+
+
+def set_visitor_cookie(response, visitor_id: str) -> None:
+    response.set_signed_cookie(
+        getattr(settings, 'TRACKING_VISITOR_COOKIE', 'rw_visitor'),
+        visitor_id,
+        salt=VISITOR_COOKIE_SALT,
+        max_age=getattr(settings, 'TRACKING_VISITOR_COOKIE_AGE', 365 * 24 * 3600),
+        secure=settings.SESSION_COOKIE_SECURE,
+        httponly=True,
+        samesite='Lax',
+    )